@@ -20,13 +20,27 @@
 /alerts off <alerts...>|ALL
     Enables or disable the selected alert(s).
 
+:selectors
+    Commands that accept a list of <alerts...> can also select several alerts at once, in any combination:
+
+    Wildcards: "ops-*" selects all alerts with names beginning with "ops-".  * matches any number of characters and ?
+    matches exactly one.
+
+    Tags: "tag:work" selects all alerts tagged 'work'.  See the tags setting.
+
 /alerts move <alert> {FIRST|LAST|BEFORE <target>|AFTER <target>}
     Move an alert to the specified place on the list of alerts.  Only the first matching alert triggers if multiple
-    alerts match for an incoming line of text; this can be used to control which alert is first.
+    alerts match for an incoming line of text; this can be used to control which alert is first.  (See also the
+    multi_highlight option.)
 
 /alerts rename <alert> <newname>
     Change the name of an alert.  Note that this does not change what the alert matches.
 
+/alerts help [<command-or-setting>]
+    Shows all of this help, or just the commands, settings and options starting with <command-or-setting>.
+
+    Pressing Tab while typing an /alerts command completes command names, alert names, settings and options.
+
 ** Pattern Matching **
 /alerts pattern <alert> [<pattern>]
     Sets the pattern for alert, or shows the current pattern if a new pattern is not specified.
@@ -47,7 +61,7 @@
     disables sound for this alert.
 
     <soundfile> will be searched for in the following locations (in order):
-        Windows: %APPDATA%\HexChat\Sounds, %ProgramFiles%\HexChat\Sounds, %ProgramFiles(x86)%\HexChat\Sounds
+        Windows: %APPDATA%\\HexChat\\Sounds, %ProgramFiles%\\HexChat\\Sounds, %ProgramFiles(x86)%\\HexChat\\Sounds
         POSIX-like: ~/.config/hexchat/sounds, /sbin/HexChat/share/sounds, /usr/sbin/HexChat/share/sounds,
         /usr/local/bin/HexChat/share/sounds
 
@@ -97,6 +111,11 @@
     Nicknames are matched against patterns by converting them to nick!user@host format, with some simplifications.
     Empty sections are replaced with wildcards, so these all work: "nickname", "user@host", "@host", "!user"
 
+    Matching ignores case the way the network does (its CASEMAPPING): on most networks, "[]\\~" are uppercase
+    versions of "{}|^", so "[bob]" also matches "{bob}".  Servers only say which case mapping they use when you
+    connect, so the last one seen on each network is remembered.  A network never seen to say is assumed to use the
+    usual (rfc1459) one until you reconnect to it.
+
     Channels are matched against patterns by converting them to channel@server format, with simplifications similar
     to the above.  Note that channel names include the "#", and a PM is the 'channel' of the nickname sending the PM.
     Thus, "ALLOW #*" will only allow alerts to trigger in actual channels (not PMs), and "DENY #*" does the opposite.
@@ -110,6 +129,22 @@
     /alerts chanlist is not yet implemented.
     See /alerts help filters
 
+/alerts filterlist
+/alerts filterlist DEFINE <name> ALLOW|DENY pattern1,pattern2 ALLOW|DENY pattern3...
+/alerts filterlist EDIT|DELETE <name>
+    Manages filter lists: named nickname filters that any number of alerts can share, rather than each having its own
+    copy.  Alerts use them with a USE rule in their nickname filter, e.g.:
+
+        /alerts filterlist DEFINE bots DENY ChanServ,*bot
+        /alerts nicklist <alert> SET USE bots
+
+    A USE rule is decided by the first pattern in the list that matches.  If none do, the rest of the alert's filter
+    is checked, or if there is no more, the list decides as a filter would on its own.  "USE bots DENY eve" blocks
+    eve as well as the bots.
+
+    Redefining a list changes it for every alert that uses it.  With no arguments, shows all lists and how many alerts
+    use each.  A list can't be deleted while alerts use it.  Each list is checked at most once per message.
+
 ** Import/Export and Sharing **
 /alerts dump <alerts...>|ALL
     Outputs the commands required to re-create the specified alert(s).
@@ -127,6 +162,40 @@
 /alerts save
     Saves alerts manually.  (This should happen automatically when exiting HexChat)
 
+** Performance **
+/alerts profile START [<lines>] [SAVE]
+/alerts profile STOP
+    Profiles the handling of the next <lines> incoming messages (default 1000) and then shows the functions that took
+    the most time.  If SAVE is specified, the full results are also saved to a .pstats file in Hexchat's
+    configuration directory.  STOP finishes early and shows the results so far.
+
+    Profiling only slows things down while it is running.
+
+/alerts latency [RESET]
+    Shows how long this plugin has spent processing each type of incoming message: the average, the times that 50%,
+    95% and 99% of messages were processed within, and the slowest.  RESET starts counting again.
+
+/alerts scan <alert>|ALL [<network>[/<channel>]] [<since>]
+    Checks Hexchat's log files for lines an alert (or all alerts, or those selected as described in /alerts help
+    selectors) would have triggered on, and lists them in a window named ">>scan<<".  <network>/<channel> limits this
+    to those logs (wildcards work, e.g. libera/#*), and <since> to lines logged in the last so long: a number of
+    seconds, or a number followed by m, h, d or w (such as 12h).
+
+    Scanning happens a little at a time in the background (see /alerts cancel).  Nickname filters are ignored, since
+    logs don't record who sent a message in enough detail.  Disabled alerts are skipped unless named explicitly.
+    Starting another scan stops the previous one, as does closing its window.
+
+/alerts cancel [<task>|ALL]
+    Commands that can take a long time -- scan, and dump, export, import or preview with many alerts -- run a little at
+    a time in the background, reporting their progress every few seconds.  With no arguments, lists those that are
+    running.  Otherwise cancels a task by number or command name, or all of them.
+
+/alerts stats
+    Shows the slowest alerts, and any alerts that were disabled for being too slow (see the watchdog_budget option).
+    Re-enable those with /alerts enable once they have been fixed.
+
+    Regular expressions that are likely to be extremely slow (such as '(a+)+') are refused by /alerts regex.
+
 ** Alert Settings **
 The following settings can manipulated using /alerts set, /alerts show and /alerts clear:
 
@@ -168,6 +237,19 @@ The following settings can manipulated using /alerts set, /alerts show and /aler
     See /alerts pattern, /alerts regex and /alerts sound for instructions.  These settings must be the last setting
     on the line when using /alerts set.
 
+:tags <tag>[,<tag>...]|OFF
+    Tags the alert, so it can be selected along with other alerts with the same tag using tag:<tag>.  See /alerts help
+    selectors.
+
+:cooldown <seconds>|OFF
+    After this alert plays its sound, flashes, focuses or copies a line, it won't do any of those again for this
+    many seconds.  Lines are still highlighted (and notified) as usual in the meantime.  Useful for busy keywords.
+
+:networks <network>[,<network>...]|ALL
+    Restricts the alert to only trigger on the listed networks, using their names from Hexchat's network list.  ALL
+    (the default) lets it trigger everywhere.  This setting must be the last setting on the line when using
+    /alerts set.
+
 :focus ON|OFF|FORCE
     Whether or not to switch to the window receiving a triggering message.  This only switches what window Hexchat
     has active, it won't cause Hexchat to steal focus from another program.  To avoid inadvertent breaks mid-typing,
@@ -183,6 +265,76 @@ The following settings can manipulated using /alerts set, /alerts show and /aler
 :copy <window>|ON|OFF
     If set, copies triggered alerts to the specified window, which will be created if it doesn't already exist.
     If ON, the window is named ">>Alerts<<".
+
+** Plugin Options **
+/alerts option [<option> [<value>]]
+    Shows or changes options that apply to the plugin as a whole, rather than to a single alert.  With no arguments,
+    lists all options and their current values.  Changes are saved immediately.
+
+The following options can be manipulated using /alerts option:
+
+:sound_backend SPLAY|AUTO|<player>
+    Selects how sounds are played.  SPLAY (the default) uses Hexchat's /SPLAY command.  AUTO uses the first of
+    paplay, aplay, play or afplay that is installed, and falls back to SPLAY if none are.  Anything else is the name
+    of (or path to) a command-line player, which will be run as "<player> <soundfile>" in the background.
+
+    Local players do not compete with Hexchat's own sounds, and never hold up incoming messages while playing.
+
+:sound_window <seconds>
+    When using a local player, identical sounds requested within this many seconds of each other are only played
+    once.  Defaults to 1.
+
+:sound_queue <count>
+    When using a local player, at most this many sounds will wait for the current sound to finish.  Any more are
+    dropped.  Defaults to 3.
+
+:multi_highlight ON|OFF
+    Normally, only the first matching alert on the list triggers.  If ON, every other alert that matches the same line
+    also highlights its matches, though only the first alert's line formatting, sound and other actions are used.
+    Where matches from different alerts overlap, the alert that is earlier in the list wins.
+
+:notify_window <seconds>
+    If more than 0, notifications (see the notify setting) are collected for this many seconds and then shown as one
+    line per channel, such as "[7 alerts in #channel: last from nick]".  This keeps a busy channel from flooding
+    your current window.  Defaults to 0, which shows each notification immediately.
+
+:copy_delay <seconds>
+    Lines copied to a copy window (see the copy setting) are collected for this many seconds and then written all at
+    once.  Defaults to 0.5.  0 writes each line immediately.
+
+:copy_backlog <lines>
+    How many recent lines to remember for each copy window.  If a copy window is closed, these are written to it again
+    when it is reopened.  Defaults to 100.
+
+:duplicate_window <seconds>
+    If more than 0, an alert that triggers again on the same message from the same nick within this many seconds --
+    usually because it was relayed to several channels -- still highlights the line, but doesn't play its sound, flash,
+    focus, notify or copy again.  Defaults to 0, which treats every line separately.
+
+:watchdog_budget <milliseconds>
+:watchdog_strikes <count>
+    If checking a message against an alert takes longer than watchdog_budget milliseconds (default 50) on
+    watchdog_strikes separate occasions (default 3), the alert is disabled to keep it from freezing Hexchat.  See
+    /alerts stats.  Setting watchdog_budget to 0 turns this off.
+
+:match_workers <count>
+    If more than 0 (the default), checking messages against alerts happens in this many background Python processes
+    rather than in Hexchat itself.  This is meant for very large numbers of alerts -- tens of thousands -- which would
+    otherwise freeze Hexchat for a noticeable time on every message.  Messages are held back until they have been
+    checked, so they appear slightly later than usual (see /alerts latency), and in order -- except that if the workers
+    fall hundreds of messages behind, further messages are checked in Hexchat until they catch up, and so can appear
+    before ones that are still waiting.
+
+    The watchdog (above) doesn't apply to alerts checked this way, since they can't freeze Hexchat.
+
+:match_python AUTO|<path>
+    The Python interpreter used for match_workers.  AUTO (the default) looks for one.  Changing this or match_workers
+    restarts the workers.
+
+:match_cache_size <count>
+    How many recent messages to remember which alerts matched (default 256).  When the same text arrives again on the
+    same network -- as it does when bots or bridges relay it to many channels -- only nickname filters are checked.
+    Hit rates are shown in /alerts stats.  0 turns this off.
 """
 import re
 import os
@@ -193,6 +345,16 @@ import json
 import itertools
 import string
 import collections.abc
+import bisect
+import heapq
+import contextlib
+import shutil
+import subprocess
+import sys
+import time
+import cProfile
+import pstats
+import io
 
 # noinspection PyUnresolvedReferences
 import hexchat
@@ -212,11 +374,811 @@ try:
 except ImportError:
     from collections import Iterable
 
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+
+class Option:
+    """
+    A plugin-wide setting.  Values live as attributes on the plugin and are saved to pluginprefs as soon as they change.
+
+    :ivar name: Option name, which is also the name of the attribute on the plugin.
+    :ivar default: Value used when nothing (or something invalid) has been saved.
+    :ivar parse: Converts a string to a value.  Raises ValueError if the string is invalid.
+    :ivar format: Converts a value back into a string suitable for display and parse()
+    :ivar onchange: If set, called with the plugin whenever the value changes.
+    """
+    def __init__(self, name, default, parse=str, format=str, onchange=None):
+        self.name = name
+        self.default = default
+        self.parse = parse
+        self.format = format
+        self.onchange = onchange
+        Plugin.options[name] = self
+
+    @property
+    def prefname(self):
+        return "python_alerts_option_" + self.name
+
+    def load(self, plugin):
+        """Sets the option on plugin to its saved value, or the default if there isn't one."""
+        data = hexchat.get_pluginpref(self.prefname)
+        value = self.default
+        if data is not None:
+            try:
+                value = self.parse(str(data))
+            except ValueError as ex:
+                print("Ignoring saved value for option '{}': {}".format(self.name, str(ex)))
+        setattr(plugin, self.name, value)
+
+    def set(self, plugin, value):
+        setattr(plugin, self.name, value)
+        hexchat.set_pluginpref(self.prefname, self.format(value))
+        if self.onchange is not None:
+            self.onchange(plugin)
+
+
+class SoundPlayer:
+    """
+    Plays sounds using a local command-line player (paplay, aplay, ...) in a background process.
+
+    Only one sound plays at a time.  Sounds requested while another is playing wait in a short queue, which is drained
+    by a timer rather than by waiting on the player -- so nothing here ever blocks Hexchat.
+
+    :ivar command: Player executable.
+    :ivar window: Identical sounds requested within this many seconds of each other are only played once.
+    :ivar queue_size: Maximum number of sounds waiting to play.  Any more are dropped.
+    """
+    #: Players tried (in order) when the backend is AUTO.
+    PLAYERS = ('paplay', 'aplay', 'play', 'afplay')
+    #: How often to check on the running player, in milliseconds.
+    POLL_INTERVAL = 100
+    #: How long stop() waits for a terminated player to exit before killing it, in seconds.
+    STOP_TIMEOUT = 0.5
+
+    def __init__(self, command, window=1.0, queue_size=3):
+        self.command = command
+        self.window = window
+        self.queue_size = queue_size
+        self.queue = collections.deque()
+        self.requested = {}  # filename -> time it was last requested
+        self.process = None
+        self.timer = None
+
+    @classmethod
+    def find_player(cls):
+        """Returns the path to the first available player in PLAYERS, or None if there isn't one."""
+        for player in cls.PLAYERS:
+            path = shutil.which(player)
+            if path:
+                return path
+        return None
+
+    def play(self, filename):
+        """Queues a sound to be played.  Returns False if it was dropped as a duplicate or due to a full queue."""
+        now = time.monotonic()
+        last = self.requested.get(filename)
+        if last is not None and now - last < self.window:
+            return False
+        if len(self.requested) > 4 * self.queue_size:
+            # Forget about sounds that are no longer recent, so this doesn't grow forever.
+            self.requested = {fn: t for fn, t in self.requested.items() if now - t < self.window}
+
+        if len(self.queue) >= self.queue_size:
+            return False  # Not remembered as requested, so it can be played once there's room.
+        self.requested[filename] = now
+        self.queue.append(filename)
+        self._pump()
+        return True
+
+    def _pump(self):
+        """Starts the next sound if nothing is playing.  Returns True if there's still something to wait for."""
+        if self.process is not None:
+            if self.process.poll() is None:
+                return self._schedule()
+            self.process = None
+
+        while self.queue and self.process is None:
+            filename = self.queue.popleft()
+            try:
+                self.process = subprocess.Popen(
+                    [self.command, filename],
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except OSError as ex:
+                print(IRC.bold("** Unable to play sound using '{}': {} **".format(self.command, str(ex))))
+
+        if self.process is None:
+            return False
+        return self._schedule()
+
+    def _schedule(self):
+        if self.timer is None:
+            self.timer = hexchat.hook_timer(self.POLL_INTERVAL, self._timer_hook)
+        return True
+
+    def _timer_hook(self, userdata):
+        busy = self._pump()
+        if not busy:
+            self.timer = None
+        return busy
+
+    def stop(self):
+        """Stops any playing sound and discards the queue."""
+        self.queue.clear()
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                # Reap it, or it lingers as a zombie.
+                try:
+                    self.process.wait(self.STOP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+
+
+class Notification:
+    """A pending notification: the last alert in a channel, and how many alerts there have been in it."""
+    def __init__(self, network, channel, is_channel, nick, message):
+        self.network = network
+        self.channel = channel
+        self.is_channel = is_channel
+        self.nick = nick
+        self.message = message
+        self.count = 1
+
+    def format(self, focused_network=None):
+        """Returns the line to show in the focused window (on focused_network)."""
+        network = "" if self.network == focused_network else "/" + self.network
+        if self.count > 1:
+            if self.is_channel:
+                fmt = "[{count} alerts in {channel}{network}: last from {nick}]"
+            else:
+                fmt = "[{count} alerts in PM from {nick}{network}]"
+        elif self.is_channel:
+            fmt = "[{nick} on {channel}{network}: {message}]"
+        else:
+            fmt = "[PM from {nick}{network}: {message}]"
+        return fmt.format(
+            count=self.count, nick=self.nick, channel=self.channel, network=network, message=self.message
+        )
+
+
+class NotifyBuffer:
+    """
+    Collects notifications for a few seconds, then prints one line per channel.
+
+    Only the most recent alert of each channel is kept, and at most MAX_CHANNELS channels are tracked at once; alerts
+    from any further channels are only counted.
+    """
+    MAX_CHANNELS = 20
+
+    def __init__(self, window):
+        self.window = window
+        self.pending = OrderedDict()  # (network, channel) -> Notification
+        self.overflow = 0
+        self.timer = None
+
+    def add(self, event, message):
+        """Queues a notification for event, which triggered an alert that output message."""
+        network = event.current.network
+        key = (network, irc_fold(event.channel, event.casemapping))
+        notification = self.pending.get(key)
+        if notification is not None:
+            notification.count += 1
+            notification.nick = event.nick
+            notification.message = message
+        elif len(self.pending) < self.MAX_CHANNELS:
+            self.pending[key] = Notification(network, event.channel, event.is_channel, event.nick, message)
+        else:
+            self.overflow += 1
+
+        if self.timer is None:
+            self.timer = hexchat.hook_timer(int(self.window * 1000), self._timer_hook)
+
+    def _timer_hook(self, userdata):
+        self.timer = None
+        self.flush()
+        return False  # One-shot timer
+
+    def flush(self):
+        """Prints all pending notifications to the focused window."""
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+        pending, overflow = self.pending, self.overflow
+        self.pending = OrderedDict()
+        self.overflow = 0
+
+        focused = Context.focused()
+        if focused is None:
+            return
+        network = focused.network
+        for notification in pending.values():
+            focused.print(notification.format(network))
+        if overflow:
+            focused.print("[{} more alert(s) in other channels]".format(overflow))
+
+    def stop(self):
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+        self.pending.clear()
+        self.overflow = 0
+
+
+class CopyWindow:
+    """
+    A query window that alerts are copied to (see the copy setting).
+
+    Remembers the most recent lines copied, so that if the window is closed they can all be written again when it is
+    next needed.
+
+    :ivar lines: The most recent (name, message) lines copied.
+    :ivar unwritten: How many lines at the end of `lines` have not been written to the window yet.
+    :ivar context: The window's context, as of the last time it was written to.
+    """
+    def __init__(self, network, server_id, name, backlog):
+        self.network = network
+        self.server_id = server_id
+        self.name = name
+        self.lines = collections.deque(maxlen=backlog)
+        self.unwritten = 0
+        self.context = None
+
+    def add(self, name, message):
+        self.lines.append((name, message))
+        self.unwritten = min(self.unwritten + 1, len(self.lines))
+
+    def resize(self, backlog):
+        """Changes how many lines are remembered, keeping the most recent."""
+        self.lines = collections.deque(self.lines, maxlen=backlog)
+        self.unwritten = min(self.unwritten, len(self.lines))
+
+    def _server_context(self):
+        """Returns a context on the same server, from which we can open a query window."""
+        for channel in hexchat.get_list('channels') or ():
+            if channel.id == self.server_id:
+                return Context(channel.context)
+        return None
+
+    def flush(self):
+        """Writes any unwritten lines to the window, creating it if needed.  Returns False if it couldn't be created."""
+        if not self.unwritten:
+            return True
+        context = Context.find(self.network, self.name, self.server_id)
+        if not context:
+            server = self._server_context()
+            if server is not None:
+                server.command("QUERY -nofocus " + self.name)
+                context = Context.find(self.network, self.name, self.server_id)
+        if not context:
+            return False
+
+        if context == self.context:
+            lines = itertools.islice(self.lines, len(self.lines) - self.unwritten, None)
+        else:
+            lines = self.lines  # New (or reopened) window, so start it off with everything we remember.
+        for name, message in lines:
+            context.emit_print("Channel Message", name, message)
+        self.context = context
+        self.unwritten = 0
+        return True
+
+
+class CopyBuffer:
+    """
+    Batches writes to copy windows.  Lines are collected for `delay` seconds, then each window is written to at once.
+    """
+    def __init__(self, delay, backlog):
+        self.delay = delay
+        self.backlog = backlog
+        self.windows = {}  # (server id, window name) -> CopyWindow
+        self.timer = None
+
+    def add(self, context, window, name, message):
+        """Queues a line to be written to the copy window named window, on the same server as context."""
+        key = (context.id, irc_fold(window, plugin.casemapping(context.network)))
+        copy_window = self.windows.get(key)
+        if copy_window is None:
+            copy_window = self.windows[key] = CopyWindow(context.network, context.id, window, self.backlog)
+        copy_window.add(name, message)
+
+        if not self.delay:
+            self.flush()
+        elif self.timer is None:
+            self.timer = hexchat.hook_timer(int(self.delay * 1000), self._timer_hook)
+
+    def _timer_hook(self, userdata):
+        self.timer = None
+        self.flush()
+        return False  # One-shot timer
+
+    def flush(self):
+        """Writes all pending lines."""
+        ignore_messages, plugin.ignore_messages = plugin.ignore_messages, True  # Don't alert on our own copies.
+        try:
+            for copy_window in self.windows.values():
+                if not copy_window.flush():
+                    print(IRC.bold("** Unable to open/create query window '{}' **".format(copy_window.name)))
+                    copy_window.unwritten = 0
+        finally:
+            plugin.ignore_messages = ignore_messages
+
+    def configure(self, delay, backlog):
+        """Changes the delay and backlog, keeping what each window remembers (up to the new backlog)."""
+        self.delay = delay
+        if backlog != self.backlog:
+            self.backlog = backlog
+            for copy_window in self.windows.values():
+                copy_window.resize(backlog)
+        if not delay and self.timer is not None:
+            self.stop()
+            self.flush()
+
+    def stop(self):
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+
+
+class DuplicateFilter:
+    """
+    Recognizes alerts that have already triggered recently on the same message from the same nick -- typically because a
+    bridge or bot relayed it to several channels -- so their sounds and other actions aren't repeated.
+
+    Fingerprints are forgotten `window` seconds after they were first seen, and at most MAX_ENTRIES are remembered, so
+    memory use stays bounded however busy things get.
+    """
+    MAX_ENTRIES = 1000
+
+    def __init__(self, window):
+        self.window = window
+        self.seen = OrderedDict()  # Fingerprint -> time first seen, oldest first.
+        self.suppressed = 0
+
+    def check(self, alert, event):
+        """Returns True if alert already triggered on this message (from this nick) within the window."""
+        now = time.monotonic()
+        seen = self.seen
+        while seen:
+            oldest = next(iter(seen.values()))
+            if now - oldest < self.window:
+                break
+            seen.popitem(last=False)
+
+        fingerprint = (alert, irc_fold(event.nick, event.casemapping), event.stripped_message)
+        if fingerprint in seen:
+            self.suppressed += 1
+            return True
+        seen[fingerprint] = now
+        if len(seen) > self.MAX_ENTRIES:
+            seen.popitem(last=False)
+        return False
+
+
+class LatencyHistogram:
+    """
+    Counts how many times something took how long, in a fixed set of buckets.
+
+    Memory use is constant no matter how many times are recorded, so this can be left running indefinitely.
+    Percentiles are estimated as the upper bound of the bucket they fall into.
+    """
+    #: Upper bounds of each bucket, in microseconds.  There's one more bucket for anything slower than the last.
+    BOUNDS = tuple(multiplier * 10 ** exponent for exponent in range(7) for multiplier in (1, 2, 5))
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1000000
+        self.buckets[bisect.bisect_left(self.BOUNDS, us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, fraction):
+        """Returns (an upper bound on) the time in microseconds that `fraction` of recorded times were within."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+#: What counts as a word, for Alert.token and ChatEvent.tokens().  The same as where \b finds word boundaries.
+WORD_REGEX = re.compile(r'\w+')
+
+
+class WordIndex:
+    """
+    Finds which of a list of alerts might match a message, without checking every one of them.
+
+    Most alerts match a single whole word (their token).  Rather than each of those scanning the message for its word,
+    the message is split into words once (see ChatEvent.tokens) and each word is looked up here to find the alerts
+    that want it.  Alerts with anything more complicated are always candidates.
+    """
+    def __init__(self, alerts):
+        self.words = {}  # Strip flags -> {token: [(position, alert)...]}
+        self.others = []  # (position, alert) for alerts without a token.
+        for position, alert in enumerate(alerts):
+            if alert.token is None:
+                self.others.append((position, alert))
+            else:
+                self.words.setdefault(alert.strip_flags, {}).setdefault(alert.token, []).append((position, alert))
+
+    def candidates(self, event):
+        """Returns an iterator, in list order, of the alerts whose token is in event's message and those without one."""
+        found = []
+        for flags, words in self.words.items():
+            for token in event.tokens(flags):
+                found.extend(words.get(token, ()))
+        if not found:
+            return (alert for _, alert in self.others)
+        found.sort(key=lambda item: item[0])
+        return (alert for _, alert in heapq.merge(self.others, found, key=lambda item: item[0]))
+
+
+class MatchCacheEntry:
+    """
+    Which alerts match one message, found lazily: alerts are only checked when someone asks what comes after the ones
+    found so far.  Usually that stops at the first alert that matches and passes its nickname filter.
+
+    Iterating gives (alert, message, spans) for each enabled alert whose regex matched, in list order.
+    """
+    __slots__ = ('event', 'candidates', 'found')
+
+    def __init__(self, event, candidates):
+        self.event = event  # The first event with this text.  Alerts are only checked against the text.
+        self.candidates = candidates  # Iterator of the alerts not checked yet, or None once they all have been.
+        self.found = []
+
+    def __iter__(self):
+        ix = 0
+        while True:
+            if ix < len(self.found):
+                yield self.found[ix]
+                ix += 1
+                continue
+            if self.candidates is None or not self._check_next():
+                return
+
+    def _check_next(self):
+        """Checks alerts until one matches.  Returns False if there were none left."""
+        for alert in self.candidates:
+            if not alert.enabled or alert.regex is None:
+                continue
+            result = alert.scan(self.event)
+            if result is not None:
+                self.found.append((alert,) + result)
+                return True
+        self.candidates = None
+        return False
+
+
+class MatchCache:
+    """
+    Remembers which alerts matched recently seen messages, so that the same text arriving again -- as it does when bots
+    and bridges relay it to many channels -- isn't checked against every alert again.
+
+    Entries are kept per network, and only hold alerts for that network (see MatchCacheEntry).  Anything that depends
+    on the event rather than its text (nickname filters) is left to handle_found().  Everything is forgotten whenever
+    plugin.alerts.generation changes.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()  # (lowercase network, message) -> MatchCacheEntry, least recently used first.
+        self.generation = None  # plugin.alerts.generation the entries were made with.
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, event):
+        """Returns a MatchCacheEntry of which alerts match event's message, making one if it isn't cached."""
+        if self.generation != plugin.alerts.generation:
+            self.entries.clear()
+            self.generation = plugin.alerts.generation
+        network = event.current.network.lower() if event.current.network else ''
+        key = (network, event.message)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = self.entries[key] = MatchCacheEntry(event, plugin.alerts.word_index(network).candidates(event))
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def find_python():
+    """Returns the path to a Python interpreter for worker processes, or None if one can't be found."""
+    # Inside Hexchat, sys.executable is usually Hexchat itself.
+    for path in (getattr(sys, '_base_executable', None), sys.executable):
+        if path and os.path.basename(path).lower().startswith('python') and os.path.exists(path):
+            return path
+    return shutil.which('python3') or shutil.which('python')
+
+
+def read_available(pipe):
+    """
+    Reads whatever is waiting in pipe without blocking.
+
+    :return: The data (which may be b"" if nothing is waiting), or None if the other end has been closed.
+    """
+    fd = pipe.fileno()
+    if os.name == 'nt':
+        import msvcrt
+        import _winapi
+        try:
+            available = _winapi.PeekNamedPipe(msvcrt.get_osfhandle(fd), 0)[0]
+        except OSError:
+            return None
+        return os.read(fd, available) if available else b""
+    try:
+        return os.read(fd, 65536) or None
+    except BlockingIOError:
+        return b""
+
+
+class MatchJob:
+    """A message waiting for results from a MatchPool."""
+    __slots__ = ('id', 'event', 'alerts', 'texts', 'waiting', 'matches', 'submitted')
+
+    def __init__(self, id, event, alerts, texts, waiting):
+        self.id = id
+        self.event = event
+        self.alerts = alerts  # The alerts the workers' rules were built from.
+        self.texts = texts  # Strip flags -> FoldedText of the message stripped with those flags.
+        self.waiting = waiting  # Number of workers that haven't answered yet.
+        self.matches = []  # (alert index, spans) from each worker.
+        self.submitted = time.perf_counter()
+
+
+class MatchPool:
+    """
+    Checks messages against alerts in worker processes, for when there are far too many alerts to check in Hexchat
+    itself.  (Python's re module holds on to the GIL while matching, so Hexchat would freeze.)
+
+    Alerts are divided evenly between the workers, and each message is sent to all of them.  The message is held back
+    until every worker has answered, then printed -- either by the first alert that matches, as usual, or unchanged.
+    Answers are collected by a timer, and messages are always printed in the order they arrived.
+
+    Workers are separate Python processes running WORKER_SOURCE, which talk to us in JSON lines over stdin/stdout.
+    Neither end blocks Hexchat: what a worker isn't ready to read yet is kept and sent by the timer.  (Except on
+    Windows, where pipes can't be made non-blocking.)
+    """
+    #: How often to check for answers, in milliseconds.
+    POLL_INTERVAL = 20
+    #: If this many messages are waiting, further messages are checked in Hexchat (and so may be printed before them)
+    #: until the workers catch up.
+    MAX_PENDING = 500
+
+    WORKER_SOURCE = r'''
+import json, re, sys
+rules = []
+for line in sys.stdin:
+    request = json.loads(line)
+    if 'rules' in request:
+        rules = [
+            (re.compile(regex, flags), str(strip), not flags & re.IGNORECASE)
+            for regex, flags, strip in request['rules']
+        ]
+        continue
+    texts = request['texts']
+    matches = []
+    for ix, (regex, strip, folded) in enumerate(rules):
+        spans = [match.span() for match in regex.finditer(texts[strip][folded])]
+        if spans:
+            matches.append((ix, spans))
+    sys.stdout.write(json.dumps({'id': request['id'], 'matches': matches}) + '\n')
+    sys.stdout.flush()
+'''
+
+    def __init__(self, workers, python):
+        self.processes = []
+        self.buffers = []  # Incomplete output from each worker
+        self.outgoing = []  # What each worker hasn't been able to read yet.
+        for _ in range(workers):
+            process = subprocess.Popen(
+                [python, '-c', self.WORKER_SOURCE],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            if os.name != 'nt':
+                os.set_blocking(process.stdin.fileno(), False)
+                os.set_blocking(process.stdout.fileno(), False)
+            self.processes.append(process)
+            self.buffers.append(b"")
+            self.outgoing.append(bytearray())
+        self.jobs = OrderedDict()  # id -> MatchJob, in the order they arrived.
+        self.next_id = 0
+        self.generation = None  # plugin.alerts.generation the workers' rules were built from.
+        self.alerts = ()
+        self.shards = []  # Index of the first alert each worker has.
+        self.strip_flags = ()  # The different ways messages need to be stripped for these alerts.
+        self.timer = None
+
+    def _send(self, ix, data):
+        self.outgoing[ix] += json.dumps(data, separators=(',', ':')).encode() + b"\n"
+        self._write(ix)
+
+    def _write(self, ix):
+        """Writes as much of what's waiting for worker ix as it will take without blocking."""
+        outgoing = self.outgoing[ix]
+        while outgoing:
+            try:
+                written = os.write(self.processes[ix].stdin.fileno(), outgoing)
+            except BlockingIOError:
+                return
+            del outgoing[:written]
+
+    def _sync_rules(self):
+        """Sends the workers a new set of rules, if the alerts have changed."""
+        if self.generation == plugin.alerts.generation:
+            return
+        self.generation = plugin.alerts.generation
+        self.alerts = [alert for alert in plugin.alerts.snapshot() if alert.regex is not None]
+        self.strip_flags = tuple({alert.strip_flags for alert in self.alerts})
+        rules = [[alert.regex.pattern, alert.regex.flags, alert.strip_flags] for alert in self.alerts]
+        size = -(-len(rules) // len(self.processes))  # Round up
+        self.shards = []
+        for ix in range(len(self.processes)):
+            self.shards.append(ix * size)
+            self._send(ix, {'rules': rules[ix * size:(ix + 1) * size]})
+
+    def submit(self, event):
+        """
+        Sends event to the workers.  Returns False if that failed or too many messages are already waiting, in which
+        case the caller must handle it.
+        """
+        if len(self.jobs) >= self.MAX_PENDING or not self.processes:
+            return False
+        try:
+            self._sync_rules()
+            texts = {
+                flags: event.fold(event.strip_message(flags) if flags else event.message) for flags in self.strip_flags
+            }
+            job = MatchJob(self.next_id, event, self.alerts, texts, len(self.processes))
+            request = {
+                'id': job.id,
+                'texts': {str(flags): [text.original, text.text] for flags, text in texts.items()}
+            }
+            for ix in range(len(self.processes)):
+                self._send(ix, request)
+        except OSError as ex:
+            self.fail(ex)
+            return False
+        self.next_id += 1
+        self.jobs[job.id] = job
+        if self.timer is None:
+            self.timer = hexchat.hook_timer(self.POLL_INTERVAL, self._timer_hook)
+        return True
+
+    def _write_all(self):
+        """Sends workers whatever they haven't been able to read yet.  Returns False if that failed."""
+        try:
+            for ix in range(len(self.processes)):
+                self._write(ix)
+        except OSError as ex:
+            self.fail(ex)
+            return False
+        return True
+
+    def _timer_hook(self, userdata):
+        if not self._write_all():
+            return False
+        self.poll()
+        if self.jobs:
+            return True
+        self.timer = None
+        return False
+
+    def poll(self):
+        """Collects any answers from the workers, and prints messages that have all of theirs."""
+        for ix, process in enumerate(self.processes):
+            data = read_available(process.stdout)
+            if data is None:
+                self.fail("worker exited unexpectedly")
+                return
+            if not data:
+                continue
+            lines = (self.buffers[ix] + data).split(b"\n")
+            self.buffers[ix] = lines.pop()
+            for line in lines:
+                result = json.loads(line.decode())
+                job = self.jobs.get(result['id'])
+                if job is None:
+                    continue
+                offset = self.shards[ix]
+                job.matches.extend((offset + index, spans) for index, spans in result['matches'])
+                job.waiting -= 1
+
+        open_contexts = None  # Looked up once for all the messages finished here.
+        while self.jobs:
+            job = next(iter(self.jobs.values()))
+            if job.waiting:
+                break
+            del self.jobs[job.id]
+            if open_contexts is None:
+                open_contexts = Context.open_contexts()
+            self._finish(job, open_contexts)
+
+    def _finish(self, job, open_contexts):
+        event = job.event
+        found = []
+        job.matches.sort(key=lambda match: match[0])
+        for index, spans in job.matches:
+            alert = job.alerts[index]
+            text = job.texts[alert.strip_flags]
+            if alert.casefolded:
+                spans = text.map_spans(spans)
+            found.append((alert, text.original, spans))
+        finish_event(event, found, open_contexts)
+        plugin.record_latency("(pooled) " + event.event, time.perf_counter() - job.submitted)
+
+    def wait(self, pending=0):
+        """
+        Blocks until no more than pending messages are waiting.  This freezes Hexchat: it's for tests and benchmarks.
+        """
+        while len(self.jobs) > pending and self.processes:
+            if not self._write_all():
+                return
+            self.poll()
+            time.sleep(0.001)
+
+    def fail(self, reason):
+        """Shuts down after a worker fails, handling any waiting messages the normal way."""
+        print(IRC.bold("** Matching in worker processes failed ({}), turning it off. **".format(reason)))
+        plugin.match_pool = None
+        self.stop()
+
+    def stop(self):
+        """Stops the workers.  Messages still waiting are handled the normal way."""
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+        for process in self.processes:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.terminate()
+        self.processes = []
+        jobs, self.jobs = self.jobs, OrderedDict()
+        open_contexts = Context.open_contexts()
+        for job in jobs.values():
+            finish_event(job.event, None, open_contexts)
+
 
 class Plugin:
     # Try to collect all of our global state under one roof.
 
     commands = OrderedDict()
+    options = OrderedDict()
 
     DIRECTION_SYNONYMS = {
         'first': 'first', 'front': 'first', 'begin': 'first', 'beginning': 'first',
@@ -247,27 +1209,142 @@ class Plugin:
 
     def __init__(self):
         self.sound_search_path = None
+        self.sound_player = None
+        for option in self.options.values():
+            option.load(self)
         self._init_sound()
+        self.update_sound_player()
+        self.notify_buffer = None
+        self.update_notify_buffer()
+        self.copy_buffer = None
+        self.update_copy_buffer()
+        self.duplicate_filter = None
+        self.update_duplicate_filter()
         self.alerts = AlertDict()
+        self.filter_lists = {}  # Lowercase name -> FilterList
         self.ignore_messages = False  # Prevents us from triggering our own events.
+        self.profiler = None
+        self.latency = {}  # Event type -> LatencyHistogram
+        self.casemappings = {}  # Lowercase network name -> CASEMAPPING advertised by its server.
+        self.match_pool = None
+        self.update_match_pool()
+        self.match_cache = None
+        self.update_match_cache()
+        self.tasks = TaskScheduler()
+
+    def update_sound_player(self):
+        """(Re)creates the local sound player to match the current sound options."""
+        if self.sound_player is not None:
+            self.sound_player.stop()
+            self.sound_player = None
+
+        player = self.sound_backend
+        if player == 'auto':
+            player = SoundPlayer.find_player() if os.name == "posix" else None
+        elif player == 'splay':
+            player = None
+        if player is not None:
+            self.sound_player = SoundPlayer(player, window=self.sound_window, queue_size=self.sound_queue)
+
+    def update_notify_buffer(self):
+        """Starts or stops collecting notifications to match the notify_window option."""
+        if self.notify_buffer is not None:
+            self.notify_buffer.flush()
+            self.notify_buffer.stop()
+            self.notify_buffer = None
+        if self.notify_window:
+            self.notify_buffer = NotifyBuffer(self.notify_window)
+
+    def update_copy_buffer(self):
+        """Creates the copy buffer, or updates it to match the copy_delay and copy_backlog options."""
+        if self.copy_buffer is None:
+            self.copy_buffer = CopyBuffer(self.copy_delay, self.copy_backlog)
+        else:
+            self.copy_buffer.configure(self.copy_delay, self.copy_backlog)
+
+    def update_duplicate_filter(self):
+        """Starts or stops recognizing duplicate alerts to match the duplicate_window option."""
+        self.duplicate_filter = DuplicateFilter(self.duplicate_window) if self.duplicate_window else None
+
+    def update_match_pool(self):
+        """(Re)starts or stops worker processes to match the match_workers option."""
+        if self.match_pool is not None:
+            self.match_pool.stop()
+            self.match_pool = None
+        if not self.match_workers:
+            return
+        python = find_python() if self.match_python == 'auto' else self.match_python
+        if not python:
+            print(IRC.bold("** Can't find Python to run worker processes.  Set the match_python option. **"))
+            return
+        try:
+            self.match_pool = MatchPool(self.match_workers, python)
+        except OSError as ex:
+            print(IRC.bold("** Unable to start worker processes using '{}': {} **".format(python, str(ex))))
+
+    def update_match_cache(self):
+        """Replaces the match cache (forgetting everything in it) to match the match_cache_size option."""
+        self.match_cache = MatchCache(self.match_cache_size) if self.match_cache_size else None
+
+    def record_latency(self, name, seconds):
+        """Records how long handling something (usually a type of print event) took.  See /alerts latency."""
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def casemapping(self, network):
+        """Returns the case mapping used by network.  (If we haven't seen it advertised, the IRC default.)"""
+        return self.casemappings.get(network.lower() if network else '', DEFAULT_CASEMAPPING)
+
+    def notify(self, event, message):
+        """Tells the user about an alert (which output message) in a window other than the one they're looking at."""
+        if self.notify_buffer is not None:
+            self.notify_buffer.add(event, message)
+            return
+        notification = Notification(event.current.network, event.channel, event.is_channel, event.nick, message)
+        event.focused.print(notification.format(event.focused.network))
 
     def playsound(self, filename):
         """
         Plays a sound.
 
-        The default implementation uses hexchat's /splay command.
+        The default implementation uses hexchat's /splay command.  If a local player is configured (see the
+        sound_backend option), it is used instead.
 
         Bugs: Won't handle filenames with quotes in them, but not much does.  Blame Hexchat.
         """
+        if self.sound_player is not None:
+            self.sound_player.play(filename)
+            return
         hexchat.command("splay \"{}\"".format(filename))
 
     def save(self):
         """Save alerts data"""
         data = list(alert.export_dict() for alert in self.alerts.values())
         hexchat.set_pluginpref("python_alerts_saved", json.dumps(data))
+        data = {filter_list.name: filter_list.dump() for filter_list in self.filter_lists.values()}
+        hexchat.set_pluginpref("python_alerts_filterlists", json.dumps(data))
 
     def load(self):
         """Load alerts data"""
+        # Hexchat doesn't tell plugins what a server advertised before they were loaded, so remember it ourselves.
+        data = hexchat.get_pluginpref("python_alerts_casemappings")
+        if data:
+            try:
+                self.casemappings = dict(json.loads(data))
+            except Exception as ex:
+                print("Failed to load case mappings:", str(ex))
+
+        data = hexchat.get_pluginpref("python_alerts_filterlists")
+        if data:
+            try:
+                self.filter_lists = {
+                    name.lower(): FilterList.load(name, rules) for name, rules in json.loads(data).items()
+                }
+            except Exception as ex:
+                print("Failed to load filter lists:", str(ex))
+
         data = hexchat.get_pluginpref("python_alerts_saved")
         if data is None:
             return
@@ -346,6 +1423,179 @@ class Pattern:
         return "".join(result)
 
 
+def find_regex_hazard(regex):
+    """
+    Looks for constructs in a regular expression that can take exponential time to fail to match, such as (a+)+
+
+    Only catches the obvious cases: a group repeated an unbounded (or large) number of times, where the group is a
+    variable-length repeat with nothing mandatory alongside it.  That's what lets the regex engine try every possible
+    way of dividing up the text between repetitions.  '(\\w+\\s)*' is fine, since each repetition must end with a
+    space, but '(\\w+\\s?)*' is not.
+
+    :param regex: Regular expression string
+    :return: A description of the problem, or None if none was found.
+    """
+    repeats = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+
+    def ambiguous(items):
+        """Returns True if items consist of a variable-length repeat, plus optional items."""
+        variable = False
+        for op, av in items:
+            if op in repeats:
+                low, high, sub = av
+                if high != low and high > 1:
+                    variable = True
+                elif low:
+                    return False
+            elif op == sre_parse.SUBPATTERN:
+                if not ambiguous(av[-1]):
+                    return False
+                variable = True
+            elif op == sre_parse.BRANCH:
+                if not any(ambiguous(branch) for branch in av[1]):
+                    return False
+                variable = True
+            else:
+                return False
+        return variable
+
+    def walk(items):
+        for op, av in items:
+            if op in repeats:
+                low, high, sub = av
+                if (high == sre_parse.MAXREPEAT or high > 10) and ambiguous(sub):
+                    return "a repeated group can match the same text in many different ways (like '(a+)+')"
+                children = [sub]
+            elif op == sre_parse.SUBPATTERN:
+                children = [av[-1]]
+            elif op == sre_parse.BRANCH:
+                children = av[1]
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                children = [av[1]]
+            else:
+                continue
+            for child in children:
+                result = walk(child)
+                if result:
+                    return result
+        return None
+
+    return walk(sre_parse.parse(regex))
+
+
+#: Translation tables for the case mappings a server may advertise with CASEMAPPING in RPL_ISUPPORT.  In rfc1459
+#: (the default), []\~ are the uppercase versions of {}|^.
+CASEMAPPINGS = {
+    'ascii': str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    'rfc1459': str.maketrans(string.ascii_uppercase + '[]\\~', string.ascii_lowercase + '{}|^'),
+    'strict-rfc1459': str.maketrans(string.ascii_uppercase + '[]\\', string.ascii_lowercase + '{}|'),
+}
+DEFAULT_CASEMAPPING = 'rfc1459'
+
+
+def irc_fold(text, casemapping=DEFAULT_CASEMAPPING):
+    """
+    Folds the case of a nickname or channel name the way a server using casemapping does.  Case mappings we don't know
+    of (like rfc7613) are assumed to be Unicode-aware, and use casefolding.
+    """
+    table = CASEMAPPINGS.get(casemapping)
+    if table is None:
+        return text.casefold()
+    return text.translate(table)
+
+
+def compile_regex(regex):
+    """
+    Compiles an alert's regex, which matches case-insensitively.
+
+    Where possible, the regex is compiled without re.IGNORECASE, to be matched against casefolded text (see FoldedText)
+    instead -- which is considerably faster.  That only works if the regex has nothing that casefolding would change,
+    so anything like 'Hello' or '[A-Z]' is compiled with re.IGNORECASE and must be matched against the original text.
+    Check the flags of the result to tell which.
+    """
+    def folded(items):
+        for op, av in items:
+            if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL):
+                if chr(av).casefold() != chr(av):
+                    return False
+            elif op == sre_parse.RANGE:
+                low, high = av
+                if high - low > 1000 or any(chr(c).casefold() != chr(c) for c in range(low, high + 1)):
+                    return False
+            elif op == sre_parse.IN:
+                if not folded(av):
+                    return False
+            elif not all(folded(child) for child in subpatterns(av)):
+                return False
+        return True
+
+    def subpatterns(av):
+        """Finds nested subpatterns (of groups, repeats, branches, lookarounds...) in an opcode's arguments."""
+        if isinstance(av, sre_parse.SubPattern):
+            yield av
+        elif isinstance(av, (tuple, list)):
+            for item in av:
+                yield from subpatterns(item)
+
+    if folded(sre_parse.parse(regex)):
+        return re.compile(regex)
+    return re.compile(regex, re.IGNORECASE)
+
+
+def starting_with(words, prefix):
+    """Returns the strings in words (a sorted list) that start with prefix."""
+    start = bisect.bisect_left(words, prefix)
+    return list(itertools.takewhile(lambda word: word.startswith(prefix), itertools.islice(words, start, None)))
+
+
+def compile_wildcard(pattern):
+    """Compiles a pattern where * matches anything and ? matches any one character.  Use fullmatch()."""
+    return re.compile(
+        ".*".join(".".join(re.escape(part) for part in chunk.split("?")) for chunk in pattern.split("*")), re.DOTALL
+    )
+
+
+class FoldedText:
+    """
+    Casefolded copy of some text, for matching regexes made by compile_regex().
+
+    Casefolding can make text longer ('ß' becomes 'ss'), so spans of matches are mapped back to the original text.
+
+    :ivar original: The original text.
+    :ivar text: The casefolded text.
+    """
+    __slots__ = ('original', 'text', 'positions')
+
+    def __init__(self, original):
+        self.original = original
+        self.text = original.casefold()
+        if len(self.text) == len(original):
+            self.positions = None  # Nothing changed length, so positions are the same in both.
+        else:
+            # Position in the original text of each character of the folded text.
+            self.positions = [ix for ix, char in enumerate(original) for _ in char.casefold()]
+
+    def spans(self, matches):
+        """Returns a list of where each of matches (found in the folded text) is in the original text."""
+        if self.positions is None:
+            return [match.span() for match in matches]
+        return self.map_spans(match.span() for match in matches)
+
+    def map_spans(self, spans):
+        """Returns a list of where each of spans (in the folded text) is in the original text."""
+        if self.positions is None:
+            return list(spans)
+        positions = self.positions
+        length = len(self.original)
+        result = []
+        for start, end in spans:
+            # A match can start or end partway through what one character folded to.  Include all of that character.
+            original_start = positions[start] if start < len(positions) else length
+            original_end = positions[end - 1] + 1 if end > start else original_start
+            result.append((original_start, original_end))
+        return result
+
+
 class UserPattern(Pattern):
     """
     Represents a pattern that might match a nick!user@host pattern.  Works by compiling patterns into a regex
@@ -366,84 +1616,224 @@ class UserPattern(Pattern):
     nickname!@host      => nickname!*@host
     !user@host          => *!user@host
     @host               => *!*@host
+
+    Patterns are compiled to be as cheap to match as possible: a string comparison where no wildcards need matching,
+    otherwise the appropriate compiled regex method.  methodname says which was chosen.
+    """
+
+    # How to check a pattern with no wildcards left, or with some, by whether it's anchored at the (start, end).
+    _LITERAL_METHODS = {
+        (True, True): '==', (True, False): 'startswith', (False, True): 'endswith', (False, False): 'in'
+    }
+    _REGEX_METHODS = {
+        (True, True): 'fullmatch', (True, False): 'match', (False, True): 'search', (False, False): 'search'
+    }
+
+    # Regex to split nick!user@host and other formats into components.
+    _split_regexp = re.compile(
+        r"""(?x)
+        ^(?:
+            # Match bare nicknames and empty strings
+            (?:(?P<barenick>[^!@]*))
+            | # Or match [nick!]user@host or some portion thereof.
+            (?:
+                (?:(?P<nick>[^!@]*)(?=!))?
+                (?:!?(?P<user>[^!@]*)(?=$|@))?
+                (?:@?(?P<host>[^!@]*))?
+            )
+        )$
+        """
+    )
+
+    def __init__(self, pattern):
+        self.text = pattern
+        result = self._split_regexp.fullmatch(pattern)
+        if not result:
+            raise ValueError("Invalid user pattern {!r}".format(pattern))
+        result = result.groupdict(None)
+
+        self.nick = result['barenick'] or result['nick'] or '*'
+        self.user = result['user'] or '*'
+        self.host = result['host'] or '*'
+
+        # The straightforward translation of the pattern, to be matched with re.IGNORECASE.
+        self.components = (self.nick, self.user, self.host)
+        self.full_regex = '^{}!{}@{}$'.format(*(self.regexify(component) for component in self.components))
+        self.always_matches = not any(set(component) - {'*'} for component in self.components)
+
+        # Compiled lazily for each casemapping, since that's different from network to network.
+        self._matchers = {}
+        self.regex, self.literal, self.methodname, self._matchers[DEFAULT_CASEMAPPING] = self._compile(
+            DEFAULT_CASEMAPPING
+        )
+
+    def _compile(self, casemapping):
+        """
+        Compiles this pattern for text folded with casemapping (see irc_fold)
+
+        :return: (regex, literal, methodname, match)
+        """
+        if self.always_matches:
+            return "", None, '<True>', lambda unused: True
+
+        # Since this is checked against a lot of incoming text, do something cheaper than full_regex where we can.
+        # Components that are nothing but '*' can be dropped from either end, along with the anchor on that end:
+        # '*!*@host' only needs to find '@host' at the end of the string.  If no wildcards are left after that, a string
+        # comparison will do.
+        components = tuple(irc_fold(component, casemapping) for component in self.components)
+        significant = [bool(set(component) - {'*'}) for component in components]
+        first = significant.index(True)
+        last = len(significant) - 1 - significant[::-1].index(True)
+        anchors = (first == 0, last == len(components) - 1)
+        separators = ("", "!", "@", "")  # separators[ix] comes before components[ix]
+
+        def join(convert):
+            pieces = [separators[first]]
+            for ix in range(first, last + 1):
+                if ix != first:
+                    pieces.append(separators[ix])
+                pieces.append(convert(components[ix]))
+            pieces.append(separators[last + 1])
+            return "".join(pieces)
+
+        regex = join(self.regexify)
+        if not any(char in component for component in components[first:last + 1] for char in "*?+"):
+            literal = join(str)
+            methodname = self._LITERAL_METHODS[anchors]
+            match = {
+                '==': literal.__eq__,
+                'startswith': lambda text: text.startswith(literal),
+                'endswith': lambda text: text.endswith(literal),
+                'in': lambda text: literal in text,
+            }[methodname]
+            return regex, literal, methodname, match
+
+        methodname = self._REGEX_METHODS[anchors]
+        if anchors == (False, True):
+            regex += "$"
+        return regex, None, methodname, getattr(re.compile(regex), methodname)
+
+    def match(self, nickuserhost, casemapping=DEFAULT_CASEMAPPING):
+        """Returns a true value if nickuserhost, which must be folded by irc_fold() using casemapping, matches."""
+        matcher = self._matchers.get(casemapping)
+        if matcher is None:
+            matcher = self._matchers[casemapping] = self._compile(casemapping)[3]
+        return matcher(nickuserhost)
+
+
+#: How each kind of rule in a filter is written.  (allowed is None for USE rules.)
+FILTER_ACTIONS = {True: "ALLOW", False: "DENY", None: "USE"}
+
+
+def parse_filter(stanzas, factory, allow_use=True):
+    """
+    Parses "ALLOW|DENY|USE pattern,pattern... ALLOW|DENY|USE ..." into a filter: a list of (allowed, pattern).
+
+    A missing pattern list is (allowed, None), which always matches.  USE rules are (None, FilterListRef).
+    """
+    filt = []
+    for ix in range(0, len(stanzas), 2):
+        action = stanzas[ix].lower()
+        try:
+            texts = stanzas[ix+1]
+        except IndexError:  # Exceeded end of list.
+            texts = None
+
+        if action in {'allow', 'accept', '+'}:
+            allowed = True
+        elif action in {'deny', 'reject', 'block', 'ignore', '-'}:
+            allowed = False
+        elif action == 'use' and allow_use:
+            allowed = None
+        else:
+            expected = "ALLOW, DENY or USE" if allow_use else "ALLOW or DENY"
+            raise InvalidCommandException("Unknown action '{}', expected {}".format(action, expected))
+
+        if texts is None:
+            if allowed is None:
+                raise InvalidCommandException("USE needs the name of a filter list.  See /alerts help filterlist")
+            filt.append((allowed, None))
+            continue
+        if texts[-1] == ",":
+            raise InvalidCommandException(
+                "Near '{text}': Pattern list cannot end with a comma.  (HINT: If you were trying to specify multiple"
+                " patterns to {action}, they cannot be separated with spaces -- use 'a,b,c' not 'a, b, c')"
+                .format(text=texts, action=action)
+            )
+        texts = texts.split(",")
+        for text in texts:
+            if not text:
+                raise InvalidCommandException("Near '{}': Empty pattern in pattern list.".format(stanzas[ix+1]))
+            if allowed is None and text.lower() not in plugin.filter_lists:
+                raise InvalidCommandException(
+                    "No filter list named '{}'.  Define it first with /alerts filterlist DEFINE".format(text)
+                )
+            filt.append((allowed, FilterListRef(text) if allowed is None else factory(text)))
+    return filt
+
+
+def describe_filter(filt):
+    """Returns filt as it would be typed after SET, with a leading space, or None if it is empty."""
+    buffer = []
+    previous = ''  # Not any action
+    for allowed, pattern in filt:
+        if pattern is None:
+            previous = ''
+        if allowed is not previous:
+            previous = allowed
+            buffer.append(" " + FILTER_ACTIONS[allowed] + " ")
+            if pattern is None:
+                continue
+        else:
+            buffer.append(",")
+        buffer.append(pattern.text)
+    return "".join(buffer) or None
+
+
+class FilterListRef:
+    """A USE rule in a nickname filter, which defers to a shared filter list (see /alerts filterlist) by name."""
+    always_matches = False
+
+    def __init__(self, name):
+        self.text = name
+
+    @property
+    def filter_list(self):
+        """The FilterList this refers to, or None if there isn't one by that name (any more)."""
+        return plugin.filter_lists.get(self.text.lower())
+
+
+class FilterList:
+    """
+    A named nickname filter, shared by every alert with a USE rule for it, so that long lists of patterns (of bots,
+    say) are only written, compiled and stored once.  ChatEvent.check_filter_list() makes sure each list is only
+    checked once per message, however many alerts use it.
     """
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = rules  # As for Alert.filters, but without USE rules.
 
-    # Regex to split nick!user@host and other formats into components.
-    _split_regexp = re.compile(
-        r"""
-        (?x)
-        ^(?:
-            # Match bare nicknames and empty strings
-            (?:(?P<barenick>[^!@]*))
-            | # Or match [nick!]user@host or some portion thereof.
-            (?:
-                (?:(?P<nick>[^!@]*)(?=!))?
-                (?:!?(?P<user>[^!@]*)(?=$|@))?
-                (?:@?(?P<host>[^!@]*))?
-            )
-        )$
+    def check(self, string, casemapping=DEFAULT_CASEMAPPING):
         """
-    )
-
-    def __init__(self, pattern):
-        self.text = pattern
-        result = self._split_regexp.fullmatch(pattern)
-        if not result:
-            raise ValueError("Invalid user pattern {!r}".format(pattern))
-        result = result.groupdict(None)
-
-        self.nick = result['barenick'] or result['nick'] or '*'
-        self.user = result['user'] or '*'
-        self.host = result['host'] or '*'
+        Checks string (folded with irc_fold() using casemapping) against the rules.
 
-        # Create regex
-        regex = r'^{nick}!{user}@{host}$'.format(
-            nick=self.regexify(self.nick),
-            user=self.regexify(self.user),
-            host=self.regexify(self.host)
-        )
+        :return: (matched, allowed): whether any rule matched, and whether string is allowed.  If nothing matched,
+            allowed is what this filter would decide on its own.
+        """
+        allowed = False
+        for allowed, pattern in self.rules:
+            if pattern is None or pattern.always_matches or pattern.match(string, casemapping):
+                return True, allowed
+        return False, not allowed
 
-        # Successively seek out unneccessary wildcards and remove them if they exist as an optimization.
-        # This should improve performance since we'll be matching against a lot of incoming text.
-        # Some benchmarking also shows that it's faster to use re.search/re.match/re.fullmatch flavors than things like
-        # ^.*[...]
-        for chunk in ".*$", ".*@", ".*!":
-            if not regex.endswith(chunk):
-                break
-            regex = regex[:-len(chunk)]
-        for chunk in "^.*", "!.*", "@.*":
-            if not regex.startswith(chunk):
-                break
-            regex = regex[:len(chunk)]
-
-        # If the entire pattern was empty, regex will be "^".  Special-case this.
-        if regex == "^":
-            regex = ""
-        self.always_matches = (regex == "")
-
-        method = None
-        if regex:
-            if regex[0] == "^":
-                # Pattern anchored at start.  We can ditch the anchor because match() already is anchored.
-                if regex[-1] == "$":  # Also anchored at end, use fullmatch
-                    method = "fullmatch"
-                    regex = regex[1:-1]
-                else:
-                    method = "match"
-                    regex = regex[1:]
-            else:
-                # Pattern not anchored at start.  Use search
-                method = "search"
-        self.regex = regex
-        self.compiled = re.compile(regex, re.IGNORECASE)
-        if method:
-            self._match = getattr(self.compiled, method)
-        else:  # Match -always- succeeds on an empty regex
-            self._match = lambda unused: True
-        self.methodname = method or '<True>'
+    def dump(self):
+        return [
+            ("+" if allowed else "-") + (pattern.text if pattern is not None else "") for allowed, pattern in self.rules
+        ]
 
-    def match(self, nickuserhost):
-        return bool(self._match(nickuserhost))
+    @classmethod
+    def load(cls, name, data):
+        return cls(name, [(item[0] == "+", UserPattern(item[1:]) if item[1:] else None) for item in data])
 
 
 class IRC:
@@ -506,6 +1896,63 @@ class Color(tuple):
         return Color(color[:2])
 
 
+class MatchRenderer:
+    """
+    Wraps each match of a regex in a prefix and suffix.
+
+    The result is the same as regex.sub() with a replacement function, but matches are collected as (start, end) spans
+    first.  This lets the caller decide whether a message matches at all using the same scan that does the
+    highlighting, and builds the output with a single join rather than a function call per match.
+    """
+    def __init__(self, prefix, suffix):
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def render(self, text, spans):
+        """Returns text with each of spans wrapped."""
+        if not spans:
+            return text
+        prefix, suffix = self.prefix, self.suffix
+        parts = []
+        pos = 0
+        for start, end in spans:
+            parts.append(text[pos:start])
+            parts.append(prefix + text[start:end] + suffix)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+    @staticmethod
+    def render_layers(text, layers):
+        """
+        Wraps spans from several sources at once.
+
+        :param text: Text to format.
+        :param layers: List of (prefix, suffix, spans) tuples, highest priority first.  Spans that overlap a span from
+            an earlier layer are dropped.
+        """
+        starts = []  # Sorted start positions of spans claimed so far...
+        claimed = []  # ... and the matching (start, end, prefix, suffix)
+        for prefix, suffix, spans in layers:
+            for start, end in spans:
+                ix = bisect.bisect_right(starts, start)
+                if ix and claimed[ix - 1][1] > start:
+                    continue  # Overlaps the previous span
+                if ix < len(starts) and starts[ix] < end:
+                    continue  # Overlaps the next span
+                starts.insert(ix, start)
+                claimed.insert(ix, (start, end, prefix, suffix))
+
+        parts = []
+        pos = 0
+        for start, end, prefix, suffix in claimed:
+            parts.append(text[pos:start])
+            parts.append(prefix + text[start:end] + suffix)
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+
 class Context:
     """Light wrapper around Hexchat's contexts."""
     #: Attrs that return methods.
@@ -557,6 +2004,21 @@ class Context:
             return False
         return self.context == other.context
 
+    @staticmethod
+    def open_contexts():
+        """Returns the Hexchat contexts of all open windows, to check whether many are open with one lookup."""
+        return [channel.context for channel in hexchat.get_list('channels') or ()]
+
+    def is_open(self, open_contexts=None):
+        """
+        Returns False if this context's window has been closed.
+
+        :param open_contexts: From open_contexts(), if already looked up.
+        """
+        if open_contexts is None:
+            open_contexts = self.open_contexts()
+        return self.context in open_contexts
+
     @property
     def id(self):
         """Returns the server ID of this context.  None if it could not be located."""
@@ -573,12 +2035,33 @@ class Context:
 
 # noinspection PyProtectedMember,PyShadowingBuiltins
 class AlertDict(collections.abc.MutableMapping):
-    _head = None
-    _tail = None
-    _dict = {}
+    """
+    Ordered collection of alerts, keyed by (case-insensitive) name.
+
+    Order is kept in a doubly linked list, so that adding, moving and removing alerts is cheap.  Iteration uses an
+    immutable tuple snapshot of that list, which is only rebuilt after something changes.
+
+    :ivar generation: Incremented whenever alerts are added, removed, reordered or change what they match.  Inside a
+        batch(), only once the batch finishes.
+    """
     __default = object()
 
     def __init__(self, it=None):
+        self._head = None
+        self._tail = None
+        self._dict = {}
+        self.generation = 0
+        self._version = 0  # Like generation, but never held back by a batch.
+        self._batch_changed = False  # Whether generation needs incrementing when the batch finishes.
+        self._snapshot = ()
+        self._snapshot_version = 0
+        self._positions = None  # alert -> index in _snapshot, built on demand.
+        self._network_index = {}  # Lowercase network name -> tuple of alerts that apply to it, in list order.
+        self._tag_index = {}  # Lowercase tag -> {lowercase name: alert}
+        self._names = []  # Sorted lowercase names, for wildcard lookups.
+        self._word_indexes = {}  # Lowercase network name -> WordIndex
+        self._word_index_generation = None
+        self._batch_depth = 0
         if not it:
             return
         # Could make this more efficient for bulk inserts, but meh.
@@ -627,13 +2110,23 @@ class AlertDict(collections.abc.MutableMapping):
         elif prev and not next:
             next = prev._next
 
+        # Moving an alert to where it already is (e.g. the first alert to the front).
+        if next is alert:
+            next = alert._next
+        if prev is alert:
+            prev = alert._prev
+
         if add:
             alert._parent = self
             # noinspection PyUnboundLocalVariable
             self._dict[lowername] = alert
+            bisect.insort(self._names, lowername)
         else:
             self._link(alert._prev, alert._next)
+            self._unindex(alert)
         self._link(prev, alert, next)
+        self._index(alert)
+        self._bump()
 
         return alert
 
@@ -659,8 +2152,12 @@ class AlertDict(collections.abc.MutableMapping):
             raise ValueError("Alert {.name!r} is not a member of this list", alert)
 
         self._link(alert._prev, alert._next)
+        self._unindex(alert)
         alert._prev = alert._next = alert._parent = None
-        del self._dict[alert.name.lower()]
+        lowername = alert.name.lower()
+        del self._dict[lowername]
+        del self._names[bisect.bisect_left(self._names, lowername)]
+        self._bump()
         return alert
 
     unlink = remove
@@ -674,9 +2171,13 @@ class AlertDict(collections.abc.MutableMapping):
         if newname != oldname:
             if newname in self._dict:
                 raise ValueError("Name {!r} is already in use.".format(name))
+            self._unindex_tags(alert)
             del self._dict[oldname]
+            del self._names[bisect.bisect_left(self._names, oldname)]
             self._dict[newname] = alert
+            bisect.insort(self._names, newname)
         alert._name = name
+        self._index_tags(alert)
 
     def movebefore(self, alert, before):
         if before:
@@ -689,6 +2190,127 @@ class AlertDict(collections.abc.MutableMapping):
         return self._addormove(alert, False, next=self._head)
     # endregion
 
+    def changed(self, alert):
+        """Notes that alert's settings have changed."""
+        self._bump()
+
+    def _bump(self):
+        """Notes that something has changed, which generation will reflect once any batch finishes."""
+        self._version += 1
+        if self._batch_depth:
+            self._batch_changed = True
+        else:
+            self.generation += 1
+
+    # region Indexes
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager for making many changes at once.
+
+        Rather than being updated after every change, indexes that are expensive to maintain are discarded once the
+        batch finishes and rebuilt when next needed.  generation is only incremented once, at the end, so everything
+        built from it (word indexes, the match cache, match workers' rules) is only rebuilt once too.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._network_index = {}
+                if self._batch_changed:
+                    self._batch_changed = False
+                    self.generation += 1
+
+    def for_network(self, network):
+        """Returns a tuple of the alerts that apply to network, in list order."""
+        key = network.lower() if network else ''
+        alerts = self._network_index.get(key)
+        if alerts is None:
+            alerts = self._network_index[key] = tuple(alert for alert in self.iter_values() if alert.applies_to(key))
+        return alerts
+
+    def word_index(self, network):
+        """
+        Returns a WordIndex of the alerts that apply to network.  These are built when first needed and thrown away
+        whenever the generation changes.
+        """
+        if self._word_index_generation != self.generation:
+            self._word_indexes = {}
+            self._word_index_generation = self.generation
+        key = network.lower() if network else ''
+        index = self._word_indexes.get(key)
+        if index is None:
+            index = self._word_indexes[key] = WordIndex(self.for_network(key))
+        return index
+
+    def _index(self, alert):
+        """Adds a newly linked alert to the indexes."""
+        self._index_tags(alert)
+        if self._batch_depth:
+            return
+        for key, alerts in list(self._network_index.items()):
+            if not alert.applies_to(key):
+                continue
+            if alert._next is None:  # Common case: appending.
+                self._network_index[key] = alerts + (alert,)
+                continue
+            prev = alert._prev
+            while prev is not None and not prev.applies_to(key):
+                prev = prev._prev
+            ix = 0 if prev is None else alerts.index(prev) + 1
+            self._network_index[key] = alerts[:ix] + (alert,) + alerts[ix:]
+
+    def _unindex(self, alert):
+        """Removes an alert from the indexes."""
+        self._unindex_tags(alert)
+        if self._batch_depth:
+            return
+        for key, alerts in list(self._network_index.items()):
+            if alert.applies_to(key):
+                self._network_index[key] = tuple(other for other in alerts if other is not alert)
+
+    def _index_tags(self, alert):
+        for tag in alert.tag_keys:
+            self._tag_index.setdefault(tag, {})[alert.name.lower()] = alert
+
+    def _unindex_tags(self, alert):
+        for tag in alert.tag_keys:
+            tagged = self._tag_index.get(tag)
+            if tagged is None:
+                continue
+            tagged.pop(alert.name.lower(), None)
+            if not tagged:
+                del self._tag_index[tag]
+
+    def reindex(self, alert, update):
+        """Calls update(), which changes what networks or tags alert has, and updates the indexes to match."""
+        if alert._parent is not self:
+            raise ValueError("Alert {.name!r} is not a member of this list", alert)
+        self._unindex(alert)
+        update()
+        self._index(alert)
+
+    def tagged(self, tag):
+        """Returns a list of alerts with the specified tag, in list order."""
+        return sorted(self._tag_index.get(tag.lower(), {}).values(), key=self.position)
+
+    def glob(self, pattern):
+        """Returns a list of alerts with names matching a wildcard pattern (* and ?), in list order."""
+        pattern = pattern.lower()
+        # Everything before the first wildcard must match exactly, so we only need to look at names starting with it.
+        prefix = re.split(r'[*?]', pattern, 1)[0]
+        regex = compile_wildcard(pattern)
+        result = [self._dict[name] for name in starting_with(self._names, prefix) if regex.fullmatch(name)]
+        result.sort(key=self.position)
+        return result
+
+    def complete(self, prefix):
+        """Returns the names of alerts whose names start with prefix (ignoring case), sorted.  For tab completion."""
+        return [self._dict[name].name for name in starting_with(self._names, prefix.lower())]
+    # endregion
+
     # region Item accessors
     def __getitem__(self, key):
         return self._dict[key.lower()]
@@ -711,6 +2333,10 @@ class AlertDict(collections.abc.MutableMapping):
             alert._prev = alert._next = alert._parent = None
         self._head = self._tail = None
         self._dict = {}
+        self._network_index = {}
+        self._tag_index = {}
+        self._names = []
+        self._bump()
 
     def popitem(self):
         if self._tail:
@@ -721,7 +2347,7 @@ class AlertDict(collections.abc.MutableMapping):
 
     # region Standard mutable mapping magic methods
     def __contains__(self, key):
-        return key in self._dict
+        return key.lower() in self._dict
 
     def __len__(self):
         return len(self._dict)
@@ -742,7 +2368,7 @@ class AlertDict(collections.abc.MutableMapping):
             except (KeyError, AttributeError):
                 return False
 
-    class _ItemsView(collections.ItemsView):
+    class _ItemsView(collections.abc.ItemsView):
         def __iter__(self):
             yield from self._mapping.iter_items()
 
@@ -769,6 +2395,10 @@ class AlertDict(collections.abc.MutableMapping):
     __iter__ = iter_keys
 
     def iter_values(self):
+        return iter(self.snapshot())
+
+    def _walk(self):
+        """Walks the linked list."""
         count = 0
         maxcount = 2*len(self._dict)
         cur = self._head
@@ -781,6 +2411,21 @@ class AlertDict(collections.abc.MutableMapping):
             yield cur
             cur = cur._next
 
+    def snapshot(self):
+        """Returns a tuple of all alerts, in order.  The same tuple is returned until the list next changes."""
+        if self._snapshot_version != self._version:
+            self._snapshot = tuple(self._walk())
+            self._snapshot_version = self._version
+            self._positions = None
+        return self._snapshot
+
+    def position(self, alert):
+        """Returns the index of alert in the list."""
+        snapshot = self.snapshot()
+        if self._positions is None:
+            self._positions = {alert: ix for ix, alert in enumerate(snapshot)}
+        return self._positions[alert]
+
     def iter_items(self):
         yield from ((alert.name, alert) for alert in self.iter_values())
 
@@ -818,10 +2463,17 @@ class Alert(object):
         'u': 'underline',
         'w': 'word'
     }
+    #: Everything /alerts set can change.
+    SETTINGS = tuple(sorted({
+        *TRISTATE_ATTRIBUTES, *BOOLEAN_ATTRIBUTES, *COLOR_ATTRIBUTES,
+        'copy', 'cooldown', 'networks', 'pattern', 'regex', 'sound', 'tags'
+    }))
 
     def __init__(self, name):
         self.word = True
         self.regex = None
+        self.casefolded = False
+        self.token = None
 
         self.bold = False
         self.italic = False
@@ -837,7 +2489,7 @@ class Alert(object):
         self.format_line = ""
         self.wrap_match = None
         self.format_match = ""
-        self.replacement = None
+        self.renderer = None
 
         self.enabled = True
         self.mute = False
@@ -846,6 +2498,17 @@ class Alert(object):
         self.focus = False
         self.flash = False
         self.copy = False
+        self.cooldown = 0.0  # Seconds after triggering before sound, focus, flash and copy happen again.
+        self.cooldown_started = None  # time.monotonic() when the current cooldown began.
+        self._networks = None
+        self.network_keys = None
+        self._tags = ()
+        self.tag_keys = frozenset()
+
+        # Watchdog statistics
+        self.strikes = 0  # Times this alert has been too slow since it was last quarantined.
+        self.slowest = 0.0  # Longest time taken to check a message, in seconds.
+        self.quarantined = False  # Disabled by the watchdog.
 
         self._name = name
         self.strip = 0
@@ -862,6 +2525,40 @@ class Alert(object):
     def name(self):
         return self._name
 
+    @property
+    def networks(self):
+        """Names of the networks this alert is restricted to, or None if it applies to all networks."""
+        return self._networks
+
+    @networks.setter
+    def networks(self, value):
+        def update():
+            self._networks = tuple(value) if value else None
+            self.network_keys = frozenset(network.lower() for network in value) if value else None
+        if self._parent:
+            self._parent.reindex(self, update)
+        else:
+            update()
+
+    @property
+    def tags(self):
+        """Tags used to select groups of alerts in commands, such as /alerts mute tag:work"""
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        def update():
+            self._tags = tuple(value or ())
+            self.tag_keys = frozenset(tag.lower() for tag in self._tags)
+        if self._parent:
+            self._parent.reindex(self, update)
+        else:
+            update()
+
+    def applies_to(self, network_key):
+        """Returns True if this alert can trigger on the network with the specified (lowercase) name."""
+        return self.network_keys is None or network_key in self.network_keys
+
     @name.setter
     def name(self, value):
         if self._parent:
@@ -937,19 +2634,34 @@ class Alert(object):
     def invalidate_filter_cache(self):
         self.check_filter.cache_clear()
 
-    def _check_filter(self, filterkey, string):
+    def _check_filter(self, filterkey, string, casemapping=DEFAULT_CASEMAPPING, event=None):
         """
         Runs the specified string against the filter identified by filterkey.  Returns TRUE if allowed, FALSE if denied.
+
+        string must have been folded with irc_fold(), using casemapping.  If event is given, the results of shared
+        filter lists are remembered on it.
         """
-        allowed = False  # This causes us to return true if the filterlist is empty.
+        default = True  # An empty filter allows everything.
         for allowed, pattern in self.filters[filterkey]:
-            if pattern is None or pattern.always_matches or pattern.match(string):
+            if allowed is None:  # USE <list>
+                filter_list = pattern.filter_list
+                if filter_list is None:
+                    continue
+                if event is not None:
+                    matched, default = event.check_filter_list(filter_list)
+                else:
+                    matched, default = filter_list.check(string, casemapping)
+                if matched:
+                    return default
+                continue
+            if pattern is None or pattern.always_matches or pattern.match(string, casemapping):
                 return allowed
-        return not allowed
+            default = not allowed
+        return default
 
     def _dump_filter(self, filterkey):
         return list(
-            ("+" if allowed else "-") + (pattern.text if pattern is not None else "")
+            ("=" if allowed is None else "+" if allowed else "-") + (pattern.text if pattern is not None else "")
             for allowed, pattern in self.filters[filterkey]
         ) or None
 
@@ -963,7 +2675,9 @@ class Alert(object):
         for string in data:
             allow = string[0] == "+"
             text = string[1:]
-            if not text:
+            if string[0] == "=":
+                filt.append((None, FilterListRef(text)))
+            elif not text:
                 filt.append((allow, None))
             else:
                 filt.append((allow, factory(text)))
@@ -972,24 +2686,21 @@ class Alert(object):
         self.filters[filterkey] = filt
 
     def describe_filter(self, filterkey):
-        buffer = []
-        filt = self.filters[filterkey]
-        if not filt:
-            return None
-
-        previous = None
-        for allowed, pattern in filt:
-            if pattern is None:
-                previous = None
-            if allowed is not previous:
-                previous = allowed
-                buffer.append(" ALLOW " if allowed else " DENY ")
-                if pattern is None:
-                    continue
-            else:
-                buffer.append(",")
-            buffer.append(pattern.text)
-        return "".join(buffer)
+        return describe_filter(self.filters[filterkey])
+
+    def missing_filter_lists(self):
+        """Returns the names of filter lists this alert's filters USE that don't exist, sorted."""
+        return sorted({
+            pattern.text for filt in self.filters.values() for allowed, pattern in filt
+            if allowed is None and pattern.filter_list is None
+        })
+
+    def uses_filter_list(self, name):
+        """Returns True if any of this alert's filters USE the filter list with this (lowercase) name."""
+        return any(
+            allowed is None and pattern.text.lower() == name
+            for filt in self.filters.values() for allowed, pattern in filt
+        )
 
     def _precheck_filter(self, filterkey):
         """
@@ -1009,7 +2720,7 @@ class Alert(object):
         pre = self._precheck_filter('nick')
         if pre is not None:
             return pre
-        return self._check_filter('nick', event.fullnick)
+        return self._check_filter('nick', event.folded_fullnick, event.casemapping, event)
 
     def update(self):
         if self.color == self.NONECOLORTUPLE:
@@ -1020,80 +2731,186 @@ class Alert(object):
 
         # Build a regular expression, or maybe we already have one.
         if self.pattern:
-            t = ".*".join(re.escape(chunk) for chunk in self.pattern.split('*'))
-            if self.word:
+            chunks = [re.escape(chunk) for chunk in self.pattern.casefold().split('*')]
+            t = ".*".join(chunks)
+            if self.word and chunks[0]:
+                # A leading \b would stop the regex engine from quickly searching for the literal text the
+                # pattern starts with, so check for the word boundary once that's been found.  Same result,
+                # several times faster.
+                t = r'{0}(?<=\b{0}){1}\b'.format(chunks[0], t[len(chunks[0]):])
+            elif self.word:
                 t = r'\b{}\b'.format(t)
-            self.regex = re.compile(t, flags=re.IGNORECASE)
-
-        # Build the substitution string for match wrapping
-        if self.format_match:
-            index = 0  # if self.regex.groups else 0
-            self.replacement = lambda x, _f=self.format_match, _i=index: _f(x.group(_i))
+            self.regex = re.compile(t)
+        # A single whole word can be looked up in the message's words rather than scanned for.  (See WordIndex)
+        folded = self.pattern.casefold() if self.pattern else None
+        self.token = folded if self.word and folded and WORD_REGEX.fullmatch(folded) else None
+        # Regexes without IGNORECASE are meant for casefolded text.  (See compile_regex)
+        self.casefolded = self.regex is not None and not self.regex.flags & re.IGNORECASE
+
+        # Build the renderer for match wrapping
+        if self.wrap_match:
+            self.renderer = MatchRenderer(*self.wrap_match)
         else:
-            self.replacement = None
+            self.renderer = None
 
-    def handle(self, event):
+        if self._parent is not None:
+            self._parent.changed(self)
+
+    def find(self, event):
+        """
+        Determines whether this alert triggers on event.
+
+        :return: None if it does not.  Otherwise, a tuple of (message, spans), where message is the text this alert
+            would output and spans is a list of where the alert matched in it.  spans is only populated if the alert
+            has match formatting.
+        """
         if not self.enabled:  # Skip disabled events
-            return False
+            return None
+        if not plugin.watchdog_budget:
+            return self._find(event)
+        start = time.perf_counter()
+        try:
+            return self._find(event)
+        finally:
+            self.check_time(time.perf_counter() - start)
+
+    @property
+    def strip_flags(self):
+        """Which formatting (as hexchat.strip() flags) is stripped from messages before matching them."""
         if self.pattern is None:  # Strip formatting to test regexes
-            message = event.stripped_message
-        else:
-            message = event.message
-        if not self.regex.search(message):  # Skip non-matching events
-            return False
+            return 3
+        # If we're stripping formatting from the output anyway, match against what we'll output.
+        return self.strip or 0
+
+    def scan(self, event):
+        """Like find(), but ignores nickname filters and whether this alert is enabled.  See MatchCache."""
+        if not plugin.watchdog_budget:
+            return self._scan(event)
+        start = time.perf_counter()
+        try:
+            return self._scan(event)
+        finally:
+            self.check_time(time.perf_counter() - start)
 
+    def _find(self, event):
+        found = self._scan(event)
         # Nickname and channel filtering
-        if not self.check_nick(event):
-            return False
+        if found is None or not self.check_nick(event):
+            return None
+        return found
+
+    def _scan(self, event):
+        flags = self.strip_flags
+        message = event.strip_message(flags) if flags else event.message
+
+        # The same scan both decides whether we match and finds what to highlight.
+        folded, matches = self._finditer(event, message)
+        first = next(matches, None)
+        if first is None:  # Skip non-matching events
+            return None
+
+        spans = []
+        if self.renderer is not None:
+            spans = self._spans(folded, itertools.chain((first,), matches))
+        return message, spans
+
+    def _finditer(self, event, message):
+        """Returns (folded, matches): the event's FoldedText of message (if the regex wants it), and regex matches."""
+        if self.casefolded:
+            folded = event.fold(message)
+            return folded, self.regex.finditer(folded.text)
+        return None, self.regex.finditer(message)
+
+    @staticmethod
+    def _spans(folded, matches):
+        """Returns the spans of matches in the original message."""
+        if folded is not None:
+            return folded.spans(matches)
+        return [match.span() for match in matches]
+
+    def find_spans(self, event, message):
+        """
+        Returns where this alert would highlight message (which another alert is outputting), or None if it wouldn't.
+        """
+        if not self.enabled or self.renderer is None:
+            return None
+        start = time.perf_counter()
+        spans = self._spans(*self._finditer(event, message))
+        if plugin.watchdog_budget:
+            self.check_time(time.perf_counter() - start)
+        if not spans or not self.check_nick(event):
+            return None
+        return spans
+
+    def check_time(self, elapsed):
+        """
+        Records that checking a message took elapsed seconds.  If that's over budget too many times, quarantine this
+        alert (by disabling it).
+        """
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+        if elapsed * 1000 <= plugin.watchdog_budget:
+            return
+        self.strikes += 1
+        if self.strikes < plugin.watchdog_strikes:
+            return
+        self.strikes = 0
+        self.enabled = False
+        self.quarantined = True
+        if self._parent is not None:
+            self._parent.changed(self)
+        print(IRC.bold(
+            "** Alert '{}' has been disabled: it took longer than {}ms to check a message {} times (up to {}) **"
+            .format(self.name, format_seconds(plugin.watchdog_budget), plugin.watchdog_strikes,
+                    format_microseconds(self.slowest * 1000000))
+        ))
 
-        if self.strip and self.pattern is not None:
-            message = event.strip_message(self.strip)
+    def handle(self, event):
+        found = self.find(event)
+        if found is None:
+            return False
+        message, spans = found
+        if spans:
+            message = self.renderer.render(message, spans)
+        self.trigger(event, message)
+        return True
 
-        if self.replacement is not None:
-            message = self.regex.sub(self.replacement, message)
+    def trigger(self, event, message):
+        """Outputs message (which already has match formatting applied) and performs this alert's other actions."""
         nick = self.format_line(event.rawnick)
         message = self.format_line(message)
 
         hexchat.emit_print(event.event, nick, message, *event.words[2:])
 
-        if self.abs_sound is not None and not self.mute:
+        if plugin.duplicate_filter is not None and plugin.duplicate_filter.check(self, event):
+            return  # Already made a fuss about this one elsewhere.
+
+        cooling = False
+        if self.cooldown:
+            now = time.monotonic()
+            cooling = self.cooldown_started is not None and now - self.cooldown_started < self.cooldown
+            if not cooling:
+                self.cooldown_started = now
+
+        if self.abs_sound is not None and not self.mute and not cooling:
             plugin.playsound(self.abs_sound)
 
-        if self.copy:
+        if self.copy and not cooling:
             copy_to = '>>alerts<<' if self.copy is True else self.copy
-            copy_context = Context.find(event.current.network, copy_to, event.current.id)
-            if not copy_context:
-                event.current.command("QUERY -nofocus " + copy_to)
-                copy_context = Context.find(event.current.network, copy_to, event.current.id)
-            if not copy_context:
-                print(IRC.bold("** Unable to open/create query window **"))
+            if event.is_channel:
+                name = nick + ":" + event.channel
             else:
-                if event.is_channel:
-                    name = nick + ":" + event.channel
-                else:
-                    name = nick + ":(PM)"
-                copy_context.emit_print("Channel Message", name, message)
+                name = nick + ":(PM)"
+            plugin.copy_buffer.add(event.current, copy_to, name, message)
 
         if event.focused != event.current:
-            if self.focus and (self.focus is self.FORCE or not event.focused.inputbox):
+            if self.focus and not cooling and (self.focus is self.FORCE or not event.focused.inputbox):
                 event.current.command("GUI FOCUS")
             elif self.notify:
-                if event.current.network == event.focused.network:
-                    network = ""
-                else:
-                    network = "/" + event.focused.network
-                if event.is_channel:
-                    fmt = "[{nick} on {channel}{network}: {message}]"
-                else:
-                    fmt = "[PM from {nick}{network}: {message}]"
-                event.focused.print(
-                    fmt.format(
-                        nick=event.nick, channel=event.channel, network=network, message=message)
-                    )
+                plugin.notify(event, message)
 
-        if self.flash:
+        if self.flash and not cooling:
             hexchat.command("GUI FLASH")
-        return True
 
     @property
     def sound(self):
@@ -1126,7 +2943,8 @@ class Alert(object):
 
     def export_dict(self):
         # dict: n=name, f=formatting and flags, s=sound (if set), p=pattern (if needed), r=regex (if needed)
-        # c=copy (if enabled)
+        # c=copy (if enabled), N=nickname filter (if set), w=networks (if restricted), t=tags (if any)
+        # d=cooldown (if set)
         rv = {'n': self.name}
 
         # Format key:
@@ -1165,6 +2983,15 @@ class Alert(object):
         if not rv['N']:
             del rv['N']
 
+        if self.networks:
+            rv['w'] = list(self.networks)
+        if self.tags:
+            rv['t'] = list(self.tags)
+        if self.cooldown:
+            rv['d'] = self.cooldown
+        if self.quarantined and not self.enabled:
+            rv['q'] = 1
+
         return rv
 
     def export_json(self):
@@ -1195,7 +3022,7 @@ class Alert(object):
             rv.pattern = d['p']
         elif 'r' in d:
             rv.pattern = None
-            rv.regex = re.compile(d['r'], re.IGNORECASE)
+            rv.regex = compile_regex(d['r'])
 
         if 'c' in d:
             rv.copy = True if d['c'] == 'on' else d['c']
@@ -1203,6 +3030,13 @@ class Alert(object):
             rv.copy = False
         if 'N' in d and d['N'] is not None:
             rv._load_filter('nick', d['N'], UserPattern)
+        if d.get('w'):
+            rv.networks = d['w']
+        if d.get('t'):
+            rv.tags = d['t']
+        if d.get('d'):
+            rv.cooldown = float(d['d'])
+        rv.quarantined = bool(d.get('q')) and not rv.enabled
         rv.update()
         return rv
 
@@ -1338,6 +3172,9 @@ class ChatEvent(Event):
         self.message = words[1]
         self.modes = words[2] if len(words) > 2 else None
         self._stripped_message_cache = {}
+        self._folded_cache = {}
+        self._tokens_cache = {}
+        self._filter_list_cache = {}
         self.is_channel = event.lower().startswith("channel")
         super().__init__(words[1:], word_eol[:1], event)
 
@@ -1345,7 +3182,13 @@ class ChatEvent(Event):
     def hostmask(self):
         if self.is_channel:
             try:
-                return next(iter(user.host for user in self.current.get_list('users') if user.nick == self.nick))
+                users = self.current.get_list('users')
+                for user in users:
+                    if user.nick == self.nick:
+                        return user.host
+                # Hexchat usually gives us the nickname exactly as it is in the user list, but just in case:
+                nick = irc_fold(self.nick, self.casemapping)
+                return next(iter(user.host for user in users if irc_fold(user.nick, self.casemapping) == nick))
             except StopIteration:
                 raise ValueError("Could not find associated user in user list.")
         else:
@@ -1355,6 +3198,14 @@ class ChatEvent(Event):
     def fullnick(self):
         return self.nick + "!" + self.hostmask
 
+    @LazyProperty
+    def folded_fullnick(self):
+        return irc_fold(self.fullnick, self.casemapping)
+
+    @LazyProperty
+    def casemapping(self):
+        return plugin.casemapping(self.current.network)
+
     @LazyProperty
     def nick(self):
         return hexchat.strip(self.rawnick)
@@ -1373,21 +3224,509 @@ class ChatEvent(Event):
             self._stripped_message_cache[flags] = hexchat.strip(self.message, -1, flags)
         return self._stripped_message_cache[flags]
 
+    def fold(self, text):
+        """Returns a FoldedText of text (which is usually some form of the message), shared by all alerts."""
+        folded = self._folded_cache.get(text)
+        if folded is None:
+            folded = self._folded_cache[text] = FoldedText(text)
+        return folded
+
+    def tokens(self, flags):
+        """Returns the set of casefolded words in the message stripped with flags, for WordIndex."""
+        tokens = self._tokens_cache.get(flags)
+        if tokens is None:
+            text = self.fold(self.strip_message(flags) if flags else self.message).text
+            tokens = self._tokens_cache[flags] = frozenset(WORD_REGEX.findall(text))
+        return tokens
+
+    def check_filter_list(self, filter_list):
+        """FilterList.check() of who sent this, worked out only once however many alerts use filter_list."""
+        result = self._filter_list_cache.get(filter_list)
+        if result is None:
+            result = self._filter_list_cache[filter_list] = filter_list.check(self.folded_fullnick, self.casemapping)
+        return result
+
+
+def handle_all(event, alerts, found=None):
+    """
+    Handles event with all matching alerts, rather than only the first.
+
+    The first matching alert is triggered as normal.  Every other alert that matches its output contributes its match
+    formatting; where matches overlap, the alert earliest in the list wins.  Returns True if any alert matched.
+
+    :param alerts: The alerts for event's network, in list order.
+    :param found: If the matching has already been done (see handle_found()), what was found.  Spans of alerts that
+        matched the same text as the first one outputs are reused rather than found again.
+    """
+    alerts = iter(alerts)
+    known = {}
+    if found is None:
+        for primary in alerts:
+            result = primary.find(event)
+            if result is not None:
+                break
+        else:
+            return False
+        message, spans = result
+    else:
+        found = iter(found)
+        for primary, message, spans in found:
+            if primary.enabled and primary.check_nick(event):
+                break
+        else:
+            return False
+        known = {alert: spans for alert, text, spans in found if text == message}
+        # Skip to after the primary alert.
+        for alert in alerts:
+            if alert is primary:
+                break
+        if primary.renderer is None:
+            spans = None
+
+    layers = []
+    if spans:
+        layers.append((primary.renderer.prefix, primary.renderer.suffix, spans))
+    # Other alerts' formatting must hand back to the primary alert's line formatting when done.
+    restore = IRC.ORIGINAL + (primary.wrap_line[0] if primary.wrap_line else "")
+    for alert in alerts:
+        if alert in known:
+            spans = known[alert] if alert.enabled and alert.renderer is not None and alert.check_nick(event) else None
+        else:
+            spans = alert.find_spans(event, message)
+        if spans:
+            layers.append((alert.renderer.prefix, restore, spans))
+
+    primary.trigger(event, MatchRenderer.render_layers(message, layers))
+    return True
+
+
+def handle_event(event):
+    """Checks event against all alerts, triggering the first that matches.  Returns True if any did."""
+    if plugin.match_cache is not None:
+        return handle_found(event, plugin.match_cache.find(event))
+    if plugin.multi_highlight:
+        return handle_all(event, plugin.alerts.for_network(event.current.network))
+    for alert in plugin.alerts.word_index(event.current.network).candidates(event):
+        if alert.handle(event):
+            return True
+    return False
+
+
+def handle_found(event, found):
+    """
+    Like handle_event(), but with the matching already done (by a MatchPool or MatchCache).
+
+    :param found: (alert, message, spans) for every alert whose regex matched, in list order.  Only as much of this
+        is looked at as is needed to find the first alert that applies.
+    """
+    network = event.current.network.lower() if event.current.network else ''
+    if plugin.multi_highlight:
+        return handle_all(
+            event, plugin.alerts.for_network(network),
+            ((alert, message, spans) for alert, message, spans in found if alert.applies_to(network))
+        )
+    for primary, message, spans in found:
+        if primary.enabled and primary.applies_to(network) and primary.check_nick(event):
+            break
+    else:
+        return False
+
+    if primary.renderer is None:
+        spans = None
+    primary.trigger(event, primary.renderer.render(message, spans) if spans else message)
+    return True
+
+
+def finish_event(event, found, open_contexts=None):
+    """
+    Prints an event that was held back while a MatchPool checked it.
+
+    :param found: As for handle_found().  If None, the event is checked here instead.
+    :param open_contexts: As for Context.is_open().
+    """
+    if not event.current.is_open(open_contexts):
+        return
+    event.current.set()
+    event.focused = Context.focused()
+    ignore_messages, plugin.ignore_messages = plugin.ignore_messages, True
+    try:
+        handled = handle_event(event) if found is None else handle_found(event, found)
+        if not handled:
+            hexchat.emit_print(event.event, event.rawnick, event.message, *event.words[1:])
+    finally:
+        plugin.ignore_messages = ignore_messages
+
+
+def message_hook(words, word_eol, event):
+    if len(words) < 2:
+        return  # Blank ACTIONs can cause this, just silently discard them.
+    if not plugin.ignore_messages:
+        start = time.perf_counter()
+        event_type = event
+        try:
+            plugin.ignore_messages = True
+            event = ChatEvent(words, word_eol, event)
+            if plugin.match_pool is not None and plugin.match_pool.submit(event):
+                return hexchat.EAT_ALL  # It'll be printed once the workers have checked it.
+            if handle_event(event):
+                return hexchat.EAT_ALL
+        finally:
+            plugin.ignore_messages = False
+            plugin.record_latency(event_type, time.perf_counter() - start)
+    return None
+
+
+class LoggedMessage:
+    """Just enough of a ChatEvent for Alert.scan() to check a message from a log file."""
+    def __init__(self, message):
+        self.message = message
+        self._stripped_message_cache = {}
+        self._folded_cache = {}
+
+    strip_message = ChatEvent.strip_message
+    fold = ChatEvent.fold
+
+
+class LogScan:
+    """
+    Checks Hexchat's log files for where alerts would have triggered (see /alerts scan).
+
+    run() is a task (see TaskScheduler) that reads files a line at a time, so even scanning months of logs never
+    freezes Hexchat.  Results and progress reports go to a results window.
+    """
+    #: Name of the results window.
+    WINDOW = '>>scan<<'
+    #: How many lines to check between progress updates.
+    PROGRESS_LINES = 1000
+    #: A logged message: timestamp, then "<nick>" (possibly with a mode prefix) or "*" for actions, a tab and the text.
+    MESSAGE = re.compile(r'(?P<stamp>.*?)(?:<[~&@%+]*(?P<nick>[^\s>]+)>|\*)\t(?P<message>.*)')
+    #: Written whenever Hexchat opens a log file.  Says what year it is, which timestamps usually don't.
+    BEGIN = re.compile(r'\*\*\*\* BEGIN LOGGING AT (.*)')
+
+    def __init__(self, alerts, files, since, window, named=False):
+        """
+        :param alerts: Alerts to check, in order.  Only the first that matches a line is reported.
+        :param files: (path, network, channel) of each log file.
+        :param since: Only check lines logged since this time.time(), or None for all of them.
+        :param window: Context to write results to.
+        :param named: True if alerts were named explicitly, so keep checking them even if they're disabled.
+        """
+        self.alerts = alerts
+        self.named = named
+        self.files = files
+        self.since = since
+        self.window = window
+        self.output = OutputBuffer(window)  # Written at the end of each slice.
+        self.stamp_format = (hexchat.get_prefs('stamp_log_format') or "%b %d %H:%M:%S").strip()
+        self.stamp_has_year = '%Y' in self.stamp_format or '%y' in self.stamp_format
+        self.network_key = self.where = None
+        self.year = None
+        self.lines = 0
+        self.matches = 0
+
+    def print(self, text):
+        self.output.print(text)
+
+    def run(self):
+        started = time.perf_counter()
+        self.print("Scanning {} log file(s) for {} alert(s)...".format(len(self.files), len(self.alerts)))
+        for ix, (path, network, channel) in enumerate(self.files):
+            try:
+                modified = os.path.getmtime(path)
+                if self.since is not None and modified < self.since:
+                    continue  # Nothing in this file is recent enough.
+                file = open(path, 'rb')
+            except OSError as ex:
+                self.print("Unable to read {}: {}".format(path, str(ex)))
+                continue
+            self.network_key = network.lower()
+            self.where = "{}/{}".format(network, channel)
+            self.year = time.localtime(modified).tm_year
+            with file:
+                for count, line in enumerate(file, 1):
+                    self.check(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                    if not self.window.is_open():
+                        return
+                    if count % self.PROGRESS_LINES:
+                        yield None
+                        continue
+                    yield "{} of {} file(s), {} line(s), {} match(es) so far".format(
+                        ix, len(self.files), self.lines, self.matches
+                    )
+            if not self.window.is_open():
+                return
+            yield None
+
+        self.print("Scan finished: {} match(es) in {} line(s) from {} file(s), taking {:.1f} seconds.".format(
+            self.matches, self.lines, len(self.files), time.perf_counter() - started
+        ))
+
+    def line_time(self, stamp):
+        """Returns when a line with timestamp stamp was logged, or None if that can't be worked out."""
+        try:
+            parsed = time.strptime(stamp.strip(), self.stamp_format)
+        except ValueError:
+            return None
+        if not self.stamp_has_year:
+            parsed = (self.year,) + tuple(parsed[1:8]) + (-1,)
+        return time.mktime(parsed)
+
+    def check(self, line):
+        found = self.MESSAGE.match(line)
+        if found is None:
+            begin = self.BEGIN.match(line)
+            if begin is not None:
+                try:
+                    self.year = time.strptime(begin.group(1).strip(), "%a %b %d %H:%M:%S %Y").tm_year
+                except ValueError:
+                    pass
+            return
+        self.lines += 1
+        stamp = found.group('stamp')
+        if self.since is not None:
+            logged = self.line_time(stamp)
+            if logged is not None and logged < self.since:
+                return
+
+        message = LoggedMessage(found.group('message'))
+        for alert in self.alerts:
+            if not alert.applies_to(self.network_key) or not (alert.enabled or self.named):
+                continue  # Including alerts the watchdog quarantines part way through.
+            result = alert.scan(message)
+            if result is None:
+                continue
+            text, spans = result
+            if spans:
+                text = alert.renderer.render(text, spans)
+            nick = found.group('nick')
+            self.matches += 1
+            self.print("{} {}: {}{} {}".format(
+                IRC.bold(alert.name), self.where, stamp, "<{}>".format(nick) if nick else "*", text
+            ))
+            return
+
+
+class OutputBuffer:
+    """
+    Collects lines of command output and prints them in a few large writes, rather than having Hexchat add (and
+    redraw) them one at a time.  Use as a context manager, or call flush() when done.
+
+    :ivar context: Context to write to, or None to print() to the current one.
+    """
+    #: Most lines printed in one write.
+    MAX_LINES = 500
+
+    def __init__(self, context=None):
+        self.context = context
+        self.lines = []
+
+    def print(self, *args):
+        self.lines.append(" ".join(str(arg) for arg in args))
+        if len(self.lines) >= self.MAX_LINES:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            text = "\n".join(self.lines)
+            if self.context is None:
+                print(text)
+            else:
+                self.context.print(text)
+            self.lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+class Task:
+    """A long-running command being run by a TaskScheduler."""
+    def __init__(self, id, name, generator, context, output):
+        self.id = id
+        self.name = name
+        self.generator = generator
+        self.context = context  # Where the command was run, and where its output goes.
+        self.output = output  # OutputBuffer the generator writes to, if any.
+        self.progress = None  # The latest progress message from the generator.
+        self.reported = time.perf_counter()  # When progress was last shown.
+
+
+class TaskScheduler:
+    """
+    Runs long-running commands a little at a time, so that they don't freeze Hexchat.  See /alerts cancel.
+
+    Each task is a generator which does a small piece of work (such as one alert) between each yield.  It can yield a
+    progress message instead of None; the latest is shown every PROGRESS_INTERVAL seconds.  Tasks are run in turn from
+    a timer, for at most SLICE seconds between them each time it fires.
+
+    Tasks that write a lot should write to an OutputBuffer, which is flushed at the end of each slice.
+    """
+    #: Seconds to spend running tasks each time the timer fires.
+    SLICE = 0.02
+    #: Milliseconds between slices.
+    INTERVAL = 10
+    #: Seconds between progress reports.
+    PROGRESS_INTERVAL = 5.0
+
+    def __init__(self):
+        self.tasks = OrderedDict()  # id -> Task
+        self.next_id = 1
+        self.timer = None
+
+    def start(self, name, generator, context=None, output=None):
+        """
+        Starts a task, and runs its first slice straight away -- so small jobs are finished before this returns.
+
+        :param context: Where the task's output goes.  Defaults to the current context.
+        :param output: OutputBuffer the task writes to, if any.
+        """
+        task = Task(self.next_id, name, generator, context or Context.current(), output)
+        self.next_id += 1
+        self.tasks[task.id] = task
+        if self._run(task, time.perf_counter() + self.SLICE) and self.timer is None:
+            self.timer = hexchat.hook_timer(self.INTERVAL, self._timer_hook)
+        return task
+
+    def _run(self, task, deadline):
+        """Runs task until deadline, in its context.  Returns False if it finished."""
+        previous = hexchat.get_context()
+        task.context.set()  # Where print() goes.
+        try:
+            return self._step(task, deadline)
+        finally:
+            if previous is not None:
+                previous.set()
+
+    def _step(self, task, deadline):
+        try:
+            while True:
+                progress = next(task.generator)
+                if progress is not None:
+                    task.progress = progress
+                if time.perf_counter() >= deadline:
+                    break
+        except StopIteration:
+            self.tasks.pop(task.id, None)
+            return False
+        except BaseException:
+            self.tasks.pop(task.id, None)
+            raise
+        finally:
+            if task.output is not None:
+                task.output.flush()
+
+        now = time.perf_counter()
+        if task.progress is not None and now - task.reported >= self.PROGRESS_INTERVAL:
+            task.reported = now
+            print("[{0.name} (task {0.id})] {0.progress}".format(task))
+        return True
+
+    def _timer_hook(self, userdata):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            if task.id not in self.tasks:  # Cancelled by an earlier task.
+                continue
+            try:
+                self._run(task, time.perf_counter() + self.SLICE / len(tasks))
+            except Exception as ex:
+                print(IRC.bold("** {} (task {}) failed: {} **".format(task.name, task.id, str(ex))))
+        if self.tasks:
+            return True
+        self.timer = None
+        return False
+
+    def find(self, name):
+        """Returns running tasks with the given id (as a string) or name."""
+        return [task for task in self.tasks.values() if name.lower() in (str(task.id), task.name)]
+
+    def cancel(self, task):
+        if self.tasks.pop(task.id, None) is not None:
+            task.generator.close()
+
+    def stop(self):
+        """Cancels all tasks."""
+        for task in list(self.tasks.values()):
+            self.cancel(task)
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+
 
-def message_hook(words, word_eol, event):
-    if len(words) < 2:
-        return  # Blank ACTIONs can cause this, just silently discard them.
-    if not plugin.ignore_messages:
-        try:
-            plugin.ignore_messages = True
-            event = ChatEvent(words, word_eol, event)
+class Profiler:
+    """
+    Profiles message_hook for a limited number of messages.
 
-            for alert in plugin.alerts.values():
-                if alert.handle(event):
-                    return hexchat.EAT_ALL
+    While running, print events are hooked to this profiler instead of directly to message_hook, so there is no cost
+    at all when not profiling.
+    """
+    #: Number of functions to report.
+    TOP = 20
+
+    def __init__(self, limit, save=False):
+        self.limit = limit
+        self.save = save
+        self.count = 0
+        self.profile = cProfile.Profile()
+        self.timer = None
+
+    def start(self):
+        hook_events(self.hook)
+
+    def hook(self, words, word_eol, userdata):
+        if plugin.ignore_messages:  # Our own output, printed while we're already profiling.
+            return message_hook(words, word_eol, userdata)
+        self.profile.enable()
+        try:
+            return message_hook(words, word_eol, userdata)
         finally:
-            plugin.ignore_messages = False
-    return None
+            self.profile.disable()
+            self.count += 1
+            if self.count >= self.limit and self.timer is None:
+                # Don't rip out our own hook while Hexchat is still running it.
+                self.timer = hexchat.hook_timer(1, self._timer_hook)
+
+    def _timer_hook(self, userdata):
+        self.timer = None
+        self.stop()
+        return False
+
+    def stop(self, report=True, rehook=True):
+        """
+        Stops profiling, restores the normal hooks and shows (and maybe saves) the results.
+
+        :param rehook: If False, the print events are left as they are.  For when the plugin is unloading anyway.
+        """
+        if self.timer is not None:
+            hexchat.unhook(self.timer)
+            self.timer = None
+        if rehook:
+            hook_events(message_hook)
+        if plugin.profiler is self:
+            plugin.profiler = None
+        if not report:
+            return
+
+        print(IRC.bold("Profiled {} message(s):".format(self.count)))
+        if not self.count:
+            return
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats('cumulative').print_stats(self.TOP)
+        for line in stream.getvalue().strip("\n").splitlines():
+            print(line)
+
+        if self.save:
+            filename = os.path.join(
+                hexchat.get_info('configdir'), "alerts-{}.pstats".format(time.strftime("%Y%m%d-%H%M%S"))
+            )
+            try:
+                stats.dump_stats(filename)
+            except OSError as ex:
+                print("Failed to save profile:", str(ex))
+            else:
+                print("Profile saved to {}".format(filename))
 
 
 class InvalidCommandException(Exception):
@@ -1452,8 +3791,9 @@ def command(name, collect=False, help="", requires_alert=False, raw=False):
                         raise InvalidCommandException("Incorrect number of arguments")
                     if max_args is not None:
                         if collect and ct >= max_args:
-                            args = list(event.words[:max_args - 1])
-                            args.append(event.word_eol[max_args - 1])
+                            # max_args includes the event argument, which isn't in words.
+                            args = list(event.words[:max_args - 2])
+                            args.append(event.word_eol[max_args - 2])
                         elif max_args < ct:
                             raise InvalidCommandException("Incorrect number of arguments")
                     if args is None:
@@ -1482,25 +3822,47 @@ def command(name, collect=False, help="", requires_alert=False, raw=False):
 alert_command = functools.partial(command, requires_alert=True)
 
 
+def is_selector(name):
+    """Returns True if name selects alerts by wildcard or tag, rather than naming a single alert."""
+    key = name.strip().lower()
+    return key.startswith("tag:") or "*" in key or "?" in key
+
+
+def select_alerts(name):
+    """
+    Returns a list of alerts selected by name, which may be an alert name, a wildcard pattern or tag:<tag>.
+    """
+    key = name.strip().lower()
+    if key.startswith("tag:"):
+        return plugin.alerts.tagged(key[4:])
+    if is_selector(key):
+        return plugin.alerts.glob(key)
+    alert = plugin.alerts.get(key)
+    return [] if alert is None else [alert]
+
+
 def multi_command(fn):
     def wrapper(event, *names, **kwargs):
         keys = list(name.strip().lower() for name in names)
         is_all = 'all' in keys
 
-        if is_all:
-            return fn(plugin.alerts, plugin.alerts, is_all=True, original=names, **kwargs)
-
-        items = OrderedDict()
-        for key, name in zip(keys, names):
-            if key in items:
-                continue
-            alert = plugin.alerts.get(key)
-            if alert is None:
-                print("Alert '{}' not found.".format(name))
-                continue
-            items[key] = alert
+        with plugin.alerts.batch():
+            if is_all:
+                return fn(plugin.alerts, plugin.alerts, is_all=True, original=names, **kwargs)
+
+            items = OrderedDict()
+            for name in names:
+                selected = select_alerts(name)
+                if not selected:
+                    if is_selector(name):
+                        print("No alerts match '{}'.".format(name))
+                    else:
+                        print("Alert '{}' not found.".format(name))
+                    continue
+                for alert in selected:
+                    items.setdefault(alert.name.lower(), alert)
 
-        return fn(event, items, is_all=False, original=names, **kwargs)
+            return fn(event, items, is_all=False, original=names, **kwargs)
     return wrapper
 
 
@@ -1602,6 +3964,100 @@ def parse_format(s, alternates=None):
     return parse_bool(s)
 
 
+def parse_seconds(s):
+    result = float(s.strip())
+    if result < 0:
+        raise ValueError("Must be 0 or more seconds")
+    return result
+
+
+def parse_milliseconds(s):
+    result = float(s.strip())
+    if result < 0:
+        raise ValueError("Must be 0 or more milliseconds")
+    return result
+
+
+def parse_count(s):
+    result = int(s.strip())
+    if result < 1:
+        raise ValueError("Must be at least 1")
+    return result
+
+
+def parse_size(s):
+    result = int(s.strip())
+    if result < 0:
+        raise ValueError("Must be 0 or more")
+    return result
+
+
+def parse_python(s):
+    s = s.strip()
+    if s.lower() == 'auto':
+        return 'auto'
+    if not shutil.which(s):
+        raise ValueError("'{}' not found".format(s))
+    return s
+
+
+def parse_sound_backend(s):
+    s = s.strip()
+    if s.lower() in ('splay', 'auto'):
+        return s.lower()
+    if not shutil.which(s):
+        raise ValueError("Sound player '{}' not found".format(s))
+    return s
+
+
+def format_seconds(value):
+    return "{:g}".format(value)
+
+
+def format_bool(value):
+    return 'on' if value else 'off'
+
+
+Option('sound_backend', 'splay', parse=parse_sound_backend, onchange=Plugin.update_sound_player)
+Option('sound_window', 1.0, parse=parse_seconds, format=format_seconds, onchange=Plugin.update_sound_player)
+Option('sound_queue', 3, parse=parse_count, onchange=Plugin.update_sound_player)
+Option('multi_highlight', False, parse=parse_bool, format=format_bool)
+Option('notify_window', 0.0, parse=parse_seconds, format=format_seconds, onchange=Plugin.update_notify_buffer)
+Option('copy_delay', 0.5, parse=parse_seconds, format=format_seconds, onchange=Plugin.update_copy_buffer)
+Option('copy_backlog', 100, parse=parse_count, onchange=Plugin.update_copy_buffer)
+Option('duplicate_window', 0.0, parse=parse_seconds, format=format_seconds, onchange=Plugin.update_duplicate_filter)
+Option('watchdog_budget', 50.0, parse=parse_milliseconds, format=format_seconds)
+Option('watchdog_strikes', 3, parse=parse_count)
+Option('match_workers', 0, parse=parse_size, onchange=Plugin.update_match_pool)
+Option('match_python', 'auto', parse=parse_python, onchange=Plugin.update_match_pool)
+Option('match_cache_size', 256, parse=parse_size, onchange=Plugin.update_match_cache)
+
+
+@command("option", help="[<option> [<value>]]: Show or change plugin-wide options.")
+def cmd_option(event, name=None, value=None):
+    if name is None:
+        for option in plugin.options.values():
+            print("{} is '{}'".format(option.name, option.format(getattr(plugin, option.name))))
+        return True
+
+    option = plugin.options.get(name.strip().lower())
+    if option is None:
+        raise InvalidCommandException("Unknown option '{}'.".format(name))
+
+    isset = value is not None
+    if isset:
+        try:
+            parsed = option.parse(value)
+        except ValueError as ex:
+            raise InvalidCommandException("Invalid value for {}: {}".format(option.name, str(ex)))
+        option.set(plugin, parsed)
+
+    print("{name} {action} '{value}'".format(
+        name=option.name, action='set to' if isset else 'is', value=option.format(getattr(plugin, option.name))
+    ))
+    return True
+
+
 def cmd_setshow_tristate(event, alert, setting, value=None):
     isset = value is not None
     text, obj = alert.TRISTATE_ATTRIBUTES[setting]
@@ -1658,6 +4114,61 @@ def cmd_setshow_copy(event, alert, value=None):
         alert.print("copy {action} off".format(action='set to' if isset else 'is'))
 
 
+def cmd_setshow_networks(event, alert, value=None):
+    isset = value is not None
+    if isset:
+        if value.strip().lower() in ('all', 'off', 'none', '*'):
+            alert.networks = None
+        else:
+            networks = list(network.strip() for network in value.split(","))
+            if not all(networks):
+                raise InvalidCommandException("Empty network name in network list.")
+            alert.networks = networks
+
+    if alert.networks:
+        alert.print("networks {action} {value}".format(
+            value=", ".join("'{}'".format(network) for network in alert.networks), action='set to' if isset else 'are'
+        ))
+    else:
+        alert.print("networks {action} ALL".format(action='set to' if isset else 'are'))
+    return True
+
+
+def cmd_setshow_cooldown(event, alert, value=None):
+    isset = value is not None
+    if isset:
+        if value.strip().lower() in ('off', 'none', 'false', 'f'):
+            value = '0'
+        try:
+            alert.cooldown = parse_seconds(value)
+        except ValueError:
+            raise InvalidCommandException("Value for cooldown must be a number of seconds or OFF")
+        alert.cooldown_started = None
+
+    alert.print("cooldown {action} {value} second(s)".format(
+        value=format_seconds(alert.cooldown), action='set to' if isset else 'is'
+    ))
+    return True
+
+
+def cmd_setshow_tags(event, alert, value=None):
+    isset = value is not None
+    if isset:
+        if value.strip().lower() in ('off', 'none', 'false', 'f'):
+            alert.tags = None
+        else:
+            tags = list(tag.strip() for tag in value.split(","))
+            if not all(tags):
+                raise InvalidCommandException("Empty tag in tag list.")
+            alert.tags = tags
+
+    if alert.tags:
+        alert.print("tags {action} '{value}'".format(value=",".join(alert.tags), action='set to' if isset else 'are'))
+    else:
+        alert.print("tags {action} none".format(action='set to' if isset else 'are'))
+    return True
+
+
 def cmd_setshow_color(event, alert, setting, value=None):
     isset = value is not None
     if isset:
@@ -1713,15 +4224,20 @@ def cmd_setshow_regex(event, alert, value=None):
     isset = value is not None
     if isset:
         try:
-            regex = re.compile(value, re.IGNORECASE)
+            regex = compile_regex(value)
         except re.error as ex:
             print("Regular expression error: {}".format(str(ex)))
             return False
+        hazard = find_regex_hazard(value)
+        if hazard:
+            print(
+                "Regular expression rejected: {}.  This can take an extremely long time to check some messages, "
+                "freezing Hexchat.".format(hazard)
+            )
+            return False
         alert.pattern = None
         alert.regex = regex
-        print(alert.regex.pattern)
         alert.update()
-        print(alert.regex.pattern)
 
     if alert.pattern is None:
         alert.print(
@@ -1762,7 +4278,7 @@ def cmd_setshow_sound(event, alert, value=None):
 @alert_command(
     "set", raw=True,
     help=(
-        "<alert> (sound|pattern|regex|copy|" +
+        "<alert> (sound|pattern|regex|copy|tags|networks|" +
         "|".join(itertools.chain(Alert.TRISTATE_ATTRIBUTES, Alert.BOOLEAN_ATTRIBUTES)) +
         " [<value>]: Change alert settings."
     )
@@ -1788,6 +4304,12 @@ def cmd_set(event, alert):
         if setting == 'copy':
             cmd_setshow_copy(event, alert, value)
             continue
+        if setting == 'tags':
+            cmd_setshow_tags(event, alert, value)
+            continue
+        if setting == 'cooldown':
+            cmd_setshow_cooldown(event, alert, value)
+            continue
         if setting == 'pattern':
             cmd_setshow_pattern(event, alert, value_eol)
             break
@@ -1797,6 +4319,9 @@ def cmd_set(event, alert):
         if setting == 'sound':
             cmd_setshow_sound(event, alert, value_eol)
             break
+        if setting == 'networks':
+            cmd_setshow_networks(event, alert, value_eol)
+            break
         raise InvalidCommandException("Unknown setting '{}'.".format(setting))
     alert.update()
 
@@ -1807,7 +4332,7 @@ def cmd_show(event, alert, *show):
     if 'all' in show or not show:
         show = list(
             itertools.chain(
-                ["sound", "pattern", "regex", "focus"],
+                ["sound", "pattern", "regex", "focus", "tags", "networks", "cooldown"],
                 Alert.TRISTATE_ATTRIBUTES, Alert.BOOLEAN_ATTRIBUTES
             )
         )
@@ -1821,12 +4346,18 @@ def cmd_show(event, alert, *show):
             cmd_setshow_color(event, alert, setting)
         elif setting == 'copy':
             cmd_setshow_copy(event, alert)
+        elif setting == 'tags':
+            cmd_setshow_tags(event, alert)
+        elif setting == 'cooldown':
+            cmd_setshow_cooldown(event, alert)
         elif setting == 'pattern':
             cmd_setshow_pattern(event, alert)
         elif setting == 'regex':
             cmd_setshow_regex(event, alert)
         elif setting == 'sound':
             cmd_setshow_sound(event, alert)
+        elif setting == 'networks':
+            cmd_setshow_networks(event, alert)
         else:
             print("Unknown setting '{}'.".format(setting))
 
@@ -1852,6 +4383,10 @@ def cmd_multi_bool(event, items, is_all=None, attr='enabled', changeto=True, sta
             if not is_all:
                 alert.print("{}.".format(ustate))
         setattr(alert, attr, changeto)
+        if attr == 'enabled':
+            if changeto:
+                alert.quarantined = False
+            plugin.alerts.changed(alert)
 
     if is_all:
         print("{} {} alert(s)".format(ustate, changed))
@@ -1873,12 +4408,16 @@ command('unmute', help="<name>|ALL: Unmute selected alert(s)")(cmd_unmute)
 @command("preview")
 @multi_command
 def cmd_preview(event, items, is_all=None, original=None, **unused):
-    sound = (not is_all) and len(original) == 1
+    sound = (not is_all) and len(items) == 1
     if is_all and not items:
         print("No alerts are currently defined.")
         return False
+    plugin.tasks.start('preview', preview_task(list(items.values()), sound))
 
-    for alert in items.values():
+
+def preview_task(alerts, sound=False):
+    """Shows what alerts' formatting looks like.  A task; see TaskScheduler."""
+    for ix, alert in enumerate(alerts, 1):
         inner = "(Matching portion)"
         if alert.wrap_match:
             inner = alert.wrap_match[0] + inner + alert.wrap_match[1]
@@ -1889,6 +4428,209 @@ def cmd_preview(event, items, is_all=None, original=None, **unused):
 
         if sound and alert.abs_sound:
             plugin.playsound(alert.abs_sound)
+        yield "Previewed {} of {} alert(s)".format(ix, len(alerts))
+
+
+@command("profile", help="START [<lines>] [SAVE]|STOP: Profile handling of incoming messages.")
+def cmd_profile(event, action=None, *args):
+    if action is None:
+        if plugin.profiler is None:
+            print("Not currently profiling.")
+        else:
+            print("Profiled {0.count} of {0.limit} message(s) so far.".format(plugin.profiler))
+        return True
+
+    action = action.lower()
+    if action == 'stop':
+        if plugin.profiler is None:
+            print("Not currently profiling.")
+            return False
+        plugin.profiler.stop()
+        return True
+
+    if action != 'start':
+        raise InvalidCommandException("Unknown action '{}'.".format(action))
+
+    limit = 1000
+    save = False
+    for arg in args:
+        if arg.lower() == 'save':
+            save = True
+            continue
+        try:
+            limit = parse_count(arg)
+        except ValueError:
+            raise InvalidCommandException("Invalid number of lines '{}'.".format(arg))
+
+    if plugin.profiler is not None:
+        plugin.profiler.stop(report=False)
+    plugin.profiler = Profiler(limit, save)
+    plugin.profiler.start()
+    print("Profiling the next {} message(s).".format(limit))
+    return True
+
+
+def log_files(where=None):
+    """
+    Lists Hexchat's log files as (path, network, channel) tuples.
+
+    :param where: If set, only list logs for "<network>[/<channel>]", either of which may contain wildcards.
+    """
+    root = os.path.join(hexchat.get_info('configdir'), 'logs')
+    network_regex = channel_regex = None
+    if where:
+        network, _, channel = where.lower().partition('/')
+        network_regex = compile_wildcard(network or '*')
+        channel_regex = compile_wildcard(channel or '*')
+    result = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        network = os.path.relpath(directory, root) if directory != root else ""
+        if network_regex is not None and not network_regex.fullmatch(network.lower()):
+            continue
+        for filename in sorted(filenames):
+            channel, extension = os.path.splitext(filename)
+            if extension.lower() != '.log':
+                continue
+            if channel_regex is not None and not channel_regex.fullmatch(channel.lower()):
+                continue
+            result.append((os.path.join(directory, filename), network, channel))
+    return result
+
+
+def parse_duration(s):
+    """Parses a duration like 90, 30m, 12h, 2d or 1w into seconds."""
+    match = re.fullmatch(r'(\d+(?:\.\d*)?)([smhdw]?)', s.strip().lower())
+    if match is None:
+        raise ValueError("Invalid duration '{}'".format(s))
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}[match.group(2)]
+
+
+@command("scan", help="<alert>|ALL [<network>[/<channel>]] [<since>]: Check log files for where alerts would trigger.")
+def cmd_scan(event, selector, *args):
+    named = selector.lower() != 'all' and not is_selector(selector)
+    if selector.lower() == 'all':
+        alerts = plugin.alerts.snapshot()
+    else:
+        alerts = select_alerts(selector)
+        if not alerts:
+            raise InvalidCommandException("No alerts match '{}'.".format(selector))
+    # Disabled (including quarantined) alerts are only scanned for if asked for by name.
+    alerts = [alert for alert in alerts if alert.regex is not None and (alert.enabled or named)]
+
+    where = since = None
+    for arg in args:
+        try:
+            since = time.time() - parse_duration(arg)
+        except ValueError:
+            if where is not None:
+                raise InvalidCommandException("Unexpected '{}'.".format(arg))
+            where = arg
+
+    files = log_files(where)
+    if not files:
+        print("No log files found{}.".format(" for '{}'".format(where) if where else ""))
+        return False
+
+    current = event.current
+    window = Context.find(current.network, LogScan.WINDOW, current.id)
+    if window is None:
+        current.command("QUERY " + LogScan.WINDOW)
+        window = Context.find(current.network, LogScan.WINDOW, current.id)
+    if window is None:
+        print(IRC.bold("** Unable to open/create query window '{}' **".format(LogScan.WINDOW)))
+        return False
+
+    for task in plugin.tasks.find('scan'):
+        plugin.tasks.cancel(task)
+        window.print("Scan stopped.")
+    scan = LogScan(alerts, files, since, window, named)
+    plugin.tasks.start('scan', scan.run(), window, scan.output)
+    return True
+
+
+@command("cancel", help="[<task>|ALL]: List running tasks, or cancel one.")
+def cmd_cancel(event, name=None):
+    tasks = list(plugin.tasks.tasks.values())
+    if name is None:
+        if not tasks:
+            print("No tasks are running.")
+        for task in tasks:
+            print("Task {0.id}: {0.name}{1}".format(task, " ({})".format(task.progress) if task.progress else ""))
+        return True
+
+    if name.lower() != 'all':
+        tasks = plugin.tasks.find(name)
+        if not tasks:
+            print("No task '{}' is running.".format(name))
+            return False
+    for task in tasks:
+        plugin.tasks.cancel(task)
+        print("Cancelled task {0.id} ({0.name}).".format(task))
+    return True
+
+
+def format_microseconds(us):
+    if us < 1000:
+        return "{:.0f}us".format(us)
+    if us < 1000000:
+        return "{:.1f}ms".format(us / 1000)
+    return "{:.2f}s".format(us / 1000000)
+
+
+@command("latency", help="[RESET]: Show (or reset) how long incoming messages take to process.")
+def cmd_latency(event, action=None):
+    if action is not None:
+        if action.lower() != 'reset':
+            raise InvalidCommandException("Unknown action '{}'.".format(action))
+        plugin.latency.clear()
+        print("Latency statistics reset.")
+        return True
+
+    if not plugin.latency:
+        print("No messages processed yet.")
+        return True
+    print(IRC.bold("{:<35} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+        "Event", "Count", "Mean", "p50", "p95", "p99", "Max"
+    )))
+    for event_type, histogram in sorted(plugin.latency.items()):
+        print("{:<35} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            event_type, histogram.count,
+            *(format_microseconds(value) for value in (
+                histogram.mean, histogram.percentile(0.5), histogram.percentile(0.95), histogram.percentile(0.99),
+                histogram.max
+            ))
+        ))
+    return True
+
+
+@command("stats", help=": Show the slowest alerts, and alerts that were disabled for being too slow.")
+def cmd_stats(event):
+    alerts = plugin.alerts.snapshot()
+    enabled = sum(1 for alert in alerts if alert.enabled)
+    print("{} alert(s), {} enabled.".format(len(alerts), enabled))
+
+    quarantined = list(alert for alert in alerts if alert.quarantined and not alert.enabled)
+    if quarantined:
+        print(IRC.bold("Disabled for being too slow:"))
+        for alert in quarantined:
+            print("  {}: up to {}".format(alert.name, format_microseconds(alert.slowest * 1000000)))
+
+    slowest = sorted((alert for alert in alerts if alert.slowest), key=lambda alert: -alert.slowest)[:10]
+    if slowest:
+        print(IRC.bold("Slowest alerts:"))
+        for alert in slowest:
+            print("  {}: up to {}".format(alert.name, format_microseconds(alert.slowest * 1000000)))
+
+    if plugin.duplicate_filter is not None:
+        print("Duplicate alerts suppressed: {}".format(plugin.duplicate_filter.suppressed))
+
+    cache = plugin.match_cache
+    if cache is not None:
+        print("Match cache: {} hit(s), {} miss(es) ({:.0%} hit rate), {} of {} entries used.".format(
+            cache.hits, cache.misses, cache.hit_rate, len(cache.entries), cache.size
+        ))
+    return True
 
 
 @command("version")
@@ -1896,66 +4638,111 @@ def cmd_version(event):
     print("alerts.py version {}".format(__module_version__))
 
 
-@command("help", help="[<command-or-setting]>: Shows help.")
-def cmd_help(event, search=None):
-    if not search:
-        print(
-            "{name} version {version} - {description}"
-            .format(name=__module_name__, version=__module_version__, description=__module_description__)
-        )
-    else:
-        search = search.lower().strip()
-        search = ("/alerts " + search, ":" + search)
+class HelpIndex:
+    """
+    Help text (this module's docstring), parsed once into what /alerts help needs.
 
-    section = None
-    buffer = []
+    The text is divided into sections ("** Title **"), and those into entries: one or more heading lines
+    ("/alerts <command> ..." or ":<setting> ..."), then an indented description.  Entries are looked up by the command
+    or setting names in their headings.
 
-    found_start = False
-    found_end = False
+    :ivar lines: The complete help, formatted for printing.
+    :ivar entries: (section title, formatted lines) of each entry, in order.
+    :ivar index: Command or setting name -> indexes of the entries for it.
+    :ivar keys: Sorted command and setting names.
+    """
+    def __init__(self, text):
+        self.lines = []
+        self.entries = []
+        self.index = {}
+        section = entry = None
+        after_heading = False
+        for line in text.strip().splitlines():
+            if line.startswith('**'):
+                section = IRC.underline(IRC.bold(line.strip('*' + string.whitespace).upper()))
+                self.lines.append(section)
+                entry = None
+                after_heading = False
+                continue
+            is_heading = bool(line) and line[0] not in string.whitespace
+            if is_heading:
+                if not after_heading:  # Consecutive headings share an entry.
+                    entry = (section, [])
+                    self.entries.append(entry)
+                name = None
+                if line.startswith("/alerts "):
+                    name = line.split()[1]
+                    line = IRC.bold(line)
+                elif line.startswith(':'):
+                    name = line[1:].split()[0] if len(line) > 1 else None
+                    line = IRC.bold(line[1:])
+                if name:
+                    for key in self.expand(name.lower()):
+                        self.index.setdefault(key, []).append(len(self.entries) - 1)
+            elif entry is None:
+                entry = (section, [])
+                self.entries.append(entry)
+            after_heading = is_heading
+            entry[1].append(line)
+            self.lines.append(line)
+
+        for _, lines in self.entries:
+            while lines and not lines[-1].strip():
+                lines.pop()
+        self.keys = sorted(self.index)
+
+    @staticmethod
+    def expand(name):
+        """Expands optional parts in names like 'del[ete]' into all the ways of writing them."""
+        base, _, rest = name.partition('[')
+        if not rest:
+            return [name]
+        optional, _, rest = rest.partition(']')
+        return [base + rest, base + optional + rest]
+
+    def find(self, search):
+        """Returns indexes of the entries for a command or setting, or for any whose name starts with search."""
+        search = search.strip().lower()
+        if search.startswith("/alerts "):
+            search = search[len("/alerts "):].strip()
+        search = search.lstrip(':')
+        found = self.index.get(search)
+        if found is None:
+            found = [ix for key in starting_with(self.keys, search) for ix in self.index[key]]
+        return sorted(set(found))
+
+    def search(self, search):
+        """Returns the lines to print for /alerts help <search>."""
+        result = []
+        section = None
+        for ix in self.find(search):
+            entry_section, lines = self.entries[ix]
+            if entry_section != section:
+                section = entry_section
+                if section is not None:
+                    result.append(section)
+            result.extend(lines)
+        return result
 
-    for line in __doc__.strip().splitlines():
-        is_blank = line == "" or line[0] in string.whitespace
 
-        if line.startswith('**'):
-            line = IRC.underline(IRC.bold(line.strip('*' + string.whitespace).upper()))
-            section = line
-            buffer.clear()
-            if search:
-                continue
+HELP_INDEX = HelpIndex(__doc__)
 
-        if search:
-            if found_start:
-                if is_blank:
-                    found_end = True
-                elif found_end:
-                    found_start = False
-                    found_end = False
-            else:
-                if is_blank and buffer:
-                    buffer.clear()
-                if any(line.startswith(phrase) for phrase in search):
-                    found_start = True
-                    found_end = False
-                    if section is not None:
-                        print(section)
-                        section = None
-                    if buffer:
-                        for text in buffer:
-                            print(text)
-                        buffer.clear()
-
-        if section and not search:
-            section = None
-        elif line.startswith("/alerts") or line.startswith(':'):
-            if line.startswith(':'):
-                line = line[1:]
-            line = IRC.bold(line)
-
-        if search and not found_start:
-            if not is_blank:
-                buffer.append(line)
+
+@command("help", help="[<command-or-setting]>: Shows help.")
+def cmd_help(event, search=None):
+    with OutputBuffer() as output:
+        if not search:
+            output.print(
+                "{name} version {version} - {description}"
+                .format(name=__module_name__, version=__module_version__, description=__module_description__)
+            )
+            lines = HELP_INDEX.lines
         else:
-            print(line)
+            lines = HELP_INDEX.search(search)
+            if not lines:
+                output.print("No help found for '{}'.".format(search))
+        for line in lines:
+            output.print(line)
 
 
 @command("dump", help="<name>|ALL: Dump selected alert(s) to output.")
@@ -1967,20 +4754,27 @@ def cmd_dump(event, items, is_all=None, **kwargs):
             return False
         raise InvalidCommandException()
 
-    for alert in items.values():
+    output = OutputBuffer()
+    plugin.tasks.start('dump', dump_task(list(items.values()), output), output=output)
+
+
+def dump_task(alerts, output):
+    """Writes the commands that would recreate alerts to output.  A task; see TaskScheduler."""
+    defaults = Alert("")
+    for ix, alert in enumerate(alerts, 1):
         settings = []
-        print("/alerts add {0.name}".format(alert))
+        output.print("/alerts add {0.name}".format(alert))
         if alert.pattern is not None:
             if alert.pattern != alert.name:
-                print("/alerts pattern {0.name} {0.pattern}".format(alert))
-            if alert.word is not alert.__class__.word:
+                output.print("/alerts pattern {0.name} {0.pattern}".format(alert))
+            if alert.word is not defaults.word:
                 settings.extend(("word", 'on' if alert.word else 'off'))
         else:
-            print("/alerts regex {0.name} {0.regex.pattern}".format(alert))
+            output.print("/alerts regex {0.name} {0.regex.pattern}".format(alert))
 
         for attr, (text, obj) in alert.TRISTATE_ATTRIBUTES.items():
             value = getattr(alert, attr)
-            if value is getattr(alert.__class__, attr):
+            if value is getattr(defaults, attr):
                 continue
             if value is obj:
                 value = text
@@ -1989,7 +4783,7 @@ def cmd_dump(event, items, is_all=None, **kwargs):
             settings.extend([attr, value])
         for attr in alert.BOOLEAN_ATTRIBUTES:
             value = getattr(alert, attr)
-            if value is getattr(alert.__class__, attr) or (attr == 'word' and alert.pattern is None):
+            if value is getattr(defaults, attr) or attr == 'word':  # word was handled above
                 continue
             settings.extend([attr, 'on' if value else 'off'])
         for attr in alert.COLOR_ATTRIBUTES:
@@ -2003,13 +4797,20 @@ def cmd_dump(event, items, is_all=None, **kwargs):
         #     settings.append("mute on")
         # if alert.pattern is not None and not alert.word:
         #     settings.append("word off")
-        if alert.sound:
-            settings.extend(["sound", alert.sound])
         if alert.copy:
             settings.extend(["copy", 'on' if alert.copy is True else alert.copy])
+        if alert.tags:
+            settings.extend(["tags", ",".join(alert.tags)])
+        if alert.cooldown:
+            settings.extend(["cooldown", format_seconds(alert.cooldown)])
+        if alert.sound:  # Must be last, since the sound filename is the rest of the line.
+            settings.extend(["sound", alert.sound])
 
         if settings:
-            print("/alerts set {0.name} {1}".format(alert, " ".join(settings)))
+            output.print("/alerts set {0.name} {1}".format(alert, " ".join(settings)))
+        if alert.networks:
+            output.print("/alerts set {0.name} networks {1}".format(alert, ",".join(alert.networks)))
+        yield "Dumped {} of {} alert(s)".format(ix, len(alerts))
 
 
 @command("export", help="<alerts...>|ALL: Export selected alert(s) as JSON.")
@@ -2021,7 +4822,15 @@ def cmd_export(event, items, is_all=None, **unused):
             return False
         raise InvalidCommandException()
 
-    result = [alert.export_dict() for alert in items.values()]
+    plugin.tasks.start('export', export_task(list(items.values())))
+
+
+def export_task(alerts):
+    """Prints alerts as JSON.  A task; see TaskScheduler."""
+    result = []
+    for alert in alerts:
+        result.append(alert.export_dict())
+        yield "Exported {} of {} alert(s)".format(len(result), len(alerts))
     if len(result) == 1:
         result = result[0]
     print(json.dumps(result, separators=(',', ':')))
@@ -2061,10 +4870,15 @@ def cmd_import(event, data):
 
     if not isinstance(result, list):
         result = [result]
+    plugin.tasks.start('import', import_task(result))
+
 
+def import_task(entries):
+    """Imports alerts from (decoded) JSON, if none of them conflict.  A task; see TaskScheduler."""
     ok = True
     new_alerts = OrderedDict()
-    for ix, chunk in enumerate(result):
+    for ix, chunk in enumerate(entries):
+        yield "Read {} of {} alert(s)".format(ix, len(entries))
         try:
             alert = Alert.import_dict(chunk)
         except Exception as ex:
@@ -2082,9 +4896,22 @@ def cmd_import(event, data):
             continue
         new_alerts[key] = alert
 
+    # Something else may have added conflicting alerts since they were checked.
+    for key, alert in new_alerts.items():
+        if key in plugin.alerts:
+            print("Failed to import '{}': Alert already exists.".format(alert.name))
+            ok = False
     if ok:
-        plugin.alerts.update(new_alerts)
+        with plugin.alerts.batch():
+            plugin.alerts.update(new_alerts)
         print("Imported {} alert(s)".format(len(new_alerts)))
+        for alert in new_alerts.values():
+            missing = alert.missing_filter_lists()
+            if missing:
+                print(
+                    "Warning: Alert '{}' uses filter list(s) that don't exist: {}.  Those rules are skipped until the"
+                    " lists are defined with /alerts filterlist DEFINE".format(alert.name, ", ".join(missing))
+                )
     else:
         print("Imported aborted, error(s) occurred.")
 
@@ -2147,37 +4974,7 @@ def cmd_filterlist(event, alert, subcommand, *stanzas, key, filtername, factory)
             .format(command=event.command.upper(), alert=alert.name)
         )
 
-    # Pad stanzas to a multiple of 2 for convenience
-    filt = []
-    for ix in range(0, len(stanzas), 2):
-        action = stanzas[ix].lower()
-        try:
-            texts = stanzas[ix+1]
-        except IndexError:  # Exceeded end of list.
-            texts = None
-
-        if action in {'allow', 'accept', '+'}:
-            allowed = True
-        elif action in {'deny', 'reject', 'block', 'ignore', '-'}:
-            allowed = False
-        else:
-            raise InvalidCommandException("Unknown action '{}', expected ALLOW or DENY".format(action))
-
-        if texts is None:
-            filt.append((allowed, None))
-            continue
-        if texts[-1] == ",":
-            raise InvalidCommandException(
-                "Near '{text}': Pattern list cannot end with a comma.  (HINT: If you were trying to specify multiple"
-                " patterns to {action}, they cannot be separated with spaces -- use 'a,b,c' not 'a, b, c')"
-                .format(text=texts, action=action)
-            )
-        texts = texts.split(",")
-        for text in texts:
-            if not text:
-                raise InvalidCommandException("Near '{}': Empty pattern in pattern list.".format(stanzas[ix+1]))
-            filt.append((allowed, factory(text)))
-
+    filt = parse_filter(stanzas, factory)
     alert.filters[key] = filt
     alert.invalidate_filter_cache()
     print("Updated {} for alert '{}'".format(filtername, alert.name))
@@ -2185,11 +4982,61 @@ def cmd_filterlist(event, alert, subcommand, *stanzas, key, filtername, factory)
 
 alert_command(
     "nicklist",
-    help="<alert> EDIT|CLEAR|(SET ALLOW|DENY pattern,pattern... ALLOW|DENY pattern,pattern...):"
+    help="<alert> EDIT|CLEAR|(SET ALLOW|DENY|USE pattern,pattern... ALLOW|DENY|USE pattern,pattern...):"
          "  Edits the nickname filter."
 )(functools.partial(cmd_filterlist, key='nick', filtername='nickname filter', factory=UserPattern))
 
 
+@command("filterlist", help="[DEFINE <name> ALLOW|DENY pattern,pattern...|EDIT <name>|DELETE <name>]: Manages shared"
+                            " nickname filter lists.")
+def cmd_shared_filterlist(event, subcommand=None, name=None, *stanzas):
+    if subcommand is None:
+        if not plugin.filter_lists:
+            print("No filter lists defined.")
+            return
+        for key, filter_list in sorted(plugin.filter_lists.items()):
+            users = sum(1 for alert in plugin.alerts.values() if alert.uses_filter_list(key))
+            print("{}:{} (used by {} alert(s))".format(
+                IRC.bold(filter_list.name), describe_filter(filter_list.rules) or " (empty)", users
+            ))
+        return
+
+    subcommand = subcommand.lower()
+    if name is None:
+        raise InvalidCommandException("Which filter list?")
+    key = name.lower()
+    filter_list = plugin.filter_lists.get(key)
+
+    if subcommand == 'define':
+        if not stanzas:
+            raise InvalidCommandException("No stanzas specified.")
+        if filter_list is not None:
+            name = filter_list.name
+        plugin.filter_lists[key] = FilterList(name, parse_filter(stanzas, UserPattern, allow_use=False))
+        print("{} filter list '{}'".format("Updated" if filter_list is not None else "Defined", name))
+        return
+
+    if filter_list is None:
+        raise InvalidCommandException("No filter list named '{}'.".format(name))
+
+    if subcommand == 'edit':
+        hexchat.command("SETTEXT /ALERTS FILTERLIST DEFINE {}{}".format(
+            filter_list.name, describe_filter(filter_list.rules) or " DENY "
+        ))
+        return
+
+    if subcommand not in ('del', 'delete'):
+        raise InvalidCommandException("Unknown action '{}'.".format(subcommand))
+    users = [alert.name for alert in plugin.alerts.values() if alert.uses_filter_list(key)]
+    if users:
+        raise InvalidCommandException(
+            "Filter list '{}' is used by: {}.  Change their nickname filters first."
+            .format(filter_list.name, ", ".join(users))
+        )
+    del plugin.filter_lists[key]
+    print("Deleted filter list '{}'".format(filter_list.name))
+
+
 # noinspection PyProtectedMember
 @command("debug")
 def cmd_debug(event, name=None):
@@ -2227,19 +5074,20 @@ def cmd_debug(event, name=None):
 @command("colors", help=": Shows a list of colors")
 def cmd_colors(event):
     rowsize = 16
-    print("Listing all available colors:")
-    for offset in range(IRC.MINCOLOR, IRC.MAXCOLOR+1, rowsize):
-        print("  {colors}{reset}".format(
-            colors=IRC.bold("".join(
-                "{1} {0:02}{2} {0:02} ".format(c, IRC.color(0, c), IRC.color(1, c))
-                for c in range(offset, min(offset+rowsize, IRC.MAXCOLOR+1))
-            )),
-            reset=IRC.ORIGINAL
-        ))
-    print(
-        "HINT: Colors 0-15 correspond to the 'mIRC colors' in your Hexchat preferences.  16-31 correspond to your"
-        " 'Local colors'.  Subsequent numbers may map to other interface colors."
-    )
+    with OutputBuffer() as output:
+        output.print("Listing all available colors:")
+        for offset in range(IRC.MINCOLOR, IRC.MAXCOLOR+1, rowsize):
+            output.print("  {colors}{reset}".format(
+                colors=IRC.bold("".join(
+                    "{1} {0:02}{2} {0:02} ".format(c, IRC.color(0, c), IRC.color(1, c))
+                    for c in range(offset, min(offset+rowsize, IRC.MAXCOLOR+1))
+                )),
+                reset=IRC.ORIGINAL
+            ))
+        output.print(
+            "HINT: Colors 0-15 correspond to the 'mIRC colors' in your Hexchat preferences.  16-31 correspond to your"
+            " 'Local colors'.  Subsequent numbers may map to other interface colors."
+        )
 
 
 def command_hook(words, word_eol, userdata):
@@ -2256,8 +5104,95 @@ def command_hook(words, word_eol, userdata):
     return hexchat.EAT_ALL
 
 
+#: keyval of the Tab key, as given by the Key Press event.
+TAB_KEY = '65289'
+#: Commands whose arguments aren't alert names.
+NON_ALERT_COMMANDS = frozenset((
+    'add', 'cancel', 'colors', 'filterlist', 'import', 'latency', 'profile', 'save', 'stats', 'version'
+))
+
+
+def completions(words, prefix):
+    """
+    Returns what the word being typed in "/alerts <words...> <prefix>" could be completed to: commands, settings, option
+    names or alert names, depending on where it is.
+    """
+    prefix = prefix.lower()
+    if not words:
+        return starting_with(sorted(Plugin.commands), prefix)
+    command = words[0].lower()
+    position = len(words)  # Of the word being typed, after the command.
+    if command == 'help':
+        return starting_with(HELP_INDEX.keys, prefix) if position == 1 else []
+    if command == 'option':
+        return starting_with(sorted(Plugin.options), prefix) if position == 1 else []
+    if command in ('set', 'show', 'clear') and position > 1:
+        if command == 'set' and position % 2:
+            return []  # A value, not a setting.
+        return starting_with(Alert.SETTINGS, prefix)
+    if command in NON_ALERT_COMMANDS:
+        return []
+    return plugin.alerts.complete(prefix)
+
+
+def key_press_hook(words, word_eol, userdata):
+    """Tab-completes /alerts commands."""
+    if words[0] != TAB_KEY or int(words[1]) & 5:  # Not Tab, or Shift/Ctrl+Tab
+        return None
+    text = hexchat.get_info('inputbox') or ""
+    if not text.lower().startswith("/alerts ") or hexchat.get_prefs('state_cursor') != len(text):
+        return None
+    head, _, typed = text.rpartition(" ")
+    candidates = completions(head.split()[1:], typed)
+    if not candidates:
+        return None
+
+    if len(candidates) == 1:
+        completed = candidates[0] + " "
+    else:
+        completed = candidates[0][:len(os.path.commonprefix([candidate.lower() for candidate in candidates]))]
+        if len(completed) <= len(typed):
+            print(" ".join(candidates))
+            return hexchat.EAT_ALL
+    text = head + " " + completed
+    hexchat.command("SETTEXT " + text)
+    hexchat.command("SETCURSOR {}".format(len(text)))
+    return hexchat.EAT_ALL
+
+
+def isupport_hook(words, word_eol, userdata):
+    """Notes the case mapping a server advertises in RPL_ISUPPORT (005)."""
+    for word in words[3:]:
+        if word.upper().startswith("CASEMAPPING="):
+            network = (hexchat.get_info('network') or '').lower()
+            value = word.partition("=")[2].lower()
+            if plugin.casemappings.get(network) != value:
+                plugin.casemappings[network] = value
+                hexchat.set_pluginpref("python_alerts_casemappings", json.dumps(plugin.casemappings))
+    return hexchat.EAT_NONE
+
+
+def hook_events(callback):
+    """Hooks all of the print events we handle to callback, replacing whatever they were hooked to before."""
+    for event_type in EVENT_TYPES:
+        hook = event_hooks.get(event_type)
+        if hook is not None:
+            hexchat.unhook(hook)
+        event_hooks[event_type] = hexchat.hook_print(event_type, callback, event_type)
+
+
 def unload_hook(userdata):
     plugin.save()
+    if plugin.sound_player is not None:
+        plugin.sound_player.stop()
+    if plugin.notify_buffer is not None:
+        plugin.notify_buffer.stop()
+    plugin.copy_buffer.stop()
+    if plugin.profiler is not None:
+        plugin.profiler.stop(report=False, rehook=False)
+    if plugin.match_pool is not None:
+        plugin.match_pool.stop()
+    plugin.tasks.stop()
 
 
 plugin = Plugin()
@@ -2269,10 +5204,12 @@ plugin.load()
 print("{} alert(s) loaded".format(len(plugin.alerts)))
 hexchat.hook_unload(unload_hook)
 hexchat.hook_command("alerts", command_hook, help="Configures custom alerts")
+hexchat.hook_server("005", isupport_hook)
+hexchat.hook_print("Key Press", key_press_hook)
 
-event_hooks = {}
-for event_type in (
+EVENT_TYPES = (
     "Channel Msg Hilight", "Channel Message", "Channel Action",
     "Private Message", "Private Message to Dialog", "Private Action", "Private Action to Dialog"
-):
-    event_hooks[event_type] = hexchat.hook_print(event_type, message_hook, event_type)
+)
+event_hooks = {}
+hook_events(message_hook)
@@ -0,0 +1,50 @@
+"""
+Measures /alerts dump ALL with a large number of alerts.
+
+Inside Hexchat, every separate line printed is added to (and redraws) the text view, so the number of prints matters as
+much as the time taken here.
+
+Usage: python bench_dump.py [--alerts N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+import harness  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=5000, help="Number of alerts (default: %(default)s)")
+    args = parser.parse_args()
+
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout  # Silence the plugin's setup output
+    try:
+        alerts = harness.load_plugin()
+        model = alerts.hexchat.model
+        model.add_context("libera", "#home", focus=True)
+        for ix in range(args.alerts):
+            alert = alerts.Alert("alert{}".format(ix))
+            alert.bold = True
+            alert.tags = ["bench"]
+            alerts.plugin.alerts.append(alert)
+
+        prints = []
+        alerts.print = lambda *a, **kw: prints.append(a)  # Counts what would be Hexchat prints
+        start = time.perf_counter()
+        model.type_command("alerts dump ALL")
+        model.run_timers()
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    lines = sum(str(a[0]).count("\n") + 1 for a in prints if a)
+    print("{} alerts: {} lines in {} print(s), {:.1f} ms".format(args.alerts, lines, len(prints), elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
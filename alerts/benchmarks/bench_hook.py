@@ -0,0 +1,95 @@
+"""
+Measures how long incoming messages take to get through the message hook.
+
+Loads the plugin against the fake hexchat module used by the tests, defines a number of alerts, and feeds it a mix of
+messages (most of which match nothing, as in real life).
+
+--repeat-rate is the fraction of messages that repeat a recent one (as relayed messages do), which the match cache
+should make cheap.
+
+Usage: python bench_hook.py [--alerts N] [--messages N] [--match-rate F] [--repeat-rate F] [--multi] [--regex]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+import harness  # noqa: E402
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris"
+).split()
+
+
+def setup(alert_count, regex=False, multi=False):
+    alerts = harness.load_plugin()
+    model = alerts.hexchat.model
+    model.add_context("libera", "#home", focus=True)
+    channel = model.add_context("libera", "#bench", users=[("bob", "bob@example.com")])
+    for ix in range(alert_count):
+        name = "alert{}".format(ix)
+        model.type_command("alerts add " + name)
+        if regex:
+            model.type_command("alerts regex {} \\bkeyword{}\\w*".format(name, ix))
+        else:
+            model.type_command("alerts pattern {} keyword{}".format(name, ix))
+        model.type_command("alerts set {} bold on".format(name))
+    if multi:
+        model.type_command("alerts option multi_highlight on")
+    return alerts, model, channel
+
+
+def messages(count, alert_count, match_rate, rng, repeat_rate=0.0):
+    recent = []
+    for _ in range(count):
+        if recent and rng.random() < repeat_rate:
+            yield rng.choice(recent)
+            continue
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 20))]
+        if alert_count and rng.random() < match_rate:
+            words.insert(rng.randrange(len(words)), "keyword{}".format(rng.randrange(alert_count)))
+        text = " ".join(words)
+        recent = recent[-9:] + [text]
+        yield text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=100, help="Number of alerts (default: %(default)s)")
+    parser.add_argument("--messages", type=int, default=5000, help="Number of messages (default: %(default)s)")
+    parser.add_argument("--match-rate", type=float, default=0.05, help="Fraction that match (default: %(default)s)")
+    parser.add_argument("--repeat-rate", type=float, default=0.0, help="Fraction repeated (default: %(default)s)")
+    parser.add_argument("--multi", action="store_true", help="Enable the multi_highlight option")
+    parser.add_argument("--regex", action="store_true", help="Use regex alerts rather than patterns")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout  # Silence the plugin's setup output
+    try:
+        alerts, model, channel = setup(args.alerts, regex=args.regex, multi=args.multi)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    texts = list(messages(args.messages, args.alerts, args.match_rate, random.Random(args.seed), args.repeat_rate))
+    start = time.perf_counter()
+    for text in texts:
+        model.receive(channel, "Channel Message", "bob", text)
+    elapsed = time.perf_counter() - start
+
+    histogram = alerts.plugin.latency["Channel Message"]
+    print("{} alerts, {} messages: {:.1f} us/message (in hook: mean {:.1f} us, p50 {:.0f} us, p99 {:.0f} us)".format(
+        args.alerts, args.messages, elapsed / args.messages * 1e6,
+        histogram.mean, histogram.percentile(0.5), histogram.percentile(0.99)
+    ))
+    cache = alerts.plugin.match_cache
+    if cache is not None:
+        print("Match cache: {:.0%} hit rate".format(cache.hit_rate))
+
+
+if __name__ == '__main__':
+    main()
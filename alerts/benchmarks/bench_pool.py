@@ -0,0 +1,63 @@
+"""
+Compares checking messages in Hexchat itself with checking them in worker processes (the match_workers option).
+
+What matters with workers is how long Hexchat is blocked (time spent in the hook), not how long a message takes to
+appear, so both are reported.
+
+Messages are all sent before any results are collected, so "until printed" is mostly queueing.
+
+Usage: python bench_pool.py [--alerts N] [--messages N] [--workers N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import bench_hook
+
+
+def run(alert_count, texts, workers):
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout  # Silence the plugin's setup output
+    try:
+        alerts, model, channel = bench_hook.setup(alert_count, regex=True)
+        if workers:
+            model.type_command("alerts option match_python " + sys.executable)
+            model.type_command("alerts option match_workers {}".format(workers))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    start = time.perf_counter()
+    for text in texts:
+        model.receive(channel, "Channel Message", "bob", text)
+    if workers:
+        alerts.plugin.match_pool.wait()
+    elapsed = time.perf_counter() - start
+
+    hook = alerts.plugin.latency["Channel Message"]
+    line = "{:>2} workers: {:.1f} us/message, in hook: mean {:.1f} us, p99 {:.0f} us".format(
+        workers, elapsed / len(texts) * 1e6, hook.mean, hook.percentile(0.99)
+    )
+    if workers:
+        pooled = alerts.plugin.latency["(pooled) Channel Message"]
+        line += "; until printed: p50 {:.0f} us, p99 {:.0f} us".format(pooled.percentile(0.5), pooled.percentile(0.99))
+        alerts.plugin.match_pool.stop()
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=5000, help="Number of alerts (default: %(default)s)")
+    parser.add_argument("--messages", type=int, default=500, help="Number of messages (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of workers (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = list(bench_hook.messages(args.messages, args.alerts, 0.05, random.Random(args.seed)))
+    run(args.alerts, texts, 0)
+    run(args.alerts, texts, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares UserPattern's optimized matching against the full '^nick!user@host$' regex it is equivalent to.
+
+Usage: python bench_userpattern.py [--number N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+import harness  # noqa: E402
+
+PATTERNS = ("bob", "bob!bob@example.com", "*@example.com", "!bob", "*!*@*.example.com", "b?b", "b*!*@*.com")
+SUBJECTS = (
+    "bob!bob@example.com", "someone!~user@192-0-2-1.dsl.isp.example.net", "eve!eve@user/eve",
+    "SomeLongerNickname!~quassel@2001-db8-85a3-0-8a2e-370-7334.broadband.example.org",
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=200000, help="Matches per measurement (default: %(default)s)")
+    args = parser.parse_args()
+
+    alerts = harness.load_plugin()
+    folded_subjects = tuple(alerts.irc_fold(subject) for subject in SUBJECTS)
+    print("{:<24} {:<12} {:>10} {:>10} {:>8}".format("pattern", "method", "full (ns)", "opt (ns)", "speedup"))
+    for text in PATTERNS:
+        pattern = alerts.UserPattern(text)
+        full = re.compile(pattern.full_regex, re.IGNORECASE).match
+        optimized = pattern.match
+
+        def run_full():  # UserPattern.match() used to do this, plus a method call and bool()
+            for subject in SUBJECTS:
+                full(subject)
+
+        def run_optimized():  # Subjects are folded once per message, no matter how many patterns there are.
+            for subject in folded_subjects:
+                optimized(subject)
+
+        scale = 1e9 / (args.number * len(SUBJECTS))
+        full_time = min(timeit.repeat(run_full, number=args.number, repeat=7)) * scale
+        optimized_time = min(timeit.repeat(run_optimized, number=args.number, repeat=7)) * scale
+        print("{:<24} {:<12} {:>10.0f} {:>10.0f} {:>7.1f}x".format(
+            text, pattern.methodname, full_time, optimized_time, full_time / optimized_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import pytest
+
+import harness
+import hexchat
+
+
+@pytest.fixture
+def model():
+    """A fresh fake Hexchat, with the focused window in #home and a few people talking in #ops."""
+    model = hexchat.reset()
+    model.add_context("libera", "#home", focus=True)
+    model.add_context("libera", "#ops", users=[("bob", "bob@example.com"), ("eve", "eve@evil.example")])
+    return model
+
+
+@pytest.fixture
+def home(model):
+    return model.find("libera", "#home")
+
+
+@pytest.fixture
+def ops(model):
+    return model.find("libera", "#ops")
+
+
+@pytest.fixture
+def alerts(model):
+    """The plugin module, freshly loaded."""
+    return harness.load_plugin(model)
+
+
+@pytest.fixture
+def run(model, alerts):
+    """Runs /alerts subcommands."""
+    def run(*commands):
+        for command in commands:
+            model.type_command("alerts " + command)
+    return run
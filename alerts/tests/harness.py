@@ -0,0 +1,42 @@
+"""
+Loads alerts.py against the fake hexchat module in this directory.
+
+Used by the tests (via conftest.py) and by the benchmarks.
+"""
+import importlib
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(TESTS_DIR)
+
+for path in (PLUGIN_DIR, TESTS_DIR):  # TESTS_DIR ends up first, so its hexchat.py is found
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import hexchat  # noqa: E402
+
+
+def load_plugin(model=None):
+    """
+    Imports a fresh copy of the plugin.
+
+    :param model: Fake hexchat model to load against.  If None, the current one is reset first.  Pass the existing
+        model to simulate restarting Hexchat (for instance, to test that alerts are saved and loaded again).
+    :return: The plugin module.
+    """
+    if model is None:
+        hexchat.reset()
+    else:
+        hexchat.model = model
+    sys.modules.pop('alerts', None)
+    return importlib.import_module('alerts')
+
+
+def reload_plugin():
+    """Unloads the plugin (running its unload hooks) and loads it again with the same model."""
+    model = hexchat.model
+    model.unload()
+    model.hooks.clear()
+    model.timers.clear()
+    return load_plugin(model)
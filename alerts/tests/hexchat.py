@@ -0,0 +1,459 @@
+"""
+Scriptable stand-in for HexChat's embedded ``hexchat`` module.
+
+Lets alerts.py be loaded, driven and inspected without a running HexChat.  All state lives on a single `Model`
+instance (`hexchat.model`), which tests reset between runs with `hexchat.reset()`.
+
+Typical use (see also harness.py, which takes care of importing the plugin)::
+
+    import hexchat
+    model = hexchat.reset()
+    chan = model.add_context("libera", "#ops", users=[("nick", "user@host")])
+    import alerts
+    model.type_command("alerts add hello")
+    model.receive(chan, "Channel Message", "nick", "hello world")
+    chan.events  # => [('Channel Message', 'nick', '\x02hello\x0f world')]
+
+Things the plugin does are recorded rather than acted on: text printed to a context ends up in its `output`, emitted
+events in its `events`, commands in `commands` (on both the context and the model), /SPLAY in `model.sounds` and so
+on.  Timers only run when the test advances the clock with `model.advance()` or `model.run_timers()`.
+"""
+import re
+
+EAT_NONE = 0
+EAT_HEXCHAT = 1
+EAT_PLUGIN = 2
+EAT_ALL = 3
+
+PRI_HIGHEST = 127
+PRI_HIGH = 64
+PRI_NORM = 0
+PRI_LOW = -64
+PRI_LOWEST = -128
+
+_color_regexp = re.compile(r'\003(?:\d{1,2}(?:,\d{1,2})?)?|\004(?:[0-9a-fA-F]{6}(?:,[0-9a-fA-F]{6})?)?')
+_attribute_regexp = re.compile('[\002\035\037\026\017\036\021]')
+
+
+class ListItem:
+    """An entry in the result of get_list().  Attributes vary by list."""
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return "ListItem({})".format(", ".join("{}={!r}".format(k, v) for k, v in sorted(self.__dict__.items())))
+
+
+class Hook:
+    def __init__(self, kind, name, callback, userdata, priority=PRI_NORM, **extra):
+        self.kind = kind
+        self.name = name
+        self.callback = callback
+        self.userdata = userdata
+        self.priority = priority
+        self.extra = extra
+
+
+class Timer(Hook):
+    def __init__(self, timeout, callback, userdata, due):
+        super().__init__('timer', None, callback, userdata)
+        self.timeout = timeout
+        self.due = due
+
+
+class Context:
+    """
+    A server, channel or query tab.
+
+    :ivar output: Lines written with prnt() (and print() while this context is current)
+    :ivar events: (event, args...) tuples passed to emit_print().
+    :ivar commands: Commands executed in this context.
+    """
+    TYPE_SERVER = 1
+    TYPE_CHANNEL = 2
+    TYPE_QUERY = 3
+
+    def __init__(self, model, network, channel, server_id, type=TYPE_CHANNEL, topic=""):
+        self.model = model
+        self.network = network
+        self.channel = channel
+        self.id = server_id
+        self.type = type
+        self.topic = topic
+        self.inputbox = ""
+        self.cursor = None  # Position of the cursor in the inputbox; None is the end.
+        self.nick = "me"
+        self.users = []
+        self.output = []
+        self.events = []
+        self.commands = []
+
+    def __repr__(self):
+        return "<Context {}/{}>".format(self.network, self.channel)
+
+    def set(self):
+        self.model.current = self
+        return True
+
+    def prnt(self, text):
+        self.output.append(text)
+
+    def emit_print(self, event_name, *args, **kwargs):
+        self.events.append((event_name,) + tuple(args))
+        with self.model.switch(self):
+            self.model.dispatch_print(event_name, list(args))
+        return True
+
+    def command(self, text):
+        with self.model.switch(self):
+            self.model.command(text)
+
+    def get_info(self, key):
+        if key == 'network':
+            return self.network
+        if key == 'server':
+            return self.network
+        if key == 'channel':
+            return self.channel
+        if key == 'topic':
+            return self.topic
+        if key == 'inputbox':
+            return self.inputbox
+        if key == 'nick':
+            return self.nick
+        return self.model.info.get(key)
+
+    def get_list(self, name):
+        if name == 'users':
+            return [ListItem(nick=nick, host=host, prefix="", realname="", account=None, away=0, selected=0)
+                    for nick, host in self.users]
+        return self.model.get_list(name)
+
+    def add_user(self, nick, host):
+        self.users.append((nick, host))
+
+
+class Model:
+    """The complete state of the fake client."""
+    def __init__(self):
+        self.contexts = []
+        self.current = None
+        self.focused = None
+        self.prefs = {}
+        self.hooks = []
+        self.timers = []
+        self.now = 0  # Milliseconds
+        self.info = {'configdir': None, 'version': '2.14.3'}
+        self.commands = []
+        self.sounds = []
+        self.flashes = 0
+        self._next_server_id = 1
+        self._server_ids = {}
+        self.add_context("fake", None, type=Context.TYPE_SERVER)
+
+    # region Building the model
+    def server_id(self, network):
+        if network not in self._server_ids:
+            self._server_ids[network] = self._next_server_id
+            self._next_server_id += 1
+        return self._server_ids[network]
+
+    def add_context(self, network, channel, type=Context.TYPE_CHANNEL, users=(), topic="", focus=False):
+        """Creates a new tab.  The first tab created becomes both current and focused."""
+        ctx = Context(self, network, channel, self.server_id(network), type=type, topic=topic)
+        for nick, host in users:
+            ctx.add_user(nick, host)
+        self.contexts.append(ctx)
+        if self.current is None or self.current.type == Context.TYPE_SERVER and type != Context.TYPE_SERVER:
+            self.current = ctx
+        if self.focused is None or focus or self.focused.type == Context.TYPE_SERVER and type != Context.TYPE_SERVER:
+            self.focused = ctx
+        return ctx
+
+    def close_context(self, ctx):
+        self.contexts.remove(ctx)
+        if self.current is ctx:
+            self.current = self.contexts[0] if self.contexts else None
+        if self.focused is ctx:
+            self.focused = self.contexts[0] if self.contexts else None
+
+    def find(self, network=None, channel=None):
+        """Mimics hexchat.find_context()"""
+        for ctx in self.contexts:
+            if network is not None and ctx.network.lower() != network.lower():
+                continue
+            if channel is not None and (ctx.channel or "").lower() != channel.lower():
+                continue
+            if network is None and channel is None:
+                return self.focused
+            return ctx
+        return None
+
+    class _Switch:
+        def __init__(self, model, ctx):
+            self.model = model
+            self.ctx = ctx
+            self.previous = None
+
+        def __enter__(self):
+            self.previous = self.model.current
+            self.model.current = self.ctx
+
+        def __exit__(self, *exc):
+            self.model.current = self.previous
+
+    def switch(self, ctx):
+        """Context manager that temporarily makes ctx current, like Hexchat does while running hooks."""
+        return self._Switch(self, ctx)
+    # endregion
+
+    # region Driving the model
+    def receive(self, ctx, event_name, *args):
+        """
+        Simulates Hexchat printing an event in ctx.  If no hook eats it, it is recorded as printed normally.
+
+        Returns the highest eat value returned by a hook.
+        """
+        with self.switch(ctx):
+            result = self.dispatch_print(event_name, list(args))
+        if result < EAT_HEXCHAT:
+            ctx.events.append((event_name,) + tuple(args))
+        return result
+
+    def receive_server(self, ctx, line):
+        """
+        Simulates a raw line from the server of ctx, e.g. ':irc.example.com 005 me CASEMAPPING=ascii :are supported'
+        """
+        words = line.split(" ")
+        with self.switch(ctx):
+            for hook in self._sorted_hooks('server', words[1]):
+                rv = hook.callback(words, self._word_eol(words), hook.userdata)
+                if rv in (EAT_PLUGIN, EAT_ALL):
+                    break
+
+    def dispatch_print(self, event_name, words):
+        result = EAT_NONE
+        for hook in self._sorted_hooks('print', event_name):
+            rv = hook.callback(list(words), self._word_eol(words), hook.userdata)
+            result = max(result, rv or EAT_NONE)
+            if rv in (EAT_PLUGIN, EAT_ALL):
+                break
+        return result
+
+    def type_command(self, text, ctx=None):
+        """Simulates the user typing /text into ctx (the focused context by default)."""
+        with self.switch(ctx or self.focused):
+            self.command(text)
+
+    def command(self, text):
+        ctx = self.current
+        ctx.commands.append(text)
+        self.commands.append((ctx, text))
+        words = text.split(" ")
+        name = words[0].lower()
+        if name == 'query':
+            args = [w for w in words[1:] if not w.startswith("-")]
+            if args and not self.find(ctx.network, args[0]):
+                self.add_context(ctx.network, args[0], type=Context.TYPE_QUERY, focus="-nofocus" not in words)
+            return
+        if name == 'gui' and len(words) > 1:
+            action = words[1].lower()
+            if action == 'focus':
+                self.focused = ctx
+            elif action == 'flash':
+                self.flashes += 1
+            return
+        if name == 'splay':
+            self.sounds.append(text[len(words[0]) + 1:].strip('"'))
+            return
+        if name == 'settext':
+            ctx.inputbox = text[len(words[0]) + 1:]
+            ctx.cursor = None
+            return
+        if name == 'setcursor':
+            ctx.cursor = int(words[1])
+            return
+        if name == 'say':
+            return
+        for hook in self._sorted_hooks('command', name):
+            rv = hook.callback(words, self._word_eol(words), hook.userdata)
+            if rv in (EAT_PLUGIN, EAT_ALL):
+                break
+
+    def advance(self, ms):
+        """Advances the clock by ms milliseconds, running any timers that come due."""
+        target = self.now + ms
+        while True:
+            due = [t for t in self.timers if t.due <= target]
+            if not due:
+                break
+            timer = min(due, key=lambda t: t.due)
+            self.now = max(self.now, timer.due)
+            if timer.callback(timer.userdata):
+                timer.due = self.now + timer.timeout
+            elif timer in self.timers:
+                self.timers.remove(timer)
+        self.now = target
+
+    def run_timers(self, limit=10000):
+        """Runs timers until none are left (or limit iterations pass).  Returns the number of timer calls."""
+        count = 0
+        while self.timers and count < limit:
+            timer = min(self.timers, key=lambda t: t.due)
+            self.now = max(self.now, timer.due)
+            count += 1
+            if timer.callback(timer.userdata):
+                timer.due = self.now + timer.timeout
+            elif timer in self.timers:
+                self.timers.remove(timer)
+        return count
+
+    def unload(self):
+        for hook in list(self.hooks):
+            if hook.kind == 'unload':
+                hook.callback(hook.userdata)
+    # endregion
+
+    # region Internals
+    @staticmethod
+    def _word_eol(words):
+        return [" ".join(words[ix:]) for ix in range(len(words))]
+
+    def _sorted_hooks(self, kind, name):
+        hooks = [h for h in self.hooks if h.kind == kind and (h.name or "").lower() == name.lower()]
+        return sorted(hooks, key=lambda h: -h.priority)
+
+    def get_list(self, name):
+        if name == 'channels':
+            return [
+                ListItem(
+                    channel=ctx.channel or ctx.network, network=ctx.network, server=ctx.network, id=ctx.id,
+                    type=ctx.type, context=ctx, flags=0, users=len(ctx.users), chantypes="#&", nickprefixes="@+",
+                    nickmodes="ov"
+                )
+                for ctx in self.contexts
+            ]
+        if name in ('dcc', 'ignore', 'notify'):
+            return []
+        return None
+    # endregion
+
+
+model = Model()
+
+
+def reset():
+    """Discards all state and starts over with a fresh model."""
+    global model
+    model = Model()
+    return model
+
+
+# region Module API
+def prnt(text):
+    model.current.prnt(text)
+
+
+def emit_print(event_name, *args, **kwargs):
+    return model.current.emit_print(event_name, *args, **kwargs)
+
+
+def command(text):
+    model.command(text)
+
+
+def get_info(key):
+    return model.current.get_info(key)
+
+
+def get_list(name):
+    return model.current.get_list(name)
+
+
+def get_context():
+    return model.current
+
+
+def find_context(server=None, channel=None):
+    return model.find(server, channel)
+
+
+def get_prefs(name):
+    if name == 'state_cursor':
+        ctx = model.current
+        return len(ctx.inputbox) if ctx.cursor is None else ctx.cursor
+    return model.info.get(name)
+
+
+def strip(text, length=-1, flags=3):
+    if length != -1:
+        text = text[:length]
+    if flags & 1:
+        text = _color_regexp.sub('', text)
+    if flags & 2:
+        text = _attribute_regexp.sub('', text)
+    return text
+
+
+def nickcmp(a, b):
+    a, b = a.lower(), b.lower()
+    return (a > b) - (a < b)
+
+
+def get_pluginpref(name):
+    value = model.prefs.get(name)
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)  # Hexchat hands back numeric strings as integers.
+    return value
+
+
+def set_pluginpref(name, value):
+    model.prefs[name] = str(value)
+    return True
+
+
+def del_pluginpref(name):
+    model.prefs.pop(name, None)
+    return True
+
+
+def list_pluginpref():
+    return list(model.prefs)
+
+
+def hook_command(name, callback, userdata=None, priority=PRI_NORM, help=None):
+    hook = Hook('command', name, callback, userdata, priority, help=help)
+    model.hooks.append(hook)
+    return hook
+
+
+def hook_print(name, callback, userdata=None, priority=PRI_NORM):
+    hook = Hook('print', name, callback, userdata, priority)
+    model.hooks.append(hook)
+    return hook
+
+
+def hook_server(name, callback, userdata=None, priority=PRI_NORM):
+    hook = Hook('server', name, callback, userdata, priority)
+    model.hooks.append(hook)
+    return hook
+
+
+def hook_unload(callback, userdata=None):
+    hook = Hook('unload', None, callback, userdata)
+    model.hooks.append(hook)
+    return hook
+
+
+def hook_timer(timeout, callback, userdata=None):
+    timer = Timer(timeout, callback, userdata, model.now + timeout)
+    model.timers.append(timer)
+    return timer
+
+
+def unhook(hook):
+    if hook in model.hooks:
+        model.hooks.remove(hook)
+    if hook in model.timers:
+        model.timers.remove(hook)
+# endregion
@@ -0,0 +1,125 @@
+import pytest
+
+
+@pytest.fixture
+def make(alerts):
+    def make(*names, **settings):
+        result = []
+        for name in names:
+            alert = alerts.Alert(name)
+            for attr, value in settings.items():
+                setattr(alert, attr, value)
+            result.append(alert)
+        return result
+    return make
+
+
+@pytest.fixture
+def alertdict(alerts):
+    return alerts.AlertDict()
+
+
+def test_order(alertdict, make):
+    a, b, c, d = make("a", "b", "c", "d")
+    alertdict.append(a)
+    alertdict.append(c)
+    alertdict.insertbefore(b, c)
+    alertdict.insertafter(d, c)
+    assert list(alertdict) == ["a", "b", "c", "d"]
+    alertdict.moveafter(a, None)
+    alertdict.movebefore(b, None)
+    assert list(alertdict) == ["a", "c", "d", "b"]
+    del alertdict["C"]
+    assert list(alertdict) == ["a", "d", "b"]
+    assert [alertdict.position(alert) for alert in (a, d, b)] == [0, 1, 2]
+
+
+def test_snapshot_is_reused_until_changed(alertdict, make):
+    a, b = make("a", "b")
+    alertdict.append(a)
+    snapshot = alertdict.snapshot()
+    assert alertdict.snapshot() is snapshot
+    alertdict.append(b)
+    assert alertdict.snapshot() == (a, b)
+
+
+def test_iteration_survives_changes(alertdict, make):
+    alerts = make("a", "b", "c")
+    for alert in alerts:
+        alertdict.append(alert)
+    seen = []
+    for name, alert in alertdict.items():
+        seen.append(name)
+        alertdict.remove(alert)
+    assert seen == ["a", "b", "c"]
+    assert not alertdict
+
+
+def test_rename(alertdict, make):
+    a, b = make("a", "b")
+    alertdict.append(a)
+    alertdict.append(b)
+    a.name = "z"
+    assert list(alertdict) == ["z", "b"]
+    assert "A" not in alertdict and alertdict["Z"] is a
+    with pytest.raises(ValueError):
+        b.name = "Z"
+
+
+def test_network_index(alertdict, make):
+    a, b, c = make("a", "b", "c")
+    for alert in (a, b, c):
+        alertdict.append(alert)
+    b.networks = ["OFTC"]
+    assert alertdict.for_network("libera") == (a, c)
+    assert alertdict.for_network("oftc") == (a, b, c)
+    b.networks = []
+    assert alertdict.for_network("libera") == (a, b, c)
+    alertdict.movebefore(a, None)
+    assert alertdict.for_network("libera") == (b, c, a)
+
+
+def test_network_index_rebuilt_after_batch(alertdict, make):
+    a, b = make("a", "b")
+    alertdict.append(a)
+    assert alertdict.for_network("libera") == (a,)
+    with alertdict.batch():
+        alertdict.append(b)
+        a.networks = ["oftc"]
+    assert alertdict.for_network("libera") == (b,)
+
+
+def test_batch_increments_generation_once(alertdict, make):
+    a, b, c = make("a", "b", "c")
+    alertdict.append(a)
+    generation = alertdict.generation
+    with alertdict.batch():
+        alertdict.append(b)
+        alertdict.changed(a)
+        alertdict.append(c)
+        assert alertdict.snapshot() == (a, b, c)  # Still up to date within the batch
+        assert alertdict.generation == generation
+    assert alertdict.generation == generation + 1
+    with alertdict.batch():
+        pass
+    assert alertdict.generation == generation + 1
+
+
+def test_multi_command_changes_generation_once(alerts, run):
+    run("add a", "add b", "add c")
+    generation = alerts.plugin.alerts.generation
+    run("disable ALL", "mute a b c")
+    assert alerts.plugin.alerts.generation == generation + 1
+
+
+def test_tags_and_glob(alertdict, make):
+    alerts = make("ops-1", "ops-2", "other", "ops")
+    for alert in alerts:
+        alertdict.append(alert)
+    alerts[0].tags = ["Work"]
+    alerts[2].tags = ["work", "home"]
+    assert alertdict.tagged("WORK") == [alerts[0], alerts[2]]
+    assert alertdict.glob("ops-*") == alerts[:2]
+    assert alertdict.glob("o?s*") == [alerts[0], alerts[1], alerts[3]]
+    alertdict.remove(alerts[0])
+    assert alertdict.tagged("work") == [alerts[2]]
@@ -0,0 +1,87 @@
+import pytest
+
+B, U, O = '\002', '\037', '\017'
+
+
+def test_repeated_message_uses_cache(model, ops, alerts, run):
+    other = model.add_context("libera", "#relay", users=[("bob", "bob@example.com")])
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(other, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "bob", "goodbye")
+    cache = alerts.plugin.match_cache
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert other.events == [("Channel Message", "bob", B + "hello" + O)]
+
+
+def test_nick_filters_checked_per_event(model, ops, run):
+    run("add hello", "set hello bold on", "nicklist hello SET DENY eve")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert [event[2] for event in ops.events] == [B + "hello" + O, "hello"]
+
+
+def test_changes_invalidate_cache(model, ops, run):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    run("pattern hello there")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    run("disable hello")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    run("enable hello")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    assert [event[2] for event in ops.events] == [
+        B + "hello" + O + " there", "hello " + B + "there" + O, "hello there", "hello " + B + "there" + O
+    ]
+
+
+def test_cache_is_bounded(model, ops, alerts, run):
+    run("option match_cache_size 2", "add hello")
+    for text in ("a", "b", "c", "a"):
+        model.receive(ops, "Channel Message", "bob", text)
+    cache = alerts.plugin.match_cache
+    assert list(cache.entries) == [("libera", "c"), ("libera", "a")]
+    assert cache.hits == 0
+
+
+def test_stats_show_hit_rate(model, ops, run, capsys):
+    run("add hello")
+    model.receive(ops, "Channel Message", "bob", "hi")
+    model.receive(ops, "Channel Message", "bob", "hi")
+    capsys.readouterr()
+    run("stats")
+    assert "50% hit rate" in capsys.readouterr().out
+
+
+def test_cache_is_per_network(model, ops, alerts, run):
+    other = model.add_context("oftc", "#relay", users=[("bob", "bob@example.com")])
+    run("add hello", "set hello bold on", "set hello networks OFTC")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(other, "Channel Message", "bob", "hello")
+    cache = alerts.plugin.match_cache
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert ops.events == [("Channel Message", "bob", "hello")]
+    assert other.events == [("Channel Message", "bob", B + "hello" + O)]
+
+
+def test_cache_stops_at_first_match(model, ops, alerts, run, monkeypatch):
+    run("add hello", "set hello bold on", "add hell", "set hell word off", "nicklist hell SET DENY eve")
+    checked = []
+    scan = alerts.Alert.scan
+    monkeypatch.setattr(alerts.Alert, "scan", lambda self, event: checked.append(self.name) or scan(self, event))
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert checked == ["hello"]
+    run("nicklist hello SET DENY bob")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert checked == ["hello", "hell"]  # 'hello' matching is remembered
+
+
+@pytest.mark.parametrize("cache_size", [0, 256])
+def test_multi_highlight_same_with_and_without_cache(model, ops, run, cache_size):
+    # 'lo' checks what 'hello' outputs (stripped of formatting), not the formatted message it would see itself.
+    run(
+        "option match_cache_size {}".format(cache_size), "option multi_highlight on",
+        "add hello", "set hello bold line", "add lo", "set lo word off underline on",
+    )
+    model.receive(ops, "Channel Message", "bob", "hel" + B + "lo")
+    assert ops.events == [("Channel Message", B + "bob" + O, B + "hel" + U + "lo" + O + B + O)]
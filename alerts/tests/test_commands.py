@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import harness
+
+
+def names(alerts):
+    return [alert.name for alert in alerts.plugin.alerts.values()]
+
+
+def test_add_and_delete(alerts, run):
+    run("add one", "add two", "add three", "delete two")
+    assert names(alerts) == ["one", "three"]
+    run("delete ALL")
+    assert names(alerts) == []
+
+
+def test_add_duplicate(alerts, run, capsys):
+    run("add one", "add ONE")
+    assert names(alerts) == ["one"]
+    assert "already exists" in capsys.readouterr().out
+
+
+def test_rename(alerts, run):
+    run("add one", "rename one uno")
+    assert names(alerts) == ["uno"]
+    assert "one" not in alerts.plugin.alerts
+    assert alerts.plugin.alerts["UNO"].pattern == "one"
+
+
+@pytest.mark.parametrize("command, expected", [
+    ("move c first", ["c", "a", "b"]),
+    ("move a last", ["b", "c", "a"]),
+    ("move c before b", ["a", "c", "b"]),
+    ("move a after b", ["b", "a", "c"]),
+    ("move a first", ["a", "b", "c"]),
+    ("move c last", ["a", "b", "c"]),
+])
+def test_move(alerts, run, command, expected):
+    run("add a", "add b", "add c", command)
+    assert names(alerts) == expected
+
+
+def test_selectors(alerts, run):
+    run("add foo1", "add foo2", "add bar", "set bar tags red", "disable foo* tag:red")
+    assert [alert.enabled for alert in alerts.plugin.alerts.values()] == [False, False, False]
+    run("enable foo2")
+    assert [alert.enabled for alert in alerts.plugin.alerts.values()] == [False, True, False]
+
+
+def test_pattern_with_spaces(alerts, run):
+    run("add x", "pattern x hello there world")
+    assert alerts.plugin.alerts["x"].pattern == "hello there world"
+
+
+def test_unknown_alert(alerts, run, capsys):
+    run("set nope bold on")
+    assert "nope" in capsys.readouterr().out
+
+
+def test_option(alerts, run, capsys):
+    run("option multi_highlight on")
+    assert alerts.plugin.multi_highlight is True
+    run("option multi_highlight")
+    assert "multi_highlight" in capsys.readouterr().out
+    run("option multi_highlight bogus")
+    assert alerts.plugin.multi_highlight is True
+
+
+def test_dump_round_trip(model, alerts, run, capsys):
+    run(
+        "add one", "set one bold on color 4,2 word off tags a,b cooldown 5", "set one sound ding.wav",
+        "add two", "regex two h[ae]llo", "set two networks libera,oftc",
+    )
+    before = [alert.export_dict() for alert in alerts.plugin.alerts.values()]
+    capsys.readouterr()
+    run("dump ALL")
+    commands = [line[len("/alerts "):] for line in capsys.readouterr().out.splitlines()]
+    run("delete ALL", *commands)
+    assert [alert.export_dict() for alert in alerts.plugin.alerts.values()] == before
+
+
+def test_export_import(alerts, run, capsys):
+    run("add one", "set one underline on", "add two")
+    capsys.readouterr()
+    run("export ALL")
+    exported = capsys.readouterr().out.strip()
+    assert [entry["n"] for entry in json.loads(exported)] == ["one", "two"]
+    run("delete ALL", "import " + exported)
+    assert names(alerts) == ["one", "two"]
+    assert alerts.plugin.alerts["one"].underline is True
+
+
+def test_import_conflict_is_atomic(alerts, run, capsys):
+    run("add two")
+    run('import [{"n":"one"},{"n":"two"}]')
+    assert names(alerts) == ["two"]
+    assert "aborted" in capsys.readouterr().out
+
+
+def test_alerts_persist(model, alerts, run):
+    run("add one", "set one bold on tags x", "add two", "option copy_delay 2")
+    alerts = harness.reload_plugin()
+    assert names(alerts) == ["one", "two"]
+    assert alerts.plugin.alerts["one"].bold is True
+    assert alerts.plugin.alerts.tagged("x") == [alerts.plugin.alerts["one"]]
+    assert alerts.plugin.copy_delay == 2.0
+
+
+def test_help(alerts, run, capsys):
+    run("help", "help set", "help :bold")
+    assert capsys.readouterr().out.count("\n") > 10
+
+
+def test_profile_stops_on_unload_without_rehooking(model, alerts, run):
+    run("profile start 10")
+    print_hooks = [hook for hook in model.hooks if hook.kind == 'print']
+    model.unload()
+    assert [hook for hook in model.hooks if hook.kind == 'print'] == print_hooks
+    assert alerts.plugin.profiler is None
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import harness
+
+B, O = '\002', '\017'
+
+
+def texts(ctx):
+    return [event[2] for event in ctx.events]
+
+
+def test_use_filter_list(model, ops, run):
+    run("filterlist define bots DENY eve", "add hello", "set hello bold on", "nicklist hello SET USE bots")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert texts(ops) == [B + "hello" + O, "hello"]
+
+
+def test_filter_list_falls_through_to_alert_rules(model, ops, run):
+    run("filterlist define bots DENY *bot", "add hello", "set hello bold on", "nicklist hello SET USE bots DENY eve")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert texts(ops) == [B + "hello" + O, "hello"]
+
+
+def test_redefining_filter_list_affects_alerts(model, ops, run):
+    run("filterlist define bots DENY eve", "add hello", "set hello bold on", "nicklist hello SET USE bots")
+    run("filterlist define bots DENY bob")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert texts(ops) == ["hello", B + "hello" + O]
+
+
+def test_filter_list_checked_once_per_event(model, ops, alerts, run, monkeypatch):
+    calls = []
+    check = alerts.FilterList.check
+    monkeypatch.setattr(alerts.FilterList, "check", lambda self, *args: calls.append(args) or check(self, *args))
+    run(
+        "filterlist define bots DENY eve",
+        "add hello", "nicklist hello SET USE bots",
+        "add hell", "set hell word off", "nicklist hell SET USE bots",
+    )
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert len(calls) == 1
+
+
+def test_filter_list_in_use_cannot_be_deleted(alerts, run, capsys):
+    run("filterlist define bots DENY eve", "add hello", "nicklist hello SET USE bots", "filterlist delete bots")
+    assert "used by: hello" in capsys.readouterr().out
+    run("nicklist hello CLEAR", "filterlist delete bots")
+    assert alerts.plugin.filter_lists == {}
+
+
+def test_filter_lists_cannot_use_others(alerts, run, capsys):
+    run("filterlist define bots USE others")
+    assert "expected ALLOW or DENY" in capsys.readouterr().out
+    assert alerts.plugin.filter_lists == {}
+
+
+def test_filter_list_edit(home, run):
+    run("filterlist define Bots DENY eve,*bot ALLOW *", "filterlist edit bots")
+    assert home.inputbox == "/ALERTS FILTERLIST DEFINE Bots DENY eve,*bot ALLOW *"
+
+
+def test_use_undefined_filter_list(alerts, run, capsys):
+    run("add hello", "nicklist hello SET DENY eve", "nicklist hello SET USE typo")
+    assert "No filter list named 'typo'" in capsys.readouterr().out
+    assert alerts.plugin.alerts["hello"].describe_filter("nick") == " DENY eve"
+
+
+def test_import_warns_of_undefined_filter_lists(alerts, run, capsys):
+    run("filterlist define bots DENY eve", "add hello", "nicklist hello SET USE bots")
+    exported = json.dumps([alerts.plugin.alerts["hello"].export_dict()])
+    run("delete hello", "filterlist delete bots", "import " + exported)
+    out = capsys.readouterr().out
+    assert "Imported 1 alert(s)" in out
+    assert "Alert 'hello' uses filter list(s) that don't exist: bots." in out
+
+
+@pytest.mark.parametrize("stanzas", ["USE bots", "ALLOW bob USE bots,other DENY eve"])
+def test_filter_lists_persist(run, stanzas):
+    run("filterlist define bots DENY eve ALLOW", "filterlist define other DENY bob")
+    run("add hello", "nicklist hello SET " + stanzas)
+    alerts = harness.reload_plugin()
+    assert alerts.plugin.filter_lists["bots"].dump() == ["-eve", "+"]
+    assert alerts.plugin.alerts["hello"].describe_filter("nick") == " " + stanzas
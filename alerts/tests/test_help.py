@@ -0,0 +1,77 @@
+import pytest
+
+
+def tab(model, ctx, text):
+    """Types text into ctx's inputbox and presses Tab.  Returns the inputbox afterwards."""
+    ctx.inputbox = text
+    ctx.cursor = None
+    model.receive(ctx, "Key Press", "65289", "0", "\t", "1")
+    return ctx.inputbox
+
+
+def test_help_for_command(run, capsys):
+    run("help rename")
+    out = capsys.readouterr().out
+    assert "/alerts rename <alert> <newname>" in out
+    assert "Change the name of an alert." in out
+    assert "/alerts move" not in out
+
+
+def test_help_for_alias_and_setting(run, capsys):
+    run("help del", "help :cooldown")
+    out = capsys.readouterr().out
+    assert "/alerts del[ete] <alerts...>|ALL" in out
+    assert "cooldown <seconds>" in out
+
+
+def test_help_by_prefix(run, capsys):
+    run("help match_")
+    out = capsys.readouterr().out
+    assert "match_workers" in out and "match_cache_size" in out
+
+
+def test_help_not_found(run, capsys):
+    run("help frobnicate")
+    assert "No help found for 'frobnicate'." in capsys.readouterr().out
+
+
+def test_full_help(alerts, run, capsys):
+    run("help")
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("alerts version")
+    assert len(out) == 1 + len(alerts.HELP_INDEX.lines)
+
+
+@pytest.mark.parametrize("text, completed", [
+    ("/alerts ren", "/alerts rename "),
+    ("/alerts hello", "/alerts hello"),  # Not a command
+    ("/alerts enable He", "/alerts enable Hello "),
+    ("/alerts set Hello bo", "/alerts set Hello bold "),
+    ("/alerts set Hello bold on und", "/alerts set Hello bold on underline "),
+    ("/alerts set Hello bold o", "/alerts set Hello bold o"),  # A value
+    ("/alerts option match_c", "/alerts option match_cache_size "),
+    ("/alerts help match_w", "/alerts help match_workers "),
+    ("/alerts  set  Hello  bo", "/alerts  set  Hello  bold "),  # Repeated spaces
+    ("/alerts set Hello  und", "/alerts set Hello  underline "),
+    ("/alerts add He", "/alerts add He"),
+    ("hello He", "hello He"),
+])
+def test_tab_completion(model, home, run, text, completed):
+    run("add Hello")
+    assert tab(model, home, text) == completed
+
+
+def test_tab_completion_extends_common_prefix(model, home, run, capsys):
+    run("add ops-one", "add ops-two")
+    assert tab(model, home, "/alerts enable o") == "/alerts enable ops-"
+    capsys.readouterr()
+    assert tab(model, home, "/alerts enable ops-") == "/alerts enable ops-"
+    assert capsys.readouterr().out.strip() == "ops-one ops-two"
+
+
+def test_tab_completion_only_at_end(model, home, run):
+    run("add Hello")
+    home.inputbox = "/alerts enable He"
+    home.cursor = 3
+    model.receive(home, "Key Press", "65289", "0", "\t", "1")
+    assert home.inputbox == "/alerts enable He"
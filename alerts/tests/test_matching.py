@@ -0,0 +1,205 @@
+import pytest
+
+import harness
+
+B, C, U, O = '\002', '\003', '\037', '\017'
+
+
+def test_unmatched_message_passes_through(model, ops, run):
+    run("add hello")
+    assert model.receive(ops, "Channel Message", "bob", "goodbye") == 0
+    assert ops.events == [("Channel Message", "bob", "goodbye")]
+
+
+def test_match_formatting(model, ops, run):
+    run("add hello", "set hello bold on color 4")
+    model.receive(ops, "Channel Message", "bob", "hello world, hello")
+    assert ops.events == [(
+        "Channel Message", "bob", B + C + "04hello" + O + " world, " + B + C + "04hello" + O
+    )]
+
+
+def test_line_formatting(model, ops, run):
+    run("add hello", "set hello bold line")
+    model.receive(ops, "Channel Message", "bob", "say hello")
+    assert ops.events == [("Channel Message", B + "bob" + O, B + "say hello" + O)]
+
+
+def test_word_matching(model, ops, run):
+    run("add jon", "set jon bold on")
+    model.receive(ops, "Channel Message", "bob", "jonathan")
+    run("set jon word off")
+    model.receive(ops, "Channel Message", "bob", "jonathan")
+    assert [event[2] for event in ops.events] == ["jonathan", B + "jon" + O + "athan"]
+
+
+def test_regex_matches_stripped_text(model, ops, run):
+    run("add r", "set r regex h.l+o", "set r underline on")
+    model.receive(ops, "Channel Message", "bob", B + "hel" + B + "lo")
+    assert ops.events == [("Channel Message", "bob", U + "hello" + O)]
+
+
+def test_only_first_alert_triggers(model, ops, run):
+    run("add hello", "set hello bold on", "add world", "set world color 4")
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O + " world")]
+
+
+def test_disabled_alert(model, ops, run):
+    run("add hello", "set hello bold on", "disable hello")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert ops.events == [("Channel Message", "bob", "hello")]
+
+
+def test_multi_highlight(model, ops, run):
+    run("add hello", "set hello bold on", "add world", "set world color 4", "option multi_highlight on")
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O + " " + C + "04world" + O)]
+
+
+def test_multi_highlight_overlap_goes_to_earlier_alert(model, ops, run):
+    run(
+        "add lowo", "set lowo pattern lo wo", "set lowo word off underline on",
+        "add world", "set world color 4", "option multi_highlight on"
+    )
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    assert ops.events == [("Channel Message", "bob", "hel" + U + "lo wo" + O + "rld")]
+
+
+def test_multi_highlight_restores_line_formatting(model, ops, run):
+    run("add hello", "set hello bold line", "add world", "set world color 4", "option multi_highlight on")
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    assert ops.events == [("Channel Message", B + "bob" + O, B + "hello " + C + "04world" + O + B + O)]
+
+
+@pytest.mark.parametrize("stanzas", ["ALLOW bob", "DENY eve", "ALLOW *@example.com", "ALLOW !bob", "DENY *!*@evil.*"])
+def test_nick_filter(model, ops, run, stanzas):
+    run("add hello", "set hello bold on", "nicklist hello SET " + stanzas)
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello")
+    assert [event[2] for event in ops.events] == [B + "hello" + O, "hello"]
+
+
+def test_network_scope(model, ops, run):
+    other = model.add_context("oftc", "#ops", users=[("bob", "bob@example.com")])
+    run("add hello", "set hello bold on", "set hello networks OFTC")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(other, "Channel Message", "bob", "hello")
+    assert ops.events == [("Channel Message", "bob", "hello")]
+    assert other.events == [("Channel Message", "bob", B + "hello" + O)]
+
+
+def test_own_output_is_not_rematched(model, ops, run):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert len(ops.events) == 1
+
+
+def test_case_insensitive(model, ops, run):
+    run("add Hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "oh HELLO there")
+    assert ops.events == [("Channel Message", "bob", "oh " + B + "HELLO" + O + " there")]
+
+
+def test_casefolding_changes_length(model, ops, run):
+    run("add strasse", "set strasse bold on", "add ss", "set ss pattern *ss end", "set ss word off underline on")
+    model.receive(ops, "Channel Message", "bob", "die Straße")
+    model.receive(ops, "Channel Message", "bob", "Maß end")
+    assert [event[2] for event in ops.events] == ["die " + B + "Straße" + O, U + "Maß end" + O]
+
+
+@pytest.mark.parametrize("regex, casefolded", [
+    (r"\bhello\b", True),
+    (r"[a-z]+\d*\W", True),
+    (r"(?:foo|b(a)r)+(?=x)", True),
+    (r"Hello", False),
+    (r"[A-Z]{3}", False),
+    (r"stra(ß|ss)e", False),
+])
+def test_compile_regex(alerts, regex, casefolded):
+    compiled = alerts.compile_regex(regex)
+    assert (not compiled.flags & alerts.re.IGNORECASE) == casefolded
+
+
+@pytest.mark.parametrize("regex", [r"hello", r"Hello", r"[A-Z]+LO\b", r"stra(ß|ss)e"])
+def test_regex_alerts_ignore_case(model, ops, run, regex):
+    run("add r", "regex r " + regex, "set r bold on")
+    model.receive(ops, "Channel Message", "bob", "HELLO Straße")
+    assert ops.events[0][2] != "HELLO Straße"
+
+
+@pytest.mark.parametrize("message, matched", [
+    ("jon", True), ("hi jon!", True), ("xjon", False), ("jonx", False), ("jon jonx", True), ("xjon jon", True),
+])
+def test_word_boundaries(model, ops, run, message, matched):
+    run("add jon", "set jon bold on")
+    model.receive(ops, "Channel Message", "bob", message)
+    assert (ops.events[0][2] != message) == matched
+
+
+@pytest.mark.parametrize("isupport, matched", [
+    (None, True),  # rfc1459 is the default
+    ("CASEMAPPING=rfc1459", True),
+    ("CASEMAPPING=ascii", False),
+])
+def test_nick_filter_casemapping(model, ops, alerts, run, isupport, matched):
+    ops.add_user("{bob}", "bob@example.com")
+    if isupport:
+        line = ":irc.example.com 005 me CHANTYPES=# {} :are supported by this server".format(isupport)
+        model.receive_server(ops, line)
+    run("add hello", "set hello bold on", "nicklist hello SET ALLOW [BOB]")
+    model.receive(ops, "Channel Message", "{bob}", "hello")
+    assert (ops.events[0][2] != "hello") == matched
+
+
+def test_casemapping_remembered_across_reload(model, ops, run):
+    ops.add_user("{bob}", "bob@example.com")
+    model.receive_server(ops, ":irc.example.com 005 me CASEMAPPING=ascii :are supported by this server")
+    harness.reload_plugin()
+    run("add hello", "set hello bold on", "nicklist hello SET ALLOW [BOB]")
+    model.receive(ops, "Channel Message", "{bob}", "hello")
+    assert ops.events[0][2] == "hello"
+
+
+@pytest.mark.parametrize("commands, token", [
+    (["add Jon"], "jon"),
+    (["add jon", "set jon word off"], None),
+    (["add jon", "set jon pattern jon*"], None),
+    (["add jon", "set jon pattern jon smith"], None),
+    (["add jon", "regex jon jon"], None),
+])
+def test_alert_token(alerts, run, commands, token):
+    run(*commands)
+    assert alerts.plugin.alerts["jon"].token == token
+
+
+def test_word_index_keeps_list_order(model, ops, run):
+    run("add hel", "set hel pattern hel*", "set hel bold on", "add hello", "set hello color 4")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    run("move hello first")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert [event[2] for event in ops.events] == [B + "hello" + O, C + "04hello" + O]
+
+
+def test_word_index_candidates(alerts, run):
+    run("add hello", "add world", "add wild", "set wild pattern w*d")
+    message = "Hello there, WORLD!"
+    event = alerts.ChatEvent(["bob", message], ["bob " + message, message], "Channel Message")
+    index = alerts.plugin.alerts.word_index("libera")
+    assert [alert.name for alert in index.candidates(event)] == ["hello", "world", "wild"]
+    event = alerts.ChatEvent(["bob", "nothing"], ["bob nothing", "nothing"], "Channel Message")
+    assert [alert.name for alert in index.candidates(event)] == ["wild"]
+    run("delete hello")
+    assert alerts.plugin.alerts.word_index("libera") is not index
+
+
+@pytest.mark.parametrize("cache_size", [0, 256])
+def test_word_index_only_for_network(model, ops, alerts, run, cache_size):
+    other = model.add_context("oftc", "#relay", users=[("bob", "bob@example.com")])
+    run("option match_cache_size {}".format(cache_size), "add hello", "add world", "set world networks OFTC")
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    model.receive(other, "Channel Message", "bob", "hello world")
+    indexes = alerts.plugin.alerts._word_indexes
+    assert sorted(indexes) == ["libera", "oftc"]
+    assert [alert.name for _, alert in indexes["libera"].words[0]["hello"]] == ["hello"]
+    assert "world" not in indexes["libera"].words[0]
@@ -0,0 +1,139 @@
+import sys
+import time
+
+import pytest
+
+B, U, O = '\002', '\037', '\017'
+
+
+@pytest.fixture
+def pooled(model, alerts, run):
+    """Matching in two worker processes (running this Python)."""
+    run("option match_python " + sys.executable, "option match_workers 2")
+    assert alerts.plugin.match_pool is not None
+    yield alerts.plugin.match_pool
+    run("option match_workers 0")
+
+
+def test_messages_are_held_until_checked(model, ops, run, pooled):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "bob", "goodbye")
+    assert ops.events == []
+    pooled.wait()
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O), ("Channel Message", "bob", "goodbye")]
+
+
+def test_timer_collects_results(model, ops, run, pooled):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    for _ in range(500):  # Real time has to pass for the workers to answer.
+        if ops.events:
+            break
+        time.sleep(0.01)
+        model.advance(pooled.POLL_INTERVAL)
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O)]
+    assert not model.timers
+
+
+def test_same_results_as_inline(model, ops, run, pooled):
+    run(
+        "add hello", "set hello bold on", "add r", "regex r h.l+o", "set r underline on",
+        "add strasse", "set strasse underline on", "add eve", "set eve bold on", "nicklist eve SET DENY eve",
+    )
+    messages = [
+        ("bob", "hello"), ("bob", B + "hel" + B + "lo"), ("bob", "die Straße"), ("eve", "eve"), ("bob", "eve"),
+        ("bob", "nothing"),
+    ]
+    for nick, text in messages:
+        model.receive(ops, "Channel Message", nick, text)
+    pooled.wait()
+    pooled_events, ops.events[:] = list(ops.events), []
+
+    run("option match_workers 0")
+    for nick, text in messages:
+        model.receive(ops, "Channel Message", nick, text)
+    assert ops.events == pooled_events
+
+
+def test_multi_highlight(model, ops, run, pooled):
+    run("add hello", "set hello bold on", "add world", "set world underline on", "option multi_highlight on")
+    model.receive(ops, "Channel Message", "bob", "hello world")
+    pooled.wait()
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O + " " + U + "world" + O)]
+
+
+def test_alert_changes_reach_workers(model, ops, run, pooled):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    pooled.wait()
+    run("pattern hello there")
+    model.receive(ops, "Channel Message", "bob", "hello there")
+    pooled.wait()
+    assert [event[2] for event in ops.events] == [B + "hello" + O + " there", "hello " + B + "there" + O]
+
+
+def test_closed_window_drops_message(model, ops, run, pooled):
+    run("add hello")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.close_context(ops)
+    pooled.wait()
+    assert ops.events == []
+
+
+def test_stopping_handles_waiting_messages(model, ops, run, pooled):
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    run("option match_workers 0")
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O)]
+
+
+def test_dead_worker_falls_back(model, ops, alerts, run, pooled, capsys):
+    run("add hello", "set hello bold on")
+    pooled.processes[0].kill()
+    pooled.processes[0].wait()
+    model.receive(ops, "Channel Message", "bob", "hello")
+    pooled.wait()
+    assert alerts.plugin.match_pool is None
+    assert "failed" in capsys.readouterr().out
+    assert ops.events == [("Channel Message", "bob", B + "hello" + O)]
+
+
+def test_full_backlog_checks_inline(model, ops, alerts, run, pooled, monkeypatch):
+    monkeypatch.setattr(alerts.MatchPool, "MAX_PENDING", 1)
+    run("add hello", "set hello bold on")
+    model.receive(ops, "Channel Message", "bob", "hello 1")
+    model.receive(ops, "Channel Message", "bob", "hello 2")
+    assert [event[2] for event in ops.events] == [B + "hello" + O + " 2"]  # Without waiting
+    pooled.wait()
+    assert len(ops.events) == 2
+
+
+def test_stopped_pool_refuses_messages(model, ops, alerts, pooled):
+    pooled.stop()
+    event = alerts.ChatEvent(["bob", "hello"], ["bob hello", "hello"], "Channel Message")
+    assert not pooled.submit(event)
+
+
+def test_pooled_latency_shown(model, ops, run, pooled, capsys):
+    run("add hello")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    pooled.wait()
+    run("latency")
+    assert "(pooled) Channel Message" in capsys.readouterr().out
+
+
+def test_open_windows_looked_up_once_per_poll(model, ops, run, pooled, monkeypatch):
+    run("add hello")
+    for ix in range(5):
+        model.receive(ops, "Channel Message", "bob", "hello {}".format(ix))
+    time.sleep(0.5)  # So the workers have (most likely) answered all of them before the first poll.
+    lookups = []
+    get_list = model.get_list
+    monkeypatch.setattr(model, "get_list", lambda name: lookups.append(name) or get_list(name))
+    polls = []
+    poll = pooled.poll
+    monkeypatch.setattr(pooled, "poll", lambda: polls.append(len(pooled.jobs)) or poll())
+    pooled.wait()
+    assert len(ops.events) == 5
+    assert lookups.count('channels') <= len(polls)
@@ -0,0 +1,108 @@
+import os
+import time
+
+import pytest
+
+B, O = '\002', '\017'
+
+
+@pytest.fixture
+def logs(model, tmp_path):
+    """Writes log files under a fake configuration directory."""
+    model.info['configdir'] = str(tmp_path)
+
+    def write(path, *lines, age=0):
+        path = tmp_path / "logs" / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+        if age:
+            modified = time.time() - age
+            os.utime(path, (modified, modified))
+    return write
+
+
+def output(model):
+    """Lines written to the results window (which are written several at a time)."""
+    return [line for text in model.find("libera", ">>scan<<").output for line in text.split("\n")]
+
+
+def scan(model, run, *args):
+    run("scan " + " ".join(args))
+    model.run_timers()
+    return output(model)
+
+
+def test_scan(model, run, logs):
+    logs(
+        "libera/#ops.log",
+        "**** BEGIN LOGGING AT Mon Oct 19 10:00:00 2026",
+        "Oct 19 10:00:01 <bob>\tsay hello",
+        "Oct 19 10:00:02 <@eve>\tgoodbye",
+        "Oct 19 10:00:03 -->\tbob (bob@example.com) has joined #ops",
+        "Oct 19 10:00:04 *\teve says hello",
+    )
+    run("add hello", "set hello bold on")
+    output = scan(model, run, "hello")
+    assert output[1:3] == [
+        B + "hello" + B + " libera/#ops: Oct 19 10:00:01 <bob> say " + B + "hello" + O,
+        B + "hello" + B + " libera/#ops: Oct 19 10:00:04 * eve says " + B + "hello" + O,
+    ]
+    assert output[-1].startswith("Scan finished: 2 match(es) in 3 line(s) from 1 file(s)")
+
+
+def test_scan_where(model, run, logs):
+    logs("libera/#ops.log", "Oct 19 10:00:01 <bob>\thello")
+    logs("libera/#chat.log", "Oct 19 10:00:01 <bob>\thello")
+    logs("oftc/#ops.log", "Oct 19 10:00:01 <bob>\thello")
+    run("add hello")
+    output = scan(model, run, "ALL", "*/#ops")
+    assert [line.split(":")[0].split(" ")[1] for line in output[1:-1]] == ["libera/#ops", "oftc/#ops"]
+
+
+def test_scan_since(model, run, logs):
+    now = time.localtime()
+    stamp = time.strftime("%b %d %H:%M:%S ", now)
+    old = time.strftime("%b %d %H:%M:%S ", time.localtime(time.time() - 7200))
+    logs("libera/#ops.log", old + "<bob>\thello old", stamp + "<bob>\thello new")
+    logs("libera/#ancient.log", stamp + "<bob>\thello ancient", age=86400 * 30)
+    run("add hello")
+    output = scan(model, run, "hello", "1h")
+    assert len(output) == 3 and output[1].endswith("<bob> hello new")
+
+
+def test_scan_runs_in_slices(model, alerts, run, logs, monkeypatch):
+    logs("libera/#ops.log", *("Oct 19 10:00:01 <bob>\thello {}".format(ix) for ix in range(100)))
+    run("add hello")
+    clock = iter(range(0, 100000))
+    monkeypatch.setattr(alerts.time, "perf_counter", lambda: next(clock) * 0.005)  # Each line takes 5ms
+    run("scan hello")
+    assert model.run_timers() > 10
+    assert output(model)[-1].startswith("Scan finished: 100 match(es)")
+
+
+def test_scan_no_logs(model, run, logs, capsys):
+    run("add hello", "scan hello")
+    assert "No log files found" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("selector, found", [("ALL", ["hello"]), ("hel*", ["hello"]), ("help", ["help"])])
+def test_scan_skips_disabled_alerts_unless_named(model, run, logs, selector, found):
+    logs("libera/#ops.log", "Oct 19 10:00:01 <bob>\thello", "Oct 19 10:00:02 <bob>\thelp")
+    run("add hello", "add help", "disable help")
+    output = scan(model, run, selector)
+    assert [line.split(" ")[0].strip(B) for line in output[1:-1]] == found
+
+
+def test_scan_stops_when_window_closes(model, alerts, run, logs, monkeypatch):
+    logs("libera/#ops.log", *("Oct 19 10:00:01 <bob>\thello {}".format(ix) for ix in range(100)))
+    run("add hello")
+    clock = iter(range(0, 100000))
+    monkeypatch.setattr(alerts.time, "perf_counter", lambda: next(clock) * 0.005)
+    run("scan hello")
+    model.run_timers(1)
+    model.close_context(model.find("libera", ">>scan<<"))
+    calls = []
+    check = alerts.LogScan.check
+    monkeypatch.setattr(alerts.LogScan, "check", lambda self, line: calls.append(line) or check(self, line))
+    model.run_timers()
+    assert len(calls) <= 1 and not alerts.plugin.tasks.tasks
@@ -0,0 +1,198 @@
+import pytest
+
+import harness
+
+
+@pytest.fixture
+def sound(tmp_path):
+    path = tmp_path / "ding.wav"
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_splay(model, ops, run, sound):
+    run("add hello", "set hello sound " + sound)
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert model.sounds == [sound]
+
+
+def test_mute(model, ops, run, sound):
+    run("add hello", "set hello sound " + sound, "set hello mute on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert model.sounds == []
+
+
+def test_local_player_dedupes_and_queues(alerts, monkeypatch):
+    started = []
+    stopped = []
+
+    class Process:
+        def __init__(self, args, **kwargs):
+            started.append(args[1])
+            self.done = False
+
+        def poll(self):
+            return 0 if self.done else None
+
+        def terminate(self):
+            self.done = True
+
+        def wait(self, timeout=None):
+            assert self.done
+            stopped.append(self)
+
+    monkeypatch.setattr(alerts.subprocess, "Popen", Process)
+    player = alerts.SoundPlayer("player", window=10, queue_size=1)
+    assert player.play("a.wav")
+    assert not player.play("a.wav")  # Duplicate
+    assert player.play("b.wav")
+    assert not player.play("c.wav")  # Queue full
+    assert started == ["a.wav"]
+    player.process.done = True
+    alerts.hexchat.model.run_timers()
+    assert started == ["a.wav", "b.wav"]
+    assert player.play("c.wav")  # Dropped before, so not a duplicate
+    player.stop()
+    assert len(stopped) == 1  # Terminated and reaped
+
+
+def test_notify_buffer(model, home, ops, run):
+    run("add hello", "set hello notify on", "option notify_window 2")
+    for nick in ("bob", "eve", "bob"):
+        model.receive(ops, "Channel Message", nick, "hello")
+    assert home.output == []
+    model.advance(2000)
+    assert home.output == ["[3 alerts in #ops: last from bob]"]
+
+
+def test_notify_immediately(model, home, ops, run):
+    run("add hello", "set hello notify on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert home.output == ["[bob on #ops: hello]"]
+
+
+def test_focus(model, home, ops, run):
+    run("add hello", "set hello focus on")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert model.focused is ops
+
+
+def test_copy(model, ops, run):
+    run("add hello", "set hello copy on", "option copy_delay 1")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(ops, "Channel Message", "eve", "hello again")
+    assert model.find("libera", ">>alerts<<") is None
+    model.advance(1000)
+    window = model.find("libera", ">>alerts<<")
+    assert [event[1:] for event in window.events] == [("bob:#ops", "hello"), ("eve:#ops", "hello again")]
+    assert model.focused is not window
+
+
+def test_copy_window_reopened_with_backlog(model, ops, run):
+    run("add hello", "set hello copy on", "option copy_delay 0")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.close_context(model.find("libera", ">>alerts<<"))
+    model.receive(ops, "Channel Message", "eve", "hello again")
+    window = model.find("libera", ">>alerts<<")
+    assert [event[2] for event in window.events] == ["hello", "hello again"]
+
+
+@pytest.mark.parametrize("option, expected", [
+    ("copy_delay 0", ["a", "b", "c", "d"]),
+    ("copy_backlog 2", ["c", "d"]),
+])
+def test_copy_option_change_keeps_backlog(model, ops, run, option, expected):
+    run("add hello", "set hello copy on word off", "option copy_delay 1")
+    for text in ("hello a", "hello b", "hello c"):
+        model.receive(ops, "Channel Message", "bob", text)
+    model.advance(1000)
+    model.close_context(model.find("libera", ">>alerts<<"))
+    run("option " + option)
+    model.receive(ops, "Channel Message", "bob", "hello d")
+    model.advance(1000)
+    window = model.find("libera", ">>alerts<<")
+    assert [event[2][-1] for event in window.events] == expected
+
+
+def test_watchdog_quarantines_slow_alert(model, ops, alerts, run, monkeypatch):
+    run("add hello", "set hello bold on", "option watchdog_strikes 2")
+    clock = iter(range(0, 1000, 1))  # Every call to perf_counter() takes a second.
+    monkeypatch.setattr(alerts.time, "perf_counter", lambda: next(clock))
+    for ix in range(3):
+        model.receive(ops, "Channel Message", "bob", "hello {}".format(ix))  # Different text, or it'd be cached
+    alert = alerts.plugin.alerts["hello"]
+    assert alert.quarantined and not alert.enabled
+    assert ops.events[-1] == ("Channel Message", "bob", "hello 2")
+    run("enable hello")
+    assert not alert.quarantined and alert.enabled
+
+
+def test_quarantine_persists(model, ops, alerts, run, monkeypatch, capsys):
+    run("add hello", "option watchdog_strikes 1")
+    generation = alerts.plugin.alerts.generation
+    clock = iter(range(0, 1000, 1))
+    monkeypatch.setattr(alerts.time, "perf_counter", lambda: next(clock))
+    model.receive(ops, "Channel Message", "bob", "hello")
+    assert alerts.plugin.alerts.generation > generation
+    monkeypatch.undo()
+    alerts = harness.reload_plugin()
+    assert alerts.plugin.alerts["hello"].quarantined
+    capsys.readouterr()
+    run("stats")
+    assert "hello" in capsys.readouterr().out
+
+
+def test_watchdog_budget_is_milliseconds(run, capsys):
+    run("option watchdog_budget -1")
+    assert "Must be 0 or more milliseconds" in capsys.readouterr().out
+
+
+def test_duplicate_suppression(model, ops, run, sound):
+    relay = model.add_context("oftc", "#relay", users=[("bob", "bob@example.com")])
+    run("add hello", "set hello bold on", "set hello sound " + sound, "option duplicate_window 10")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    model.receive(relay, "Channel Message", "BOB", "hello")
+    model.receive(relay, "Channel Message", "eve", "hello")
+    assert model.sounds == [sound, sound]
+    assert relay.events[0] == ("Channel Message", "BOB", "\002hello\017")  # Still highlighted
+
+
+def test_duplicate_filter_expires_and_is_bounded(alerts, ops, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(alerts.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(alerts.DuplicateFilter, "MAX_ENTRIES", 3)
+    event = alerts.ChatEvent(["bob", "hello"], ["bob hello", "hello"], "Channel Message")
+    duplicates = alerts.DuplicateFilter(5)
+    assert not duplicates.check("a", event)
+    assert duplicates.check("a", event)
+    now[0] = 5.0
+    assert not duplicates.check("a", event)
+    for alert in "bcde":
+        duplicates.check(alert, event)
+    assert len(duplicates.seen) == 3
+    assert not duplicates.check("a", event)
+
+
+def test_cooldown(model, ops, alerts, run, sound, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(alerts.time, "monotonic", lambda: now[0])
+    run("add hello", "set hello bold on cooldown 60 flash on", "set hello sound " + sound)
+    for now[0] in (0.0, 30.0, 60.0):
+        model.receive(ops, "Channel Message", "bob", "hello")
+    assert model.sounds == [sound, sound]
+    assert ops.events[1] == ("Channel Message", "bob", "\002hello\017")  # Still highlighted while cooling down
+
+
+def test_cooldown_persists(alerts, run):
+    run("add hello", "set hello cooldown 2.5")
+    assert alerts.plugin.alerts["hello"].export_dict()["d"] == 2.5
+    alerts = harness.reload_plugin()
+    assert alerts.plugin.alerts["hello"].cooldown == 2.5
+
+
+def test_notify_window_change_flushes_and_unhooks(model, home, ops, run):
+    run("add hello", "set hello notify on", "option notify_window 2")
+    model.receive(ops, "Channel Message", "bob", "hello")
+    run("option notify_window 0")
+    assert home.output == ["[bob on #ops: hello]"]
+    assert not model.timers
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def slow_clock(alerts, monkeypatch):
+    """Makes every call to perf_counter() take 5ms, so tasks only get a few steps per slice."""
+    clock = iter(range(10 ** 6))
+    monkeypatch.setattr(alerts.time, "perf_counter", lambda: next(clock) * 0.005)
+
+
+def test_small_commands_finish_immediately(alerts, run, capsys):
+    run("add one", "add two", "dump ALL")
+    assert capsys.readouterr().out.count("/alerts add") == 2
+    assert not alerts.plugin.tasks.tasks
+
+
+def test_large_dump_runs_in_background(model, alerts, run, capsys, slow_clock):
+    alerts.plugin.alerts.update((name, alerts.Alert(name)) for name in ("a{}".format(ix) for ix in range(50)))
+    capsys.readouterr()
+    run("dump ALL")
+    assert 0 < capsys.readouterr().out.count("/alerts add") < 50
+    assert model.run_timers() > 1
+    assert not model.timers
+    assert capsys.readouterr().out.count("/alerts add") > 0
+
+
+def test_progress_and_cancel(model, alerts, run, capsys, slow_clock):
+    entries = [{"n": "a{}".format(ix)} for ix in range(500)]
+    run("import " + json.dumps(entries))
+    model.advance(100)
+    run("cancel")
+    listing = capsys.readouterr().out
+    assert "import" in listing and "of 500 alert(s)" in listing
+    run("cancel import")
+    assert "Cancelled task 1 (import)" in capsys.readouterr().out
+    model.run_timers()
+    assert len(alerts.plugin.alerts) == 0
+    assert not alerts.plugin.tasks.tasks
+
+
+def test_import_rechecks_conflicts(model, alerts, run, capsys, slow_clock):
+    run("import " + json.dumps([{"n": "a{}".format(ix)} for ix in range(20)]))
+    run("add a19")
+    model.run_timers()
+    assert "aborted" in capsys.readouterr().out
+    assert list(alerts.plugin.alerts) == ["a19"]
+
+
+def test_failing_task_is_reported(model, alerts, capsys):
+    def task():
+        yield None
+        raise ValueError("broken")
+    alerts.plugin.tasks.SLICE = 0
+    alerts.plugin.tasks.start("broken", task())
+    model.run_timers()
+    assert "broken (task 1) failed: broken" in capsys.readouterr().out
+
+
+def test_dump_output_is_batched(model, alerts, run, monkeypatch):
+    alerts.plugin.alerts.update((name, alerts.Alert(name)) for name in ("a{}".format(ix) for ix in range(1000)))
+    writes = []
+    monkeypatch.setattr(alerts, "print", writes.append, raising=False)
+    run("dump ALL")
+    model.run_timers()
+    lines = [line for text in writes for line in text.split("\n")]
+    assert len(lines) == 1000 and lines[-1] == "/alerts add a999"
+    assert len(writes) < 10
+
+
+def test_task_cancelled_by_earlier_task(model, alerts, capsys):
+    tasks = alerts.plugin.tasks
+    tasks.SLICE = 0
+
+    def canceller():
+        yield None
+        tasks.cancel(victim)
+        yield None
+
+    def forever():
+        while True:
+            yield None
+    tasks.start("canceller", canceller())
+    victim = tasks.start("victim", forever())
+    model.run_timers()
+    assert "failed" not in capsys.readouterr().out
+    assert not tasks.tasks
+
+
+def test_task_context_is_restored(model, home, ops, alerts):
+    seen = []
+
+    def task():
+        seen.append(model.current)
+        yield None
+        seen.append(model.current)
+    alerts.plugin.tasks.SLICE = 0
+    model.current = home
+    alerts.plugin.tasks.start("task", task(), context=alerts.Context(ops))
+    assert model.current is home
+    model.run_timers()
+    assert model.current is home
+    assert seen == [ops, ops]
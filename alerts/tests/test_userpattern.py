@@ -0,0 +1,109 @@
+import random
+import re
+
+import pytest
+
+PATTERN_CHARS = "aAbB.-**?+!@"
+SUBJECT_CHARS = "aAbB.-x"
+
+
+@pytest.fixture
+def UserPattern(alerts):
+    return alerts.UserPattern
+
+
+@pytest.mark.parametrize("pattern, methodname", [
+    ("bob", "startswith"),
+    ("bob!bob@example.com", "=="),
+    ("*@example.com", "endswith"),
+    ("!bob", "in"),
+    ("b?b", "match"),
+    ("b*!*@*.com", "fullmatch"),
+    ("*!*@*.com", "search"),
+    ("*!b*b@*", "search"),
+    ("*", "<True>"),
+    ("*!**@", "<True>"),
+])
+def test_method(UserPattern, pattern, methodname):
+    assert UserPattern(pattern).methodname == methodname
+
+
+@pytest.mark.parametrize("pattern, matches, nonmatches", [
+    ("*@example.com", ["bob!bob@example.com"], ["bob!bob@example.org", "bob!bob@x.example.com"]),
+    ("!bob", ["eve!bob@evil", "BOB!BOB@X"], ["bob!eve@evil", "bob!bobby@x"]),
+    ("*!*@host", ["a!b@HOST"], ["a!b@ahost"]),
+    ("Bob", ["bob!x@y", "BOB!x@y"], ["bobby!x@y", "x!bob@y"]),
+])
+def test_examples(alerts, UserPattern, pattern, matches, nonmatches):
+    fold = alerts.irc_fold
+    pattern = UserPattern(pattern)
+    assert all(pattern.match(fold(text)) for text in matches)
+    assert not any(pattern.match(fold(text)) for text in nonmatches)
+
+
+def random_patterns(rng, count, chars=PATTERN_CHARS):
+    while count:
+        text = "".join(rng.choice(chars) for _ in range(rng.randint(0, 10)))
+        if text.count("!") > 1 or text.count("@") > 1 or "@" in text.partition("!")[0] and "!" in text:
+            continue  # Not a valid pattern
+        count -= 1
+        yield text
+
+
+def random_subjects(rng, pattern, count, chars=SUBJECT_CHARS):
+    """Makes up nick!user@host strings, about half of which are derived from the pattern (and so likely to match)."""
+    def component(template=None):
+        if template is None or rng.random() < 0.3:
+            return "".join(rng.choice(chars) for _ in range(rng.randint(0, 4)))
+        result = []
+        for char in template:
+            if char in "*+":
+                result.append("".join(rng.choice(chars) for _ in range(rng.randint(char == "+", 3))))
+            elif char == "?":
+                result.append(rng.choice(chars))
+            else:
+                result.append(char.swapcase() if rng.random() < 0.3 else char)
+        return "".join(result)
+
+    for _ in range(count):
+        if rng.random() < 0.5:
+            yield "{}!{}@{}".format(component(), component(), component())
+        else:
+            yield "{}!{}@{}".format(component(pattern.nick), component(pattern.user), component(pattern.host))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_equivalent_to_full_regex(alerts, UserPattern, seed):
+    rng = random.Random(seed)
+    for text in random_patterns(rng, 200):
+        pattern = UserPattern(text)
+        full = re.compile(pattern.full_regex, re.IGNORECASE)
+        for subject in random_subjects(rng, pattern, 20):
+            matched = bool(pattern.match(alerts.irc_fold(subject)))
+            assert matched == bool(full.match(subject)), (text, subject, pattern.methodname)
+
+
+@pytest.mark.parametrize("casemapping, pattern, nick, matched", [
+    ("rfc1459", "[bob]", "{BOB}", True),
+    ("rfc1459", "b~b", "B^B", True),
+    ("strict-rfc1459", "b\\b", "B|B", True),
+    ("strict-rfc1459", "b~b", "b^b", False),
+    ("ascii", "[bob]", "{bob}", False),
+    ("ascii", "[BOB]", "[bob]", True),
+    ("rfc7613", "ÄRGER", "ärger", True),
+])
+def test_casemapping(alerts, UserPattern, casemapping, pattern, nick, matched):
+    subject = alerts.irc_fold(nick + "!user@host", casemapping)
+    assert bool(UserPattern(pattern).match(subject, casemapping)) == matched
+    assert bool(UserPattern(pattern + "*").match(subject, casemapping)) == matched
+
+
+@pytest.mark.parametrize("casemapping", ["rfc1459", "strict-rfc1459", "ascii"])
+def test_equivalent_with_casemapping(alerts, UserPattern, casemapping):
+    rng = random.Random(casemapping)
+    for text in random_patterns(rng, 200, chars="aB[]{}\\|~^*?!@"):
+        pattern = UserPattern(text)
+        full = re.compile(UserPattern(alerts.irc_fold(text, casemapping)).full_regex)
+        for subject in random_subjects(rng, pattern, 20, chars="aAbB[]{}\\|~^"):
+            subject = alerts.irc_fold(subject, casemapping)
+            assert bool(pattern.match(subject, casemapping)) == bool(full.match(subject)), (text, subject)